@@ -1,9 +1,159 @@
+"""
+Admin for tables too large to count or list in full
+
+Order changelists are ordered and filtered by indexed columns, load the
+related rows of a page together and never count the whole table, see
+EstimatedCountPaginator. Foreign keys to large tables are edited with raw id
+or autocomplete widgets rather than a select listing every row.
+
+When orders are sharded the changelists show one shard at a time, picked
+with the Shard filter, and related rows are prefetched from the default
+database instead of joined, since shards do not hold them.
+"""
+from contextlib import contextmanager
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+from .models import MenuItems, Orders, OrdersArchive, Restaurants
+from .sharding import on_shard, shard_for, shard_for_id, shards
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts at most max_count rows
+
+    Larger unfiltered tables are estimated from the range of their ids, which
+    archiving and deletes only make an overestimate. Larger filtered lists
+    are reported as max_count rows, so their later pages are reached by
+    narrowing the filters.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        count = queryset.values('pk')[:self.max_count + 1].count()
+        if count <= self.max_count:
+            return count
+        if not queryset.query.where:
+            bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+            return bounds['last'] - bounds['first'] + 1
+        return self.max_count
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shards()]
+
+    def choices(self, changelist):
+        # there is no view of all shards, the first one is shown by default
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': (self.value() or shards()[0]) == alias,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value() or shards()[0])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ShardedOrdersAdmin(LargeTableAdmin):
+    list_display = ('id', 'created', 'restaurant', 'item', 'quantity', 'total_price', 'user')
+    # a date hierarchy would list the distinct dates of the whole table, while
+    # this filter offers fixed ranges
+    list_filter = ('created', 'restaurant')
+    list_select_related = ('restaurant', 'item__restaurant', 'user')
+    ordering = ('-created', '-id')
+    raw_id_fields = ('user',)
+
+    def get_list_filter(self, request):
+        return (ShardListFilter, *self.list_filter) if shards() else self.list_filter
+
+    def get_list_select_related(self, request):
+        return () if shards() else self.list_select_related
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if shards():
+            # shards hold no users, restaurants or menu items to join with
+            queryset = queryset.prefetch_related(*self.list_select_related)
+        return queryset
+
+    def object_shard(self, request, object_id):
+        """
+        Return the shard holding the order being edited, or the one a new
+        order's restaurant puts it on, falling back to the first shard
+        """
+        try:
+            if object_id is not None:
+                return shard_for_id(object_id)
+            return shard_for(request.POST['restaurant'])
+        except (LookupError, ValueError):
+            return shards()[0]
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with self.on_object_shard(request, object_id):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with self.on_object_shard(request, object_id):
+            return super().delete_view(request, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        with self.on_object_shard(request, object_id):
+            return super().history_view(request, object_id, extra_context)
+
+    @contextmanager
+    def on_object_shard(self, request, object_id):
+        if not shards():
+            yield
+            return
+        with on_shard(self.object_shard(request, object_id)):
+            yield
+
+
+@admin.register(Orders)
+class OrdersAdmin(ShardedOrdersAdmin):
+    autocomplete_fields = ('restaurant', 'item')
+
+
+@admin.register(OrdersArchive)
+class OrdersArchiveAdmin(ShardedOrdersAdmin):
+    """
+    Archived orders are only moved in by archive_orders, so they are read only
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
-from .models import MenuItems, Orders, Restaurants
+@admin.register(Restaurants)
+class RestaurantsAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created')
+    ordering = ('name',)
+    search_fields = ('name',)
 
-# Register your models here.
 
-admin.site.register(Orders)
-admin.site.register(Restaurants)
-admin.site.register(MenuItems)
+@admin.register(MenuItems)
+class MenuItemsAdmin(LargeTableAdmin):
+    autocomplete_fields = ('restaurant',)
+    list_display = ('name', 'restaurant', 'price')
+    list_filter = ('restaurant',)
+    list_select_related = ('restaurant',)
+    ordering = ('name',)
+    search_fields = ('name',)
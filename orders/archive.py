@@ -0,0 +1,62 @@
+"""
+Moving old orders out of the Orders table
+
+archive_orders moves orders created before a cutoff into OrdersArchive, oldest
+first and one batch per transaction, so Orders only holds recent orders and
+its indexes stay small. The rollup tables keep counting archived orders.
+
+Reads that may cover archived orders query Orders first and then
+OrdersArchive, skipping the archive when their range starts after the newest
+archived order. That boundary is read from OrdersArchive on every request,
+one lookup at the end of its created index, since archive_orders runs in
+another process than the servers. When orders are sharded, each shard has
+its own archive and boundary.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+
+from .models import Orders, OrdersArchive
+
+COLUMNS = ['id', 'created', 'user_id', 'restaurant_id', 'quantity', 'item_id', 'comments', 'total_price']
+
+
+def archive_boundary(using=None):
+    """
+    Return the created time of the newest archived order, or None if there is none
+    """
+    return OrdersArchive.objects.using(using).aggregate(boundary=Max('created'))['boundary']
+
+
+def reaches_archive(after, using=None):
+    """
+    Return whether orders created at or after `after` may be archived
+    """
+    boundary = archive_boundary(using)
+    return boundary is not None and (after is None or after <= boundary)
+
+
+def archive_orders(cutoff, batch_size=500, using=None):
+    """
+    Move orders created before cutoff into OrdersArchive, yielding the size of each batch
+    """
+    alias = using or DEFAULT_DB_ALIAS
+    table = connections[alias].ops.quote_name(Orders._meta.db_table)
+    while True:
+        rows = list(
+            Orders.objects.using(alias).filter(created__lt=cutoff).order_by('created', 'id').values_list(
+                *COLUMNS
+            )[:batch_size]
+        )
+        if not rows:
+            return
+        # the batch moves in one commit; a list read across that commit may
+        # miss it only if its range starts between the old and new boundary
+        with transaction.atomic(using=alias):
+            OrdersArchive.objects.using(alias).bulk_create(OrdersArchive(**dict(zip(COLUMNS, row))) for row in rows)
+            # a raw delete sends no post_delete, so the rollups keep these orders
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(rows))})",
+                    [row[0] for row in rows],
+                )
+        yield len(rows)
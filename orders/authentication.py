@@ -0,0 +1,62 @@
+"""
+JSON Web Token authentication with per-process caching
+
+Verifying a token's signature and loading its user happen on every request.
+Verified tokens and resolved users are remembered for a short TTL in bounded
+in-process caches. Saving or deleting a user evicts it in the process that
+made the change, and the TTL bounds how long other processes keep it.
+"""
+import copy
+import time
+
+from django.conf import settings
+from rest_framework_jwt.authentication import (JSONWebTokenAuthentication,
+                                               jwt_get_username_from_payload)
+from rest_framework_jwt.settings import api_settings
+
+from .cache import MISSING, LRUCache
+
+AUTH_CACHE = getattr(settings, 'AUTH_CACHE', {})
+verified_tokens = LRUCache(AUTH_CACHE.get('MAX_SIZE', 10000), AUTH_CACHE.get('TTL', 30))
+users = LRUCache(AUTH_CACHE.get('MAX_SIZE', 10000), AUTH_CACHE.get('TTL', 30))
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """
+    JSONWebTokenAuthentication that memoizes signature verification per token
+    and the user resolved for each user id
+    """
+
+    def authenticate(self, request):
+        jwt_value = self.get_jwt_value(request)
+        if jwt_value is None:
+            return None
+
+        payload = self.get_verified_payload(jwt_value)
+        if payload is None:
+            result = super().authenticate(request)
+            verified_tokens.set(jwt_value, self.payload)
+            return result
+        return (self.authenticate_credentials(payload), jwt_value)
+
+    def get_verified_payload(self, jwt_value):
+        """
+        Return the payload of a token verified earlier, unless it has since expired
+        """
+        payload = verified_tokens.get(jwt_value)
+        if payload is MISSING:
+            return None
+        if api_settings.JWT_VERIFY_EXPIRATION and 'exp' in payload:
+            if payload['exp'] + api_settings.JWT_LEEWAY <= time.time():
+                verified_tokens.delete(jwt_value)
+                return None
+        return payload
+
+    def authenticate_credentials(self, payload):
+        self.payload = payload
+        user = users.get(payload.get('user_id'))
+        if user is MISSING or user.get_username() != jwt_get_username_from_payload(payload):
+            user = super().authenticate_credentials(payload)
+            users.set(user.pk, user)
+        # each request gets its own copy, as the cached user is shared
+        return copy.copy(user)
@@ -0,0 +1,175 @@
+"""
+Helpers shared by the benchmark management commands
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_jwt.settings import api_settings
+
+from .models import MenuItems, Orders, Restaurants
+from .rollups import ROLLUPS
+
+
+@contextmanager
+def scratch_database():
+    """
+    Run the body against a new, migrated database in place of the default one
+
+    This reuses the test database machinery, so the configured database is
+    never written to. SQLite scratch databases live in a temporary file rather
+    than in memory so that timings include real I/O.
+    """
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    if connection.vendor == 'sqlite':
+        handle, path = tempfile.mkstemp(prefix='orders-benchmark-', suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+
+
+@contextmanager
+def unthrottled():
+    """
+    Lift the request throttles in the body, which load from one benchmark user would trip
+    """
+    rates = dict.fromkeys(settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}))
+    with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+        yield
+
+
+def seed(restaurants=10, items=20, users=100, orders=100000, days=365, batch_size=5000, seed=0):
+    """
+    Fill the database with synthetic restaurants, menu items, customers and orders
+
+    Orders are spread over the last `days` days and inserted in one
+    transaction, then the rollup tables are rebuilt from them in one pass.
+    """
+    rng = random.Random(seed)
+    Restaurants.objects.bulk_create(
+        Restaurants(name=f"restaurant-{i}") for i in range(restaurants)
+    )
+    restaurant_rows = list(Restaurants.objects.filter(name__startswith="restaurant-"))
+    MenuItems.objects.bulk_create(
+        (
+            MenuItems(
+                restaurant=restaurant,
+                name=f"{restaurant.name}-item-{i}",
+                price=Decimal(rng.randint(100, 3000)) / 100,
+            )
+            for restaurant in restaurant_rows for i in range(items)
+        ),
+    )
+    menu = {}
+    for item in MenuItems.objects.filter(restaurant__in=restaurant_rows).select_related('restaurant'):
+        menu.setdefault(item.restaurant.name, []).append(item)
+    User.objects.bulk_create(User(username=f"customer-{i}") for i in range(users))
+    user_ids = list(User.objects.filter(username__startswith="customer-").values_list('pk', flat=True))
+
+    now = timezone.now()
+    span = int(timedelta(days=days).total_seconds())
+    names = sorted(menu)
+    ops = connection.ops
+    price_field = Orders._meta.get_field('total_price')
+    columns = ['created', 'user', 'restaurant', 'item', 'quantity', 'comments', 'total_price']
+    # orders are inserted with executemany, since building the INSERT
+    # statements through the ORM dominates the time to seed millions of rows
+    insert = "INSERT INTO {} ({}) VALUES ({})".format(
+        ops.quote_name(Orders._meta.db_table),
+        ', '.join(ops.quote_name(Orders._meta.get_field(name).column) for name in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, orders, batch_size):
+            batch = []
+            for _ in range(start, min(start + batch_size, orders)):
+                item = rng.choice(menu[rng.choice(names)])
+                quantity = rng.randint(1, 10)
+                batch.append((
+                    ops.adapt_datetimefield_value(now - timedelta(seconds=rng.randint(0, span))),
+                    rng.choice(user_ids),
+                    item.restaurant_id,
+                    item.pk,
+                    quantity,
+                    '',
+                    ops.adapt_decimalfield_value(
+                        quantity * item.price, price_field.max_digits, price_field.decimal_places
+                    ),
+                ))
+            cursor.executemany(insert, batch)
+
+    for rollup in ROLLUPS:
+        rollup.rebuild()
+
+
+def timed(func, repeat):
+    """
+    Call func `repeat` times and summarise the wall time of each call in ms
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def percentiles(samples):
+    """
+    Summarise latency samples in ms by percentile
+    """
+    samples = sorted(samples)
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))], 3)
+    return {
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def bearer_token(user):
+    """
+    Return an Authorization header value for user
+    """
+    payload = api_settings.JWT_PAYLOAD_HANDLER(user)
+    return f"{api_settings.JWT_AUTH_HEADER_PREFIX} {api_settings.JWT_ENCODE_HANDLER(payload)}"
+
+
+def read_paths():
+    """
+    The URL of each order read endpoint for a sample of the seeded data
+    """
+    sample = Orders.objects.order_by('created', 'id')[Orders.objects.count() // 2]
+    restaurant, customer = sample.restaurant.name, sample.user_id
+    return {
+        'orders-single': reverse('orders-single', kwargs={'pk': sample.pk}),
+        'orders-restaurant': reverse('orders-restaurant', kwargs={'restaurant': restaurant}),
+        'orders-customer': reverse('orders-customer', kwargs={'customer': customer}),
+        'cost-single': reverse('cost-single', kwargs={'restaurant': restaurant}),
+        'average-quantity': reverse('average-quantity', kwargs={'restaurant': restaurant, 'customer': customer}),
+    }
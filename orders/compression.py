@@ -0,0 +1,127 @@
+"""
+Response compression negotiated with Accept-Encoding
+
+CompressionMiddleware compresses responses of at least MIN_SIZE bytes with
+brotli or gzip, whichever the request's Accept-Encoding header prefers.
+Brotli is only offered when the brotli package is installed. Streaming
+responses, such as exports, are compressed chunk by chunk whatever their size,
+and each chunk is flushed so clients still receive rows as they are produced.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# gzip framing for zlib's compressor
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def available_encodings():
+    """
+    Return the encodings this server can produce, preferred first
+    """
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+def preferred_encoding(header, encodings):
+    """
+    Return the encoding among `encodings` that the Accept-Encoding header
+    gives the highest q value, or None if it accepts none of them
+
+    Ties go to the earlier encoding in `encodings`.
+    """
+    accepted = {}
+    for coding in header.split(','):
+        name, _, params = coding.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(encoding, content, level):
+    """
+    Return content compressed with encoding, at a gzip level or brotli quality
+    """
+    if encoding == 'br':
+        return brotli.compress(content, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+def compress_stream(encoding, chunks, level):
+    """
+    Compress an iterable of byte strings, flushing after each one
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses as configured by the RESPONSE_COMPRESSION setting
+    """
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'RESPONSE_COMPRESSION', {})
+        self.min_size = options.get('MIN_SIZE', 1024)
+        self.levels = {'gzip': options.get('GZIP_LEVEL', 6), 'br': options.get('BROTLI_QUALITY', 5)}
+        self.encodings = available_encodings()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = preferred_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(encoding, response.streaming_content, level)
+            del response['Content-Length']
+        else:
+            content = compress(encoding, response.content, level)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # the body is no longer byte for byte the one the tag was made for
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
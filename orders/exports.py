@@ -0,0 +1,81 @@
+"""
+Generators that stream orders as NDJSON or CSV in constant memory
+"""
+import csv
+import heapq
+import json
+
+from .serializers import order_rows
+
+CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+
+def export_rows(querysets, encoder=order_rows, chunk_size=CHUNK_SIZE):
+    """
+    Yield the values of encoder's fields for each order, formatted the same
+    way as OrderSerializer
+
+    Rows of several querysets, such as live and archived orders, are merged
+    in (created, id) order.
+    """
+    created, pk = encoder.columns.index('created'), encoder.columns.index('id')
+    rows = heapq.merge(
+        *(
+            queryset.order_by('created', 'id').values_list(*encoder.columns).iterator(chunk_size=chunk_size)
+            for queryset in querysets
+        ),
+        key=lambda row: (row[created], row[pk])
+    )
+    previous = None
+    for row in rows:
+        # an order being archived may be read from both tables
+        if previous is None or row[pk] != previous[pk]:
+            yield encoder.values(row)
+        previous = row
+
+
+def batched(lines):
+    """
+    Join lines into larger writes so the response is not sent a row at a time
+    """
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def ndjson_export(querysets, encoder=order_rows):
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    fields = encoder.fields
+    return batched(dumps(dict(zip(fields, row))) + '\n' for row in export_rows(querysets, encoder))
+
+
+class Echo:
+    """
+    File-like object whose write returns the line instead of storing it
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(querysets, encoder):
+    writer = csv.writer(Echo())
+    yield writer.writerow(encoder.fields)
+    for row in export_rows(querysets, encoder):
+        yield writer.writerow(row)
+
+
+def csv_export(querysets, encoder=order_rows):
+    return batched(csv_lines(querysets, encoder))
+
+
+FORMATS = {
+    'ndjson': (ndjson_export, 'application/x-ndjson'),
+    'csv': (csv_export, 'text/csv'),
+}
@@ -0,0 +1,58 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def parse_created(name, value):
+    """
+    Parse an ISO 8601 date or datetime query parameter into an aware datetime
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            parsed = datetime.combine(date, time.min) if date else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: f"{value} is not a valid ISO 8601 date or datetime"})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def created_range(params):
+    """
+    Return the (created_after, created_before) bounds in the query parameters
+
+    created_after is inclusive and created_before is exclusive, and either may
+    be None when it was not given.
+    """
+    bounds = []
+    for name in ('created_after', 'created_before'):
+        value = params.get(name)
+        bounds.append(parse_created(name, value) if value else None)
+    return tuple(bounds)
+
+
+def filter_created(queryset, params):
+    """
+    Restrict queryset to the created range given in the query parameters
+    """
+    after, before = created_range(params)
+    if after is not None:
+        queryset = queryset.filter(created__gte=after)
+    if before is not None:
+        queryset = queryset.filter(created__lt=before)
+    return queryset
+
+
+def requested_fields(params):
+    """
+    Return the field names listed in the fields query parameter, or None if
+    it lists none
+    """
+    names = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    return names or None
@@ -0,0 +1,164 @@
+"""
+Bulk loading of past orders from CSV or NDJSON in the export format
+
+import_orders reads rows as they are needed and inserts them in batches with
+bulk_create_priced, one transaction per batch, so memory use does not grow
+with the input and a failure only loses the batch in progress. Restaurants
+and menu items are resolved by name from maps loaded once, and users are
+checked once per batch. Orders keep the created time of their row, and their
+total_price is computed from the current menu price; the id and total_price
+columns are ignored.
+
+Given a source name, each batch also records in OrderImports how many rows
+of the source are imported, in the batch's own transaction, so an import
+that stops for any reason resumes after exactly the rows it committed. When
+orders are sharded the shards commit before that record, so a crash in
+between re-imports the batch.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .filters import parse_created
+from .models import MenuItems, OrderImports, Orders, Restaurants
+
+FORMATS = ('csv', 'ndjson')
+REQUIRED = ('created', 'user', 'restaurant', 'quantity', 'item')
+BATCH_SIZE = 2000
+# ids per query when checking users, below SQLite's limit on query parameters
+USER_CHUNK_SIZE = 500
+
+
+class InvalidRow(Exception):
+
+    def __init__(self, number, message):
+        super().__init__(f"Row {number}: {message}")
+        self.number = number
+
+
+def read_rows(file, file_format):
+    """
+    Yield each row of a CSV file with a header line as a dict, or each line
+    of an NDJSON file, which OrderBuilder decodes so that a malformed line is
+    reported with its row number
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield line
+
+
+class OrderBuilder:
+    """
+    Builds unsaved orders from rows, naming restaurants and menu items from
+    maps of every restaurant and menu item
+    """
+
+    def __init__(self):
+        self.restaurants = dict(Restaurants.objects.values_list('name', 'pk'))
+        self.items = {item.name: item for item in MenuItems.objects.all()}
+
+    def order(self, row):
+        """
+        Return the order for row, or raise ValueError describing what is wrong with it
+        """
+        if isinstance(row, str):
+            row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError("not a JSON object")
+        missing = [name for name in REQUIRED if row.get(name) in (None, '')]
+        if missing:
+            raise ValueError(f"{', '.join(missing)} missing")
+        restaurant = self.restaurants.get(row['restaurant'])
+        if restaurant is None:
+            raise ValueError(f"restaurant {row['restaurant']} does not exist")
+        item = self.items.get(row['item'])
+        if item is None:
+            raise ValueError(f"item {row['item']} does not exist")
+        if item.restaurant_id != restaurant:
+            raise ValueError(f"{row['restaurant']} does not sell {row['item']}")
+        quantity = self.whole_number('quantity', row['quantity'])
+        if quantity < 0:
+            raise ValueError(f"quantity {quantity} is negative")
+        comments = row.get('comments') or ''
+        if len(comments) > Orders._meta.get_field('comments').max_length:
+            raise ValueError("comments are too long")
+        try:
+            created = parse_created('created', str(row['created']))
+        except ValidationError as error:
+            raise ValueError(error.detail['created'])
+        return Orders(
+            created=created,
+            user_id=self.whole_number('user', row['user']),
+            restaurant_id=restaurant,
+            item=item,
+            quantity=quantity,
+            comments=comments,
+        )
+
+    def whole_number(self, name, value):
+        # int() would truncate a JSON 3.5 rather than reject it
+        if isinstance(value, str):
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{name} {value} is not a whole number")
+        return value
+
+
+def missing_users(orders):
+    ids = list({order.user_id for order in orders})
+    found = set()
+    for start in range(0, len(ids), USER_CHUNK_SIZE):
+        found.update(User.objects.filter(pk__in=ids[start:start + USER_CHUNK_SIZE]).values_list('pk', flat=True))
+    return set(ids) - found
+
+
+def imported_rows(source):
+    """
+    Return the number of rows of source already imported
+    """
+    return OrderImports.objects.filter(source=source).values_list('rows', flat=True).first() or 0
+
+
+def import_orders(rows, batch_size=BATCH_SIZE, start=0, source=None):
+    """
+    Insert an order for each row, yielding the number of rows in each
+    committed batch
+
+    `start` is the number of rows already imported from the input, which
+    rows no longer include. Raises InvalidRow for the first row that cannot
+    be imported, leaving the batches before its own imported. With a source,
+    its OrderImports row counts the imported rows.
+    """
+    builder = OrderBuilder()
+    rows = iter(rows)
+    number = start
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        orders = []
+        for row in batch:
+            number += 1
+            try:
+                orders.append(builder.order(row))
+            except (TypeError, ValueError) as error:
+                raise InvalidRow(number, error)
+        missing = missing_users(orders)
+        if missing:
+            index = next(index for index, order in enumerate(orders) if order.user_id in missing)
+            raise InvalidRow(number - len(orders) + index + 1, f"user {orders[index].user_id} does not exist")
+        with transaction.atomic():
+            Orders.objects.bulk_create_priced(orders, keep_created=True)
+            if source is not None:
+                OrderImports.objects.update_or_create(source=source, defaults={'rows': number})
+        yield len(batch)
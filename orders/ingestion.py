@@ -0,0 +1,177 @@
+"""
+Group commit of new orders
+
+On SQLite every write transaction takes the database lock and waits for its
+own fsync, so concurrent POSTs queue up on the lock, or fail with "database
+is locked" once they time out. With ORDER_INGESTION['GROUP_COMMIT'] on,
+requests still validate their orders themselves but hand them to a single
+writer thread per process. It inserts whatever has been queued within
+MAX_DELAY_MS, up to MAX_BATCH orders, in one transaction and then answers
+each request with its own orders and ids. A request whose orders are not
+picked up within TIMEOUT_MS, because the writer died or is stuck, withdraws
+them and fails with 503.
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router
+
+from .models import Orders
+
+_STOP = object()
+
+
+class WriterUnavailable(Exception):
+    pass
+
+
+class GroupCommitQueue:
+    """
+    Inserts orders submitted from many threads in shared transactions
+    """
+
+    def __init__(self, max_batch=200, max_delay=0.002, timeout=10):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, orders):
+        """
+        Queue unsaved orders for insertion
+
+        Returns a Future resolving to the saved orders once their transaction
+        has committed, or raising the error that stopped them being saved.
+        """
+        future = Future()
+        self.start()
+        self.queue.put((future, orders))
+        return future
+
+    def save(self, orders):
+        """
+        Queue unsaved orders and wait until they are saved
+
+        Raises WriterUnavailable, leaving the orders unsaved, if the writer
+        does not take them within `timeout` seconds, or does not finish
+        writing them within another `timeout`.
+        """
+        future = self.submit(orders)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise WriterUnavailable("the order writer did not take the orders in time")
+        # the writer took them just now, so give it time to finish
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise WriterUnavailable("the order writer did not finish writing the orders in time")
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='order-group-commit', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        """
+        Write everything already queued, then stop the writer thread
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join()
+
+    def run(self):
+        try:
+            self.write_batches()
+        finally:
+            connections.close_all()
+
+    def write_batches(self):
+        stopping = False
+        while not stopping:
+            entry = self.queue.get()
+            if entry is _STOP:
+                return
+            batch = [entry]
+            size = len(entry[1])
+            deadline = time.monotonic() + self.max_delay
+            while size < self.max_batch:
+                try:
+                    entry = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+                size += len(entry[1])
+            self.write(batch)
+
+    def write(self, batch):
+        """
+        Insert the orders of all requests writing to the same database in one
+        transaction and resolve their futures
+
+        If that transaction fails, each request is retried in a transaction of
+        its own so one bad request cannot fail the others. Requests whose
+        orders span several shards are always written on their own.
+        """
+        groups = OrderedDict()
+        # requests that gave up waiting have withdrawn their orders
+        batch = [entry for entry in batch if entry[0].set_running_or_notify_cancel()]
+        for entry in batch:
+            groups.setdefault(self.databases(entry[1]), []).append(entry)
+        for databases, entries in groups.items():
+            if len(databases) == 1:
+                self.write_group(entries)
+            else:
+                for future, orders in entries:
+                    self.write_one(future, orders)
+
+    def databases(self, orders):
+        return frozenset(router.db_for_write(Orders, instance=order) for order in orders)
+
+    def write_group(self, entries):
+        try:
+            Orders.objects.bulk_create_priced([order for _, orders in entries for order in orders])
+        except DatabaseError as error:
+            if len(entries) == 1:
+                entries[0][0].set_exception(error)
+            else:
+                for future, orders in entries:
+                    self.write_one(future, orders)
+        except Exception as error:
+            for future, _ in entries:
+                future.set_exception(error)
+        else:
+            for future, orders in entries:
+                future.set_result(orders)
+
+    def write_one(self, future, orders):
+        # ids given out by the rolled back transaction
+        for order in orders:
+            order.pk = None
+        try:
+            Orders.objects.bulk_create_priced(orders)
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(orders)
+
+
+ORDER_INGESTION = getattr(settings, 'ORDER_INGESTION', {})
+order_queue = GroupCommitQueue(
+    max_batch=ORDER_INGESTION.get('MAX_BATCH', 200),
+    max_delay=ORDER_INGESTION.get('MAX_DELAY_MS', 2) / 1000,
+    timeout=ORDER_INGESTION.get('TIMEOUT_MS', 10000) / 1000,
+) if ORDER_INGESTION.get('GROUP_COMMIT') else None
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from orders.archive import archive_orders
+from orders.filters import parse_created
+from orders.sharding import order_databases
+
+
+class Command(BaseCommand):
+    help = "Move old orders from Orders into OrdersArchive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help="Archive orders created before this ISO 8601 date or datetime",
+        )
+        parser.add_argument(
+            '--older-than-days', type=int, default=365,
+            help="Archive orders older than this many days, when --before is not given (default: 365)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Number of orders moved per transaction (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = parse_created('before', options['before'])
+            except ValidationError as error:
+                raise CommandError(error.detail['before'])
+        else:
+            cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+
+        moved = 0
+        for database in order_databases():
+            for count in archive_orders(cutoff, batch_size=options['batch_size'], using=database):
+                moved += count
+                self.stdout.write(f"Archived {moved} orders", ending='\r')
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders created before {cutoff.isoformat()}"))
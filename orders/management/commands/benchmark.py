@@ -0,0 +1,252 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from orders import urls
+from orders.benchmarks import percentiles, scratch_database, seed, unthrottled
+from orders.models import MenuItems, Orders, Restaurants
+
+USERNAME = PASSWORD = 'benchmark'
+
+
+class Requests:
+    """
+    Builds randomised requests for each route in orders/urls.py from the seeded data
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.order_ids = list(Orders.objects.values_list('pk', flat=True))
+        self.restaurants = sorted(
+            Restaurants.objects.filter(orders__isnull=False).values_list('name', flat=True).distinct()
+        )
+        self.customers = sorted(Orders.objects.values_list('user_id', flat=True).distinct())
+        self.items = {}
+        for name, restaurant in MenuItems.objects.values_list('name', 'restaurant__name'):
+            self.items.setdefault(restaurant, []).append(name)
+
+    def routes(self):
+        """
+        Map each benchmark name to the URL name it drives and a request factory
+        """
+        return {
+            'orders-all GET': ('orders-all', self.list_orders),
+            'orders-all POST': ('orders-all', self.create_order),
+            'orders-single GET': ('orders-single', self.order),
+            'orders-restaurant GET': ('orders-restaurant', self.restaurant_orders),
+            'orders-customer GET': ('orders-customer', self.customer_orders),
+            'orders-export GET ndjson': ('orders-export', lambda: self.export('ndjson')),
+            'orders-export GET csv': ('orders-export', lambda: self.export('csv')),
+            'cost-single GET': ('cost-single', self.cost),
+            'revenue-buckets GET day': ('revenue-buckets', lambda: self.revenue('day', days=90)),
+            'revenue-buckets GET hour': ('revenue-buckets', lambda: self.revenue('hour', days=7)),
+            'top-items GET': ('top-items', self.top_items),
+            'top-items GET 30 days': ('top-items', lambda: self.top_items(days=30)),
+            'average-quantity GET': ('average-quantity', self.average_quantity),
+            'quantity-stats GET': ('quantity-stats', self.quantity_stats),
+            'generate-token POST': ('generate-token', self.token),
+        }
+
+    def restaurant(self):
+        return self.rng.choice(self.restaurants)
+
+    def customer(self):
+        return self.rng.choice(self.customers)
+
+    def list_orders(self):
+        return 'GET', reverse('orders-all'), {}, None
+
+    def create_order(self):
+        restaurant = self.restaurant()
+        data = {'restaurant': restaurant, 'item': self.rng.choice(self.items[restaurant]), 'quantity': 1}
+        return 'POST', reverse('orders-all'), {}, data
+
+    def order(self):
+        return 'GET', reverse('orders-single', kwargs={'pk': self.rng.choice(self.order_ids)}), {}, None
+
+    def restaurant_orders(self):
+        return 'GET', reverse('orders-restaurant', kwargs={'restaurant': self.restaurant()}), {}, None
+
+    def customer_orders(self):
+        return 'GET', reverse('orders-customer', kwargs={'customer': self.customer()}), {}, None
+
+    def export(self, export_format):
+        url = reverse('orders-export', kwargs={'export_format': export_format})
+        return 'GET', url, {'customer': self.customer()}, None
+
+    def cost(self):
+        return 'GET', reverse('cost-single', kwargs={'restaurant': self.restaurant()}), {}, None
+
+    def revenue(self, granularity, days):
+        url = reverse('revenue-buckets', kwargs={'restaurant': self.restaurant()})
+        after = (timezone.now() - timedelta(days=days)).isoformat()
+        return 'GET', url, {'bucket': granularity, 'created_after': after}, None
+
+    def top_items(self, days=None):
+        url = reverse('top-items', kwargs={'restaurant': self.restaurant()})
+        query = {'rank_by': self.rng.choice(['quantity', 'revenue'])}
+        if days:
+            query['created_after'] = (timezone.now() - timedelta(days=days)).isoformat()
+        return 'GET', url, query, None
+
+    def average_quantity(self):
+        kwargs = {'restaurant': self.restaurant(), 'customer': self.customer()}
+        return 'GET', reverse('average-quantity', kwargs=kwargs), {}, None
+
+    def quantity_stats(self):
+        kwargs = {'restaurant': self.restaurant(), 'customer': self.customer()}
+        return 'GET', reverse('quantity-stats', kwargs=kwargs), {}, None
+
+    def token(self):
+        return 'POST', reverse('generate-token'), {}, {'username': USERNAME, 'password': PASSWORD}
+
+
+def wsgi_environ(method, path, query, data, authorization):
+    body = json.dumps(data).encode() if data is not None else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(query),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if authorization:
+        environ['HTTP_AUTHORIZATION'] = authorization
+    return environ
+
+
+def call(application, environ):
+    """
+    Serve one request and return its latency in ms, status code and query count
+    """
+    statuses = []
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count):
+        result = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()
+    return (time.perf_counter() - started) * 1000, int(statuses[0].split(' ', 1)[0]), len(queries)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and load test every route in orders/urls.py with "
+        "concurrent in-process requests, reporting latency, throughput and queries "
+        "per request as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--restaurants', type=int, default=20)
+        parser.add_argument('--items', type=int, default=20, help="Menu items per restaurant")
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the dataset and the requests")
+        parser.add_argument('--route', action='append', help="Only benchmark this route; may be repeated")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        application = get_wsgi_application()
+        with scratch_database(), unthrottled():
+            started = time.perf_counter()
+            seed(
+                restaurants=options['restaurants'],
+                items=options['items'],
+                users=options['users'],
+                orders=options['orders'],
+                seed=options['seed'],
+            )
+            seconds = time.perf_counter() - started
+            User.objects.create_user(username=USERNAME, password=PASSWORD)
+            requests = Requests(random.Random(options['seed']))
+            routes = requests.routes()
+            missing = {pattern.name for pattern in urls.urlpatterns} - {name for name, _ in routes.values()}
+            if missing:
+                raise CommandError(f"No benchmark drives these routes: {', '.join(sorted(missing))}")
+            if options['route']:
+                unknown = set(options['route']) - set(routes)
+                if unknown:
+                    raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+                routes = {name: routes[name] for name in options['route']}
+
+            authorization = self.login(application)
+            report = {
+                'backend': connection.vendor,
+                'dataset': {
+                    key: options[key] for key in ('orders', 'restaurants', 'items', 'users', 'seed')
+                },
+                'seed_seconds': round(seconds, 3),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'routes': {},
+            }
+            for name, (url_name, build) in routes.items():
+                environs = [
+                    wsgi_environ(*build(), authorization) for _ in range(options['requests'] + 1)
+                ]
+                # the first request warms per-process caches and is not measured
+                call(application, environs.pop())
+                report['routes'][name] = self.measure(application, environs, options['concurrency'])
+                self.stderr.write(f"{name}: {report['routes'][name]['requests_per_second']} req/s")
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def login(self, application):
+        environ = wsgi_environ('POST', reverse('generate-token'), {}, {'username': USERNAME, 'password': PASSWORD}, None)
+        statuses = []
+        result = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            token = json.loads(b''.join(result))['token']
+        finally:
+            result.close()
+        return f"Bearer {token}"
+
+    def measure(self, application, environs, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda environ: call(application, environ), environs))
+        elapsed = time.perf_counter() - started
+        summary = percentiles([latency for latency, status_code, queries in results])
+        summary['requests_per_second'] = round(len(results) / elapsed, 1)
+        summary['queries_per_request'] = round(sum(queries for _, _, queries in results) / len(results), 2)
+        summary['errors'] = sum(1 for _, status_code, _ in results if status_code >= 400)
+        return summary
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from orders.benchmarks import (bearer_token, percentiles, read_paths,
+                               scratch_database, seed, unthrottled)
+from restaurant_api.asgi import WSGIBridge
+
+
+def request_scope(path, authorization):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'host', b'localhost'), (b'authorization', authorization.encode())],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and compare latency and throughput of the order "
+        "read endpoints served to slow clients through the WSGI and ASGI entry points"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=500, help="Requests per entry point")
+        parser.add_argument('--clients', type=int, default=100, help="Concurrent clients")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI server threads and ASGI view threads")
+        parser.add_argument(
+            '--client-delay', type=float, default=50,
+            help="Milliseconds each client takes to receive its response"
+        )
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        with scratch_database(), unthrottled():
+            seed(orders=options['orders'])
+            authorization = bearer_token(User.objects.filter(username__startswith="customer-").first())
+            paths = list(islice(cycle(read_paths().values()), options['requests']))
+            scopes = [request_scope(path, authorization) for path in paths]
+            delay = options['client_delay'] / 1000
+            wsgi_application = get_wsgi_application()
+            bridge = WSGIBridge(wsgi_application, max_workers=options['threads'])
+
+            report = {
+                'requests': options['requests'],
+                'clients': options['clients'],
+                'threads': options['threads'],
+                'client_delay_ms': options['client_delay'],
+                'entry_points': {
+                    'wsgi': self.measure_wsgi(wsgi_application, bridge, scopes, delay, options),
+                    'asgi': self.measure_asgi(bridge, scopes, delay, options),
+                },
+            }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def measure_wsgi(self, application, bridge, scopes, delay, options):
+        """
+        Serve the requests as a threaded WSGI server would, where a slow client
+        holds its thread until it has read the whole response
+        """
+        def serve(scope, started):
+            statuses = []
+            result = application(bridge.environ(scope, b''), lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                time.sleep(delay)
+                b''.join(result)
+            finally:
+                result.close()
+                slots.release()
+            return (time.perf_counter() - started) * 1000, statuses[0].startswith('200')
+
+        # a client's request waits for a free server thread once it is sent
+        slots = threading.BoundedSemaphore(options['clients'])
+        futures = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            for scope in scopes:
+                slots.acquire()
+                futures.append(executor.submit(serve, scope, time.perf_counter()))
+            results = [future.result() for future in futures]
+        return self.summarise(results, time.perf_counter() - started)
+
+    def measure_asgi(self, bridge, scopes, delay, options):
+        """
+        Serve the requests through the ASGI bridge, where slow clients are
+        waited on by the event loop instead of a thread
+        """
+        async def serve(scope, slots):
+            async with slots:
+                started = time.perf_counter()
+                statuses = []
+
+                async def receive():
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        statuses.append(message['status'])
+                    elif not message.get('more_body', False):
+                        await asyncio.sleep(delay)
+
+                await bridge(scope, receive, send)
+                return (time.perf_counter() - started) * 1000, statuses[0] == 200
+
+        async def serve_all():
+            slots = asyncio.Semaphore(options['clients'])
+            return await asyncio.gather(*(serve(scope, slots) for scope in scopes))
+
+        loop = asyncio.new_event_loop()
+        try:
+            started = time.perf_counter()
+            results = loop.run_until_complete(serve_all())
+            elapsed = time.perf_counter() - started
+        finally:
+            loop.close()
+            bridge.executor.shutdown()
+        return self.summarise(results, elapsed)
+
+    def summarise(self, results, elapsed):
+        summary = percentiles([latency for latency, ok in results])
+        summary['requests_per_second'] = round(len(results) / elapsed, 1)
+        summary['errors'] = sum(1 for latency, ok in results if not ok)
+        return summary
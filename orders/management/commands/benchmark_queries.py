@@ -0,0 +1,141 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from orders.archive import archive_orders
+from orders.benchmarks import scratch_database, seed, timed
+from orders.models import Orders, OrdersArchive, QuantityStats, Restaurants
+from orders.pagination import KeysetPagination
+from orders.views import (OrdersCustomerListView, OrdersListCreateView,
+                          OrdersRestaurantListView, OrdersRetrieveView)
+
+PAGE_SIZE = 100
+
+
+def order_view(view_class, params=None, **attributes):
+    """
+    Return an instance of an order view set up for a GET with params
+    """
+    request = Request(APIRequestFactory().get('/', params or {}))
+    return view_class(**{'request': request, 'args': (), 'kwargs': {}, 'format_kwarg': None, **attributes})
+
+
+def page_queries(view, position=None):
+    """
+    The queries a list view reads a page with: its values_list rows from the
+    orders table, and from the archive when the range reaches it, each filtered
+    to the page by the keyset paginator
+    """
+    paginator = KeysetPagination()
+    return [
+        paginator.filter_queryset(queryset, False, position)[:PAGE_SIZE + 1] for queryset in view.get_querysets()
+    ]
+
+
+def view_queries():
+    """
+    The queries behind each order view, as the views build them against the seeded data
+    """
+    sample = Orders.objects.order_by('created', 'id')[Orders.objects.count() // 2]
+    restaurant, user = sample.restaurant_id, sample.user_id
+    position = (sample.created, sample.id)
+    restaurant_view = order_view(OrdersRestaurantListView, restaurant=Restaurants.objects.get(pk=restaurant))
+    customer_view = order_view(OrdersCustomerListView, kwargs={'customer': user})
+    single_view = order_view(OrdersRetrieveView)
+    return {
+        'orders-all': page_queries(order_view(OrdersListCreateView)),
+        'orders-all-cursor': page_queries(order_view(OrdersListCreateView), position),
+        # created_after past the newest archived order, so only the orders table is read
+        'orders-all-recent': page_queries(
+            order_view(OrdersListCreateView, {'created_after': sample.created.isoformat()})
+        ),
+        'orders-single': [
+            single_view.filter_queryset(single_view.get_queryset()).filter(pk=sample.pk).values_list(
+                *single_view.get_encoder().columns
+            )[:1]
+        ],
+        'orders-restaurant': page_queries(restaurant_view),
+        'orders-restaurant-cursor': page_queries(restaurant_view, position),
+        'orders-customer': page_queries(customer_view),
+        'orders-customer-cursor': page_queries(customer_view, position),
+        'cost-single': [Restaurants.objects.filter(pk=restaurant).values_list(
+            'revenue_rollup__revenue', 'revenue_rollup__order_count'
+        )],
+        'average-quantity': [QuantityStats.objects.filter(restaurant=restaurant, user=user)[:1]],
+        # re-read by the QuantityStats rollup after a delete
+        'quantity-extremes': [
+            model.objects.filter(restaurant=restaurant, user=user).values('restaurant_id', 'user_id').annotate(
+                min_quantity=Min('quantity'), max_quantity=Max('quantity')
+            ).order_by()
+            for model in (Orders, OrdersArchive)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and record the query plan and latency of each "
+        "order view's queries with and without the Orders and OrdersArchive indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--restaurants', type=int, default=20)
+        parser.add_argument('--items', type=int, default=20, help="Menu items per restaurant")
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--archive-days', type=int, default=300,
+            help="Archive the orders older than this many days, out of a year of orders",
+        )
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed(
+                restaurants=options['restaurants'],
+                items=options['items'],
+                users=options['users'],
+                orders=options['orders'],
+            )
+            for _ in archive_orders(timezone.now() - timedelta(days=options['archive_days']), batch_size=5000):
+                pass
+            report = {
+                'backend': connection.vendor,
+                'dataset': {
+                    key: options[key] for key in ('orders', 'restaurants', 'items', 'users', 'archive_days')
+                },
+                'queries': {},
+            }
+            queries = report['queries']
+
+            with connection.schema_editor() as editor:
+                for model in (Orders, OrdersArchive):
+                    for index in model._meta.indexes:
+                        editor.remove_index(model, index)
+            self.measure(queries, 'before', options['repeat'])
+
+            with connection.schema_editor() as editor:
+                for model in (Orders, OrdersArchive):
+                    for index in model._meta.indexes:
+                        editor.add_index(model, index)
+            self.measure(queries, 'after', options['repeat'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def measure(self, queries, label, repeat):
+        for name, querysets in view_queries().items():
+            result = timed(lambda: [list(queryset.all()) for queryset in querysets], repeat)
+            result['plan'] = [line for queryset in querysets for line in queryset.explain().splitlines()]
+            queries.setdefault(name, {})[label] = result
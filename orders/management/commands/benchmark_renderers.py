@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from orders.benchmarks import scratch_database, seed, timed
+from orders.compression import available_encodings, compress
+from orders.models import Orders
+from orders.renderers import (ColumnarJSONRenderer, FastJSONRenderer,
+                              MessagePackRenderer, msgpack)
+from orders.serializers import order_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and report how long each renderer takes to "
+        "encode a list of orders, and its size as is and with each content encoding"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help="Orders in the rendered list")
+        parser.add_argument('--repeat', type=int, default=10, help="Timed runs per renderer and encoding")
+        parser.add_argument('--gzip-level', type=int, default=6)
+        parser.add_argument('--brotli-quality', type=int, default=5)
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        levels = {'gzip': options['gzip_level'], 'br': options['brotli_quality']}
+        renderers = [
+            ('json (rest_framework)', JSONRenderer(), order_rows.encode),
+            ('json', FastJSONRenderer(), order_rows.encode),
+            ('columnar json', ColumnarJSONRenderer(), order_rows.encode_columns),
+        ]
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer(), order_rows.encode))
+
+        with scratch_database():
+            seed(orders=options['orders'])
+            rows = list(Orders.objects.order_by('created', 'id').values_list(*order_rows.columns))
+            report = {
+                'backend': connection.vendor,
+                'orders': len(rows),
+                'renderers': {},
+            }
+            for name, renderer, encode in renderers:
+                data = encode(rows)
+                body = renderer.render(data)
+                result = {'encode': timed(lambda: renderer.render(data), options['repeat']), 'bytes': len(body)}
+                for encoding in available_encodings():
+                    level = levels[encoding]
+                    result[encoding] = {
+                        'compress': timed(lambda: compress(encoding, body, level), options['repeat']),
+                        'bytes': len(compress(encoding, body, level)),
+                    }
+                report['renderers'][name] = result
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
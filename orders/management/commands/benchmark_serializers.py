@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from orders.benchmarks import scratch_database, seed, timed
+from orders.models import Orders
+from orders.serializers import OrderSerializer, order_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and compare how many orders per second the "
+        "list views render through OrderSerializer and through the row encoder"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--rows', type=int, default=1000, help="Orders rendered per timed run")
+        parser.add_argument('--repeat', type=int, default=10, help="Timed runs per path")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        render = JSONRenderer().render
+        with scratch_database():
+            seed(orders=options['orders'])
+            queryset = Orders.objects.order_by('created', 'id')[:rows]
+
+            def serializer():
+                return render(OrderSerializer(queryset.all(), many=True).data)
+
+            def encoder():
+                return render(order_rows.encode(queryset.values_list(*order_rows.columns)))
+
+            if serializer() != encoder():
+                self.stderr.write("The row encoder's output differs from OrderSerializer's")
+            report = {
+                'backend': connection.vendor,
+                'orders': options['orders'],
+                'rows': rows,
+                'paths': {},
+            }
+            for name, func in [('serializer', serializer), ('encoder', encoder)]:
+                result = timed(func, options['repeat'])
+                result['rows_per_second'] = round(rows / result['median_ms'] * 1000)
+                report['paths'][name] = result
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
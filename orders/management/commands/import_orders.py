@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.imports import (BATCH_SIZE, FORMATS, InvalidRow, import_orders,
+                            imported_rows, read_rows)
+from orders.models import OrderImports
+from orders.versions import shared_cache
+
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import past orders from a CSV or NDJSON file in the export format, keeping "
+        "their created times. An interrupted or failed import resumes where it stopped, and a "
+        "completed one is not imported again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for standard input")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help="Input format (default: from the file extension)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f"Number of orders inserted per transaction (default: {BATCH_SIZE})",
+        )
+        parser.add_argument(
+            '--source',
+            help="Name the import's progress is recorded under (default: the absolute input path; "
+                 "imports from standard input only resume with a name)",
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Import from the first row even if part or all of the source was imported before",
+        )
+        parser.add_argument(
+            '--local-cache', action='store_true',
+            help="Import even though the default cache is local to this process, when no server is running "
+                 "or servers are restarted afterwards",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError("Cannot tell the input format from the file name, pass --format")
+        if not options['local_cache'] and not shared_cache():
+            # the order list versions bumped here would never reach running servers
+            raise CommandError(
+                "The default cache is local to this process, so running servers would keep answering "
+                "conditional GETs and top items from before the import. Configure a shared cache, or "
+                "pass --local-cache and restart the servers afterwards."
+            )
+        source = options['source'] or (None if path == '-' else os.path.abspath(path))
+
+        done = 0
+        if source and options['restart']:
+            OrderImports.objects.filter(source=source).delete()
+        elif source:
+            completed = OrderImports.objects.filter(source=source).values_list('completed', flat=True).first()
+            if completed:
+                raise CommandError(
+                    f"{source} was imported completely on {completed:%Y-%m-%d %H:%M}, "
+                    f"pass --restart to import it again"
+                )
+            done = imported_rows(source)
+            if done:
+                self.stdout.write(f"Resuming after {done} rows imported before")
+
+        imported = 0
+        started = time.perf_counter()
+        with self.open(path) as file:
+            rows = read_rows(file, file_format)
+            # rows imported before are still read, but not imported again
+            for _ in range(done):
+                if next(rows, None) is None:
+                    break
+            try:
+                for count in import_orders(rows, batch_size=options['batch_size'], start=done, source=source):
+                    imported += count
+                    self.stdout.write(
+                        f"Imported {done + imported} orders, {self.rate(imported, started)} rows/s", ending='\r'
+                    )
+            except InvalidRow as error:
+                resume = " Fix it and run the command again to resume." if source else ""
+                raise CommandError(f"{error}. {done + imported} rows are imported.{resume}")
+
+        if source:
+            # kept, so running the command on the same source again imports nothing twice
+            OrderImports.objects.update_or_create(
+                source=source, defaults={'rows': done + imported, 'completed': timezone.now()}
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} orders in {time.perf_counter() - started:.1f}s "
+            f"({self.rate(imported, started)} rows/s)"
+        ))
+
+    def open(self, path):
+        if path == '-':
+            return open(sys.stdin.fileno(), encoding='utf-8', newline='', closefd=False)
+        try:
+            return open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(f"Cannot open {path}: {error.strerror}")
+
+    def rate(self, rows, started):
+        return round(rows / max(time.perf_counter() - started, 1e-9))
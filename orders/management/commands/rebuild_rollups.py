@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.rollups import ROLLUPS
+from orders.sharding import on_shard, order_databases
+
+
+class Command(BaseCommand):
+    help = "Rebuild the order rollup tables from scratch and verify them against Orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only verify the rollup tables, without rebuilding them",
+        )
+
+    def handle(self, *args, **options):
+        failed = False
+        for database in order_databases():
+            with on_shard(database):
+                for rollup in ROLLUPS:
+                    name = rollup.model.__name__ if database is None else f"{rollup.model.__name__} on {database}"
+                    if not options['check']:
+                        rollup.rebuild()
+                        self.stdout.write(f"Rebuilt {name}")
+
+                    mismatches = rollup.verify()
+                    for key, expected, actual in mismatches:
+                        self.stderr.write(f"{name} {key}: expected {expected}, found {actual}")
+                    if mismatches:
+                        failed = True
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"{name} matches Orders"))
+
+        if failed:
+            raise CommandError("Rollup tables do not match Orders")
@@ -0,0 +1,137 @@
+"""
+In-process cache of restaurants and menu items
+
+Order writes resolve restaurants and items by name and price items on every
+request, and order reads turn the restaurant and item ids orders store back
+into names, while the menu itself rarely changes. Entries are loaded lazily,
+evicted least recently used first and expire after a TTL, and every write to
+Restaurants or MenuItems clears the cache of the process that made it. The
+TTL bounds how long other processes can serve a stale menu.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from .cache import MISSING, LRUCache
+from .models import MenuItems, Restaurants
+
+
+class MenuCache:
+    """
+    Resolves restaurant and menu item names and ids without a query once they
+    are cached
+
+    Lookups return new model instances built from the cached values, so callers
+    never share an instance across requests.
+    """
+    restaurant_fields = ['id', 'name']
+    item_fields = ['id', 'restaurant_id', 'name', 'price']
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.restaurants = LRUCache(max_size, ttl)
+        self.restaurant_ids = LRUCache(max_size, ttl)
+        self.items = LRUCache(max_size, ttl)
+        self.item_ids = LRUCache(max_size, ttl)
+
+    def restaurant(self, name):
+        """
+        Return the restaurant with this name, or None if there is none
+        """
+        values = self.restaurants.get(name)
+        if values is MISSING:
+            self.load_restaurants([name])
+            values = self.restaurants.get(name)
+        if values is MISSING:
+            return None
+        return Restaurants.from_db('default', self.restaurant_fields, values)
+
+    def restaurant_name(self, pk):
+        """
+        Return the name of the restaurant with this id, or None if there is none
+        """
+        values = self.restaurant_ids.get(pk)
+        if values is MISSING:
+            self.load_restaurants(ids=[pk])
+            values = self.restaurant_ids.get(pk)
+        if values is MISSING:
+            return None
+        return values[1]
+
+    def item(self, name):
+        """
+        Return the menu item with this name, with its restaurant attached, or
+        None if there is none
+        """
+        values = self.items.get(name)
+        if values is MISSING:
+            self.load_items([name])
+            values = self.items.get(name)
+        return self.build_item(values)
+
+    def item_by_id(self, pk):
+        """
+        Return the menu item with this id, with its restaurant attached, or
+        None if there is none
+        """
+        values = self.item_ids.get(pk)
+        if values is MISSING:
+            self.load_items(ids=[pk])
+            values = self.item_ids.get(pk)
+        return self.build_item(values)
+
+    def item_name(self, pk):
+        """
+        Return the name of the menu item with this id, or None if there is none
+        """
+        values = self.item_ids.get(pk)
+        if values is MISSING:
+            self.load_items(ids=[pk])
+            values = self.item_ids.get(pk)
+        if values is MISSING:
+            return None
+        return values[0][2]
+
+    def build_item(self, values):
+        if values is MISSING:
+            return None
+        item_values, restaurant_values = values
+        item = MenuItems.from_db('default', self.item_fields, item_values)
+        item.restaurant = Restaurants.from_db('default', self.restaurant_fields, restaurant_values)
+        return item
+
+    def load_restaurants(self, names=(), ids=()):
+        """
+        Fetch every uncached restaurant in names and ids with one query
+        """
+        missing_names = [name for name in set(names) if self.restaurants.get(name) is MISSING]
+        missing_ids = [pk for pk in set(ids) if pk is not None and self.restaurant_ids.get(pk) is MISSING]
+        if missing_names or missing_ids:
+            rows = Restaurants.objects.filter(Q(name__in=missing_names) | Q(pk__in=missing_ids))
+            for values in rows.values_list(*self.restaurant_fields):
+                self.restaurants.set(values[1], values)
+                self.restaurant_ids.set(values[0], values)
+
+    def load_items(self, names=(), ids=()):
+        """
+        Fetch every uncached menu item in names and ids, and its restaurant,
+        with one query
+        """
+        missing_names = [name for name in set(names) if self.items.get(name) is MISSING]
+        missing_ids = [pk for pk in set(ids) if pk is not None and self.item_ids.get(pk) is MISSING]
+        if missing_names or missing_ids:
+            rows = MenuItems.objects.filter(Q(name__in=missing_names) | Q(pk__in=missing_ids)).values_list(
+                *self.item_fields, 'restaurant__name'
+            )
+            for pk, restaurant_id, name, price, restaurant_name in rows:
+                values = ((pk, restaurant_id, name, price), (restaurant_id, restaurant_name))
+                self.items.set(name, values)
+                self.item_ids.set(pk, values)
+
+    def clear(self):
+        self.restaurants.clear()
+        self.restaurant_ids.clear()
+        self.items.clear()
+        self.item_ids.clear()
+
+
+MENU_CACHE = getattr(settings, 'MENU_CACHE', {})
+menu_cache = MenuCache(max_size=MENU_CACHE.get('MAX_SIZE', 1024), ttl=MENU_CACHE.get('TTL', 60))
@@ -0,0 +1,130 @@
+"""
+Opt-in per-request timing of requests, serializers and database queries
+
+A sampled fraction of requests is timed. Each timed request gets a
+Server-Timing header and a JSON log line on the orders.timing logger, and
+requests slower than the threshold are logged again as a warning with every
+query they ran. When the sample rate is 0 the middleware removes itself from
+the stack, and record() costs one thread-local lookup.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('orders.timing')
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """
+    Durations in ms recorded while serving one request
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = []
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.add('db', duration)
+            self.queries.append((sql, duration))
+
+
+@contextmanager
+def record(name):
+    """
+    Add the time spent in the body to the current request's timings, if it is being timed
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - started) * 1000)
+
+
+class RequestTimingMiddleware:
+    """
+    Times a sample of requests as configured by the REQUEST_TIMING setting
+    """
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'REQUEST_TIMING', {})
+        self.sample_rate = options.get('SAMPLE_RATE', 0)
+        self.slow_request_ms = options.get('SLOW_REQUEST_MS', 500)
+        self.header = options.get('SERVER_TIMING_HEADER', True)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = _local.timings = RequestTimings()
+        started = time.perf_counter()
+        try:
+            with self.execute_wrappers(timings):
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        # everything below this middleware: the other middleware, the view,
+        # rendering and compression
+        timings.add('total', (time.perf_counter() - started) * 1000)
+
+        if self.header:
+            response['Server-Timing'] = self.server_timing(timings)
+        self.log(request, response, timings)
+        return response
+
+    @contextmanager
+    def execute_wrappers(self, timings):
+        for connection in connections.all():
+            connection.execute_wrappers.append(timings)
+        try:
+            yield
+        finally:
+            for connection in connections.all():
+                connection.execute_wrappers.remove(timings)
+
+    def server_timing(self, timings):
+        metrics = [f'db;dur={timings.durations.get("db", 0):.3f};desc="{len(timings.queries)} queries"']
+        metrics += [
+            f'{name};dur={duration:.3f}'
+            for name, duration in timings.durations.items() if name != 'db'
+        ]
+        return ', '.join(metrics)
+
+    def log(self, request, response, timings):
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(timings.queries),
+        }
+        entry.update((f'{name}_ms', round(duration, 3)) for name, duration in timings.durations.items())
+        entry.setdefault('db_ms', 0)
+        logger.info(json.dumps(entry))
+        if entry['total_ms'] >= self.slow_request_ms:
+            entry['sql'] = [
+                {'sql': sql, 'duration_ms': round(duration, 3)} for sql, duration in timings.queries
+            ]
+            logger.warning(json.dumps(entry))
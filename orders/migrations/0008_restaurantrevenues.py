@@ -0,0 +1,36 @@
+# Generated by Django 2.2.5 on 2026-10-18 04:29
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_revenues(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Orders = apps.get_model('orders', 'Orders')
+    RestaurantRevenues = apps.get_model('orders', 'RestaurantRevenues')
+    totals = Orders.objects.using(using).values('restaurant_id').annotate(
+        revenue=models.Sum('total_price'), order_count=models.Count('id')
+    ).order_by()
+    RestaurantRevenues.objects.using(using).bulk_create(
+        (RestaurantRevenues(**row) for row in totals.iterator()), batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_auto_20191016_0022'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantRevenues',
+            fields=[
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='revenue_rollup', serialize=False, to='orders.Restaurants', to_field='name')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=32)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_revenues, migrations.RunPython.noop),
+    ]
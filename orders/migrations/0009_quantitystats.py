@@ -0,0 +1,47 @@
+# Generated by Django 2.2.5 on 2026-10-18 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_quantity_stats(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Orders = apps.get_model('orders', 'Orders')
+    QuantityStats = apps.get_model('orders', 'QuantityStats')
+    stats = Orders.objects.using(using).values('restaurant_id', 'user_id').annotate(
+        quantity_sum=models.Sum('quantity'),
+        order_count=models.Count('id'),
+        min_quantity=models.Min('quantity'),
+        max_quantity=models.Max('quantity'),
+    ).order_by()
+    QuantityStats.objects.using(using).bulk_create(
+        (QuantityStats(**row) for row in stats.iterator()), batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0008_restaurantrevenues'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuantityStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_sum', models.BigIntegerField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('min_quantity', models.PositiveIntegerField(null=True)),
+                ('max_quantity', models.PositiveIntegerField(null=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.Restaurants', to_field='name')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('restaurant', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_quantity_stats, migrations.RunPython.noop),
+    ]
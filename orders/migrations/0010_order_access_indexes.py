@@ -0,0 +1,29 @@
+# Generated by Django 2.2.5 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_quantitystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['created', 'id'], name='orders_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['restaurant', 'created', 'id'], name='orders_rest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['user', 'created', 'id'], name='orders_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['restaurant', 'user', 'quantity'], name='orders_rest_user_qty_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.5 on 2026-10-18 04:50
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+
+def populate_revenue_buckets(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Orders = apps.get_model('orders', 'Orders')
+    RevenueBuckets = apps.get_model('orders', 'RevenueBuckets')
+    for granularity in ('hour', 'day', 'month'):
+        buckets = Orders.objects.using(using).annotate(
+            bucket_start=Trunc('created', granularity, tzinfo=timezone.utc),
+        ).values('restaurant_id', 'bucket_start').annotate(
+            revenue=models.Sum('total_price'),
+            quantity=models.Sum('quantity'),
+            order_count=models.Count('id'),
+        ).order_by()
+        RevenueBuckets.objects.using(using).bulk_create(
+            (RevenueBuckets(granularity=granularity, **row) for row in buckets.iterator()), batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueBuckets',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('bucket_start', models.DateTimeField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=32)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_buckets', to='orders.Restaurants', to_field='name')),
+            ],
+            options={
+                'unique_together': {('restaurant', 'granularity', 'bucket_start')},
+            },
+        ),
+        migrations.RunPython(populate_revenue_buckets, migrations.RunPython.noop),
+    ]
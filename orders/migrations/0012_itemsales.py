@@ -0,0 +1,74 @@
+# Generated by Django 2.2.5 on 2026-10-18 04:53
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+
+def populate_item_sales(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Orders = apps.get_model('orders', 'Orders')
+    ItemSales = apps.get_model('orders', 'ItemSales')
+    ItemDailySales = apps.get_model('orders', 'ItemDailySales')
+    totals = dict(
+        quantity=models.Sum('quantity'),
+        revenue=models.Sum('total_price'),
+        order_count=models.Count('id'),
+    )
+    sales = Orders.objects.using(using).values('restaurant_id', 'item_id').annotate(**totals).order_by()
+    ItemSales.objects.using(using).bulk_create((ItemSales(**row) for row in sales.iterator()), batch_size=500)
+    daily_sales = Orders.objects.using(using).annotate(
+        bucket_start=Trunc('created', 'day', tzinfo=timezone.utc),
+    ).values('restaurant_id', 'item_id', 'bucket_start').annotate(**totals).order_by()
+    ItemDailySales.objects.using(using).bulk_create((ItemDailySales(**row) for row in daily_sales.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_revenuebuckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSales',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='orders.MenuItems', to_field='name')),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=32)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_sales', to='orders.Restaurants', to_field='name')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ItemDailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=32)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='orders.MenuItems', to_field='name')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_daily_sales', to='orders.Restaurants', to_field='name')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='itemsales',
+            index=models.Index(fields=['restaurant', '-quantity', 'item'], name='item_sales_quantity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemsales',
+            index=models.Index(fields=['restaurant', '-revenue', 'item'], name='item_sales_revenue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemdailysales',
+            index=models.Index(fields=['restaurant', 'bucket_start'], name='item_daily_rest_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='itemdailysales',
+            unique_together={('item', 'bucket_start')},
+        ),
+        migrations.RunPython(populate_item_sales, migrations.RunPython.noop),
+    ]
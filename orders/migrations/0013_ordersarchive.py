@@ -0,0 +1,45 @@
+# Generated by Django 2.2.5 on 2026-10-18 04:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0012_itemsales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrdersArchive',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('comments', models.CharField(blank=True, max_length=255)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=32)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.MenuItems', to_field='name')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.Restaurants', to_field='name')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ordersarchive',
+            index=models.Index(fields=['created', 'id'], name='archive_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersarchive',
+            index=models.Index(fields=['restaurant', 'created', 'id'], name='archive_rest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersarchive',
+            index=models.Index(fields=['user', 'created', 'id'], name='archive_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersarchive',
+            index=models.Index(fields=['restaurant', 'user', 'quantity'], name='archive_rest_user_qty_idx'),
+        ),
+    ]
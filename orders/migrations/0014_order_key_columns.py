@@ -0,0 +1,34 @@
+# Generated by Django 2.2.5 on 2026-10-18 05:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_ordersarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='restaurant_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.Restaurants'),
+        ),
+        migrations.AddField(
+            model_name='orders',
+            name='item_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.MenuItems'),
+        ),
+        migrations.AddField(
+            model_name='ordersarchive',
+            name='restaurant_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.Restaurants'),
+        ),
+        migrations.AddField(
+            model_name='ordersarchive',
+            name='item_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.MenuItems'),
+        ),
+    ]
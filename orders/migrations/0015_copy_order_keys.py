@@ -0,0 +1,51 @@
+# Generated by Django 2.2.5 on 2026-10-18 05:03
+
+from django.db import DEFAULT_DB_ALIAS, migrations, transaction
+
+BATCH_SIZE = 2000
+
+
+def copy_keys(apps, schema_editor):
+    """
+    Fill the integer restaurant and item columns of every order still missing
+    them, one batch per transaction, so writers are only held up briefly
+    """
+    using = schema_editor.connection.alias
+    # restaurants and items stay in the default database when orders are sharded
+    restaurants = dict(
+        apps.get_model('orders', 'Restaurants').objects.using(DEFAULT_DB_ALIAS).values_list('name', 'pk')
+    )
+    items = dict(apps.get_model('orders', 'MenuItems').objects.using(DEFAULT_DB_ALIAS).values_list('name', 'pk'))
+    for model_name in ('Orders', 'OrdersArchive'):
+        model = apps.get_model('orders', model_name)
+        pending = model.objects.using(using).filter(restaurant_ref__isnull=True)
+        while True:
+            rows = list(pending.order_by('pk').values_list('pk', 'restaurant_id', 'item_id')[:BATCH_SIZE])
+            if not rows:
+                break
+            groups = {}
+            for pk, restaurant, item in rows:
+                groups.setdefault((restaurants.get(restaurant), items.get(item)), []).append(pk)
+            with transaction.atomic(using=using):
+                for (restaurant, item), pks in groups.items():
+                    if restaurant is None or item is None:
+                        # orders of a deleted restaurant or item on a shard, which
+                        # the default database would have cascade deleted
+                        model.objects.using(using).filter(pk__in=pks).delete()
+                    else:
+                        model.objects.using(using).filter(pk__in=pks).update(
+                            restaurant_ref_id=restaurant, item_ref_id=item
+                        )
+
+
+class Migration(migrations.Migration):
+    # each batch commits on its own, so orders can keep being written
+    atomic = False
+
+    dependencies = [
+        ('orders', '0014_order_key_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_keys, migrations.RunPython.noop),
+    ]
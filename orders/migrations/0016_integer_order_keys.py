@@ -0,0 +1,332 @@
+# Generated by Django 2.2.5 on 2026-10-18 05:04
+
+import copy
+from importlib import import_module
+
+from django.apps.registry import Apps
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+# catch up on orders written since 0015 ran
+copy_order_keys = import_module('orders.migrations.0015_copy_order_keys')
+copy_keys = copy_order_keys.copy_keys
+BATCH_SIZE = copy_order_keys.BATCH_SIZE
+
+
+def copy_names(apps, schema_editor):
+    """
+    Refill the restaurant and item name columns from the integer ones when
+    the migration is reversed
+    """
+    using = schema_editor.connection.alias
+    restaurants = dict(
+        apps.get_model('orders', 'Restaurants').objects.using(DEFAULT_DB_ALIAS).values_list('pk', 'name')
+    )
+    items = dict(apps.get_model('orders', 'MenuItems').objects.using(DEFAULT_DB_ALIAS).values_list('pk', 'name'))
+    for model_name in ('Orders', 'OrdersArchive'):
+        model = apps.get_model('orders', model_name)
+        groups = {}
+        for pk, restaurant, item in model.objects.using(using).values_list('pk', 'restaurant_ref_id', 'item_ref_id'):
+            groups.setdefault((restaurants[restaurant], items[item]), []).append(pk)
+        for (restaurant, item), pks in groups.items():
+            for start in range(0, len(pks), BATCH_SIZE):
+                model.objects.using(using).filter(pk__in=pks[start:start + BATCH_SIZE]).update(
+                    restaurant_id=restaurant, item_id=item
+                )
+
+
+ROLLUPS = ['RestaurantRevenues', 'QuantityStats', 'RevenueBuckets', 'ItemSales', 'ItemDailySales']
+
+
+def clear_rollups(apps, schema_editor):
+    # their keys are names, so they are emptied and rebuilt from the orders
+    using = schema_editor.connection.alias
+    for model_name in ROLLUPS:
+        apps.get_model('orders', model_name).objects.using(using).all().delete()
+
+
+def populate_rollups(apps, schema_editor):
+    using = schema_editor.connection.alias
+    sources = [apps.get_model('orders', name).objects.using(using) for name in ('Orders', 'OrdersArchive')]
+    sums = dict(revenue=models.Sum('total_price'), quantity=models.Sum('quantity'), order_count=models.Count('id'))
+
+    def populate(model_name, keys, totals, annotations=None, **fields):
+        model = apps.get_model('orders', model_name)
+        rows = {}
+        for source in sources:
+            queryset = source.annotate(**annotations) if annotations else source
+            for row in queryset.values(*keys).annotate(**totals).order_by().iterator():
+                key = tuple(row[field] for field in keys)
+                current = rows.setdefault(key, row)
+                if current is row:
+                    continue
+                for field, total in totals.items():
+                    if isinstance(total, models.Min):
+                        current[field] = min(current[field], row[field])
+                    elif isinstance(total, models.Max):
+                        current[field] = max(current[field], row[field])
+                    else:
+                        current[field] += row[field]
+        model.objects.using(using).bulk_create((model(**row, **fields) for row in rows.values()), batch_size=500)
+
+    populate('RestaurantRevenues', ['restaurant_id'], dict(revenue=sums['revenue'], order_count=sums['order_count']))
+    populate('QuantityStats', ['restaurant_id', 'user_id'], dict(
+        quantity_sum=models.Sum('quantity'),
+        order_count=models.Count('id'),
+        min_quantity=models.Min('quantity'),
+        max_quantity=models.Max('quantity'),
+    ))
+    for granularity in ('hour', 'day', 'month'):
+        populate(
+            'RevenueBuckets', ['restaurant_id', 'bucket_start'], sums,
+            dict(bucket_start=Trunc('created', granularity, tzinfo=timezone.utc)), granularity=granularity,
+        )
+    populate('ItemSales', ['restaurant_id', 'item_id'], sums)
+    populate(
+        'ItemDailySales', ['restaurant_id', 'item_id', 'bucket_start'], sums,
+        dict(bucket_start=Trunc('created', 'day', tzinfo=timezone.utc)),
+    )
+
+
+def rebuild_table(schema_editor, old_model, new_model, columns):
+    """
+    Rebuild the table of old_model with the fields and indexes of new_model
+    in one copy, the way SQLite alters a single field. columns maps the
+    columns of new_model filled from a column of another name; columns of
+    old_model mapped elsewhere are not copied over.
+    """
+    table = new_model._meta.db_table
+    meta = type('Meta', (), {
+        'app_label': new_model._meta.app_label,
+        'db_table': f'new__{table}',
+        'unique_together': new_model._meta.unique_together,
+        'indexes': new_model._meta.indexes,
+        'apps': Apps(),
+    })
+    body = {field.name: copy.deepcopy(field) for field in new_model._meta.local_concrete_fields}
+    body.update(Meta=meta, __module__=new_model.__module__)
+    rebuilt = type(f'New{new_model._meta.object_name}', new_model.__bases__, body)
+
+    old_columns = {field.column for field in old_model._meta.local_concrete_fields} - set(columns.values())
+    copied = {}
+    for field in new_model._meta.local_concrete_fields:
+        if field.column in columns:
+            copied[field.column] = columns[field.column]
+        elif field.column in old_columns:
+            copied[field.column] = field.column
+
+    schema_editor.create_model(rebuilt)
+    schema_editor.execute('INSERT INTO %s (%s) SELECT %s FROM %s' % (
+        schema_editor.quote_name(rebuilt._meta.db_table),
+        ', '.join(schema_editor.quote_name(column) for column in copied),
+        ', '.join(schema_editor.quote_name(column) for column in copied.values()),
+        schema_editor.quote_name(table),
+    ))
+    schema_editor.delete_model(old_model)
+    schema_editor.alter_db_table(rebuilt, rebuilt._meta.db_table, table, disable_constraints=False)
+    # the indexes, now on the renamed table
+    for sql in schema_editor.deferred_sql:
+        schema_editor.execute(sql)
+    schema_editor.deferred_sql = []
+
+
+class RebuildTables(migrations.operations.base.Operation):
+    """
+    Apply field and index operations to the models, but rebuild each of their
+    tables once, where SQLite would rebuild the table for every operation
+    """
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, columns, operations):
+        # {model name: {column: column it is filled from}}
+        self.columns = columns
+        self.operations = operations
+
+    def state_forwards(self, app_label, state):
+        for operation in self.operations:
+            operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self.rebuild(app_label, schema_editor, from_state, to_state, reverse=False)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self.rebuild(app_label, schema_editor, from_state, to_state, reverse=True)
+
+    def rebuild(self, app_label, schema_editor, from_state, to_state, reverse):
+        for model_name, columns in self.columns.items():
+            new_model = to_state.apps.get_model(app_label, model_name)
+            if not self.allow_migrate_model(schema_editor.connection.alias, new_model):
+                continue
+            if reverse:
+                columns = {old: new for new, old in columns.items()}
+            rebuild_table(schema_editor, from_state.apps.get_model(app_label, model_name), new_model, columns)
+
+    def describe(self):
+        return f"Rebuild the tables of {', '.join(self.columns)}"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_copy_order_keys'),
+    ]
+
+    operations = [
+        # reversed, the rollups are rebuilt keyed by name once the names are back
+        migrations.RunPython(clear_rollups, populate_rollups),
+        migrations.RunPython(copy_keys, copy_names),
+        # reversed, the name columns come back empty until copy_names fills them,
+        # so they are added as nullable; forwards this changes no table
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=models.ForeignKey(
+                    null=True, on_delete=django.db.models.deletion.CASCADE, to=f'orders.{to}', to_field='name',
+                    **extra
+                ),
+            )
+            for model_name, extra in (('orders', {}), ('ordersarchive', {'related_name': '+'}))
+            for name, to in (('restaurant', 'Restaurants'), ('item', 'MenuItems'))
+        ]),
+        RebuildTables(
+            columns={
+                'orders': {'restaurant_id': 'restaurant_ref_id', 'item_id': 'item_ref_id'},
+                'ordersarchive': {'restaurant_id': 'restaurant_ref_id', 'item_id': 'item_ref_id'},
+                # emptied above
+                'restaurantrevenues': {},
+                'quantitystats': {},
+                'revenuebuckets': {},
+                'itemsales': {},
+                'itemdailysales': {},
+            },
+            operations=[
+                migrations.RemoveIndex(
+                    model_name='orders',
+                    name='orders_rest_created_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='orders',
+                    name='orders_rest_user_qty_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='ordersarchive',
+                    name='archive_rest_created_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='ordersarchive',
+                    name='archive_rest_user_qty_idx',
+                ),
+                migrations.RemoveField(
+                    model_name='orders',
+                    name='restaurant',
+                ),
+                migrations.RemoveField(
+                    model_name='orders',
+                    name='item',
+                ),
+                migrations.RemoveField(
+                    model_name='ordersarchive',
+                    name='restaurant',
+                ),
+                migrations.RemoveField(
+                    model_name='ordersarchive',
+                    name='item',
+                ),
+                migrations.RenameField(
+                    model_name='orders',
+                    old_name='restaurant_ref',
+                    new_name='restaurant',
+                ),
+                migrations.RenameField(
+                    model_name='orders',
+                    old_name='item_ref',
+                    new_name='item',
+                ),
+                migrations.RenameField(
+                    model_name='ordersarchive',
+                    old_name='restaurant_ref',
+                    new_name='restaurant',
+                ),
+                migrations.RenameField(
+                    model_name='ordersarchive',
+                    old_name='item_ref',
+                    new_name='item',
+                ),
+                migrations.AlterField(
+                    model_name='orders',
+                    name='restaurant',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='orders',
+                    name='item',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.MenuItems'),
+                ),
+                migrations.AlterField(
+                    model_name='ordersarchive',
+                    name='restaurant',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='ordersarchive',
+                    name='item',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.MenuItems'),
+                ),
+                migrations.AddIndex(
+                    model_name='orders',
+                    index=models.Index(fields=['restaurant', 'created', 'id'], name='orders_rest_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='orders',
+                    index=models.Index(fields=['restaurant', 'user', 'quantity'], name='orders_rest_user_qty_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='ordersarchive',
+                    index=models.Index(fields=['restaurant', 'created', 'id'], name='archive_rest_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='ordersarchive',
+                    index=models.Index(fields=['restaurant', 'user', 'quantity'], name='archive_rest_user_qty_idx'),
+                ),
+                migrations.AlterField(
+                    model_name='restaurantrevenues',
+                    name='restaurant',
+                    field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='revenue_rollup', serialize=False, to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='quantitystats',
+                    name='restaurant',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='revenuebuckets',
+                    name='restaurant',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_buckets', to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='itemsales',
+                    name='item',
+                    field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='orders.MenuItems'),
+                ),
+                migrations.AlterField(
+                    model_name='itemsales',
+                    name='restaurant',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_sales', to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='itemdailysales',
+                    name='item',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='orders.MenuItems'),
+                ),
+                migrations.AlterField(
+                    model_name='itemdailysales',
+                    name='restaurant',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_daily_sales', to='orders.Restaurants'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.5 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_integer_order_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderImports',
+            fields=[
+                ('source', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.5 on 2026-10-18 07:02
+
+from importlib import import_module
+
+from django.db import migrations
+
+# the rollups 0016_integer_order_keys emptied, rebuilt in their own transaction
+integer_order_keys = import_module('orders.migrations.0016_integer_order_keys')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_orderimports'),
+    ]
+
+    operations = [
+        migrations.RunPython(integer_order_keys.populate_rollups, integer_order_keys.clear_rollups),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.5 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_populate_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderimports',
+            name='completed',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.5 on 2026-10-18 07:20
+
+from django.conf import settings
+from django.db import migrations, models, router
+import django.db.models.deletion
+
+# the composite indexes of both tables lead with these columns
+FIELDS = [('Orders', 'restaurant'), ('Orders', 'user'), ('OrdersArchive', 'restaurant'), ('OrdersArchive', 'user')]
+
+
+def drop_indexes(apps, schema_editor):
+    """
+    Drop the single column foreign key indexes
+
+    AlterField would rebuild both tables on SQLite only to drop an index, so
+    the indexes are looked up by column and dropped on their own.
+    """
+    for model_name, name in FIELDS:
+        model = apps.get_model('orders', model_name)
+        if not router.allow_migrate_model(schema_editor.connection.alias, model):
+            continue
+        column = model._meta.get_field(name).column
+        with schema_editor.connection.cursor() as cursor:
+            constraints = schema_editor.connection.introspection.get_constraints(cursor, model._meta.db_table)
+        for index_name, constraint in constraints.items():
+            if constraint['index'] and not constraint['unique'] and constraint['columns'] == [column]:
+                schema_editor.execute(schema_editor._delete_index_sql(model, index_name))
+
+
+def create_indexes(apps, schema_editor):
+    for model_name, name in FIELDS:
+        model = apps.get_model('orders', model_name)
+        if router.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute(schema_editor._create_index_sql(model, [model._meta.get_field(name)]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_orderimports_completed'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(drop_indexes, create_indexes)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='orders',
+                    name='restaurant',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='orders',
+                    name='user',
+                    field=models.ForeignKey(blank=True, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='ordersarchive',
+                    name='restaurant',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.Restaurants'),
+                ),
+                migrations.AlterField(
+                    model_name='ordersarchive',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
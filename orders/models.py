@@ -3,7 +3,12 @@ from decimal import Decimal
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.dispatch import Signal
+
+# bulk_create sends no post_save, so bulk_create_priced sends this inside its
+# transaction instead
+orders_bulk_created = Signal(providing_args=['instances', 'using'])
 
 
 class Restaurants(models.Model):
@@ -22,22 +27,92 @@ class MenuItems(models.Model):
     def __str__(self):
         return f"{self.restaurant}: {self.name} - {self.price}"
 
+class OrdersManager(models.Manager):
+
+    def create(self, **kwargs):
+        # route by the new order, which picks its shard when orders are sharded
+        order = self.model(**kwargs)
+        order.save(force_insert=True, using=self._db)
+        return order
+
+    def bulk_create_priced(self, orders, batch_size=None, keep_created=False):
+        """
+        Price and insert orders in one transaction per database they are
+        routed to, which is a single one unless orders are sharded
+
+        Each order's item must already be loaded, since total_price is computed
+        from it in memory rather than by re-fetching the item per order.
+        Orders get the current time as created unless keep_created is set, as
+        for importing past orders.
+        """
+        databases = {}
+        for order in orders:
+            order.total_price = order.quantity * order.item.price
+            databases.setdefault(self._db or router.db_for_write(self.model, instance=order), []).append(order)
+        for using, group in databases.items():
+            with transaction.atomic(using=using):
+                if keep_created:
+                    self.db_manager(using).insert_raw(group, batch_size)
+                else:
+                    self.using(using).bulk_create(group, batch_size=batch_size)
+                if group[0].pk is None and connections[using].vendor == 'sqlite':
+                    # SQLite does not return ids from a bulk insert, but the write
+                    # lock held by this transaction means the newest ids are ours
+                    last = self.using(using).order_by('-pk').values_list('pk', flat=True)[0]
+                    for pk, order in enumerate(group, start=last - len(group) + 1):
+                        order.pk = pk
+                orders_bulk_created.send(sender=self.model, instances=group, using=using)
+        return orders
+
+    def insert_raw(self, orders, batch_size=None):
+        """
+        Insert orders as they are, like bulk_create but without pre_save, which
+        would replace created with the current time
+        """
+        fields = [field for field in self.model._meta.concrete_fields if not field.primary_key]
+        batch_size = max(min(batch_size or len(orders), connections[self.db].ops.bulk_batch_size(fields, orders)), 1)
+        queryset = self.get_queryset()
+        for start in range(0, len(orders), batch_size):
+            queryset._insert(orders[start:start + batch_size], fields=fields, raw=True)
+        for order in orders:
+            order._state.adding = False
+            order._state.db = self.db
+
+
 class Orders(models.Model):
     created = models.DateTimeField(auto_now_add=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True)
-    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE, to_field="name")
+    # the composite indexes below lead with user and restaurant
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, db_index=False)
+    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE, db_index=False)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(0)])
-    item = models.ForeignKey(MenuItems, on_delete=models.CASCADE, to_field="name")
+    item = models.ForeignKey(MenuItems, on_delete=models.CASCADE)
     comments = models.CharField(max_length=255, blank=True)
     total_price = models.DecimalField(max_digits=32, decimal_places=2, editable = False, validators=[MinValueValidator(Decimal('0.00'))])
 
+    objects = OrdersManager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination over all orders
+            models.Index(fields=['created', 'id'], name='orders_created_id_idx'),
+            # restaurant and customer lists, filtered then paginated by (created, id)
+            models.Index(fields=['restaurant', 'created', 'id'], name='orders_rest_created_idx'),
+            models.Index(fields=['user', 'created', 'id'], name='orders_user_created_idx'),
+            # per (restaurant, customer) aggregates, covering quantity
+            models.Index(fields=['restaurant', 'user', 'quantity'], name='orders_rest_user_qty_idx'),
+        ]
+
     def __str__(self):
         return f"{self.restaurant} Orders: {self.quantity} x {self.item} at {self.created}"
 
     def save(self, *args, **kwargs):
-        item = MenuItems.objects.get(pk=self.item.id)
+        from .menu import menu_cache
+
+        item = menu_cache.item_by_id(self.item_id) or MenuItems.objects.get(pk=self.item_id)
         self.total_price = self.quantity * item.price
-        super().save(*args, **kwargs) 
+        # rollups are maintained by signal handlers inside this transaction
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Orders, instance=self)):
+            super().save(*args, **kwargs)
 
     def clean(self):
         """
@@ -45,3 +120,149 @@ class Orders(models.Model):
         """  
         if self.item.restaurant != self.restaurant:
             raise ValidationError(f"{self.restaurant} does not sell {self.item}")
+
+
+class OrdersArchive(models.Model):
+    """
+    Orders moved out of Orders by archive_orders, keeping their ids
+
+    Every archived order was created no later than any order left in Orders
+    at the time it was moved, so reads only need this table when their range
+    starts at or before the newest archived order.
+    """
+    id = models.IntegerField(primary_key=True)
+    created = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE, related_name="+", db_index=False)
+    quantity = models.PositiveIntegerField()
+    item = models.ForeignKey(MenuItems, on_delete=models.CASCADE, related_name="+")
+    comments = models.CharField(max_length=255, blank=True)
+    total_price = models.DecimalField(max_digits=32, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created', 'id'], name='archive_created_id_idx'),
+            models.Index(fields=['restaurant', 'created', 'id'], name='archive_rest_created_idx'),
+            models.Index(fields=['user', 'created', 'id'], name='archive_user_created_idx'),
+            models.Index(fields=['restaurant', 'user', 'quantity'], name='archive_rest_user_qty_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant} archived Orders: {self.quantity} x {self.item} at {self.created}"
+
+
+class RestaurantRevenues(models.Model):
+    """
+    Running revenue and order count per restaurant, kept in step with Orders
+    """
+    restaurant = models.OneToOneField(Restaurants, on_delete=models.CASCADE, primary_key=True, related_name="revenue_rollup")
+    revenue = models.DecimalField(max_digits=32, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.restaurant}: {self.order_count} orders, {self.revenue}"
+
+
+class QuantityStats(models.Model):
+    """
+    Running quantity statistics per (restaurant, customer), kept in step with Orders
+    """
+    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    quantity_sum = models.BigIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    min_quantity = models.PositiveIntegerField(null=True)
+    max_quantity = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        unique_together = ['restaurant', 'user']
+
+    def __str__(self):
+        return f"{self.restaurant} / {self.user}: {self.order_count} orders"
+
+    @property
+    def average(self):
+        if not self.order_count:
+            return None
+        return self.quantity_sum / self.order_count
+
+
+class RevenueBuckets(models.Model):
+    """
+    Revenue, quantity and order count per restaurant per UTC hour, day and
+    month, kept in step with Orders
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    MONTH = 'month'
+    GRANULARITIES = [(HOUR, 'Hour'), (DAY, 'Day'), (MONTH, 'Month')]
+
+    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE, related_name="revenue_buckets")
+    granularity = models.CharField(max_length=5, choices=GRANULARITIES)
+    bucket_start = models.DateTimeField()
+    revenue = models.DecimalField(max_digits=32, decimal_places=2, default=Decimal('0.00'))
+    quantity = models.BigIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # also the index that range reads over one restaurant's buckets seek on
+        unique_together = ['restaurant', 'granularity', 'bucket_start']
+
+    def __str__(self):
+        return f"{self.restaurant} {self.granularity} {self.bucket_start}: {self.revenue}"
+
+
+class ItemSales(models.Model):
+    """
+    Running quantity, revenue and order count per menu item, kept in step with Orders
+    """
+    item = models.OneToOneField(MenuItems, on_delete=models.CASCADE, primary_key=True, related_name="sales")
+    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE, related_name="item_sales")
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=32, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # a restaurant's top items, read in index order
+            models.Index(fields=['restaurant', '-quantity', 'item'], name='item_sales_quantity_idx'),
+            models.Index(fields=['restaurant', '-revenue', 'item'], name='item_sales_revenue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name}: {self.quantity} sold, {self.revenue}"
+
+
+class ItemDailySales(models.Model):
+    """
+    Quantity, revenue and order count per menu item per UTC day, kept in step with Orders
+    """
+    item = models.ForeignKey(MenuItems, on_delete=models.CASCADE, related_name="daily_sales")
+    restaurant = models.ForeignKey(Restaurants, on_delete=models.CASCADE, related_name="item_daily_sales")
+    bucket_start = models.DateTimeField()
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=32, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['item', 'bucket_start']
+        indexes = [
+            models.Index(fields=['restaurant', 'bucket_start'], name='item_daily_rest_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} {self.bucket_start}: {self.quantity} sold, {self.revenue}"
+
+
+class OrderImports(models.Model):
+    """
+    Rows of an import_orders source already imported, updated in the
+    transaction of each batch, and when the whole source was
+    """
+    source = models.CharField(max_length=255, primary_key=True)
+    rows = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    completed = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.rows} rows imported"
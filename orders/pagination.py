@@ -0,0 +1,152 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .sharding import evaluate
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created, id)
+
+    Pages are selected with a range filter on the ordering key rather than an
+    OFFSET, and no COUNT(*) is issued, so page N costs the same as page 1.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('created', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        queryset may also be a list of querysets over tables with the same
+        columns, such as shards, whose pages are read in parallel and merged
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        reverse, position = self.decode_cursor(request)
+
+        if isinstance(queryset, (list, tuple)):
+            pages = evaluate(
+                [self.filter_queryset(each, reverse, position)[:self.page_size + 1] for each in queryset], list
+            )
+            results = self.merge(pages, reverse)[:self.page_size + 1]
+        else:
+            results = list(self.filter_queryset(queryset, reverse, position)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        # a cursor always points back at the page it was taken from
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        first = self.get_position(self.page[0]) if self.page else position
+        last = self.get_position(self.page[-1]) if self.page else position
+        self.previous_position, self.next_position = first, last
+        return self.page
+
+    def filter_queryset(self, queryset, reverse, position):
+        created, pk = self.ordering
+        if reverse:
+            queryset = queryset.order_by(f"-{created}", f"-{pk}")
+        else:
+            queryset = queryset.order_by(created, pk)
+        if position is None:
+            return queryset
+
+        lookup = 'lt' if reverse else 'gt'
+        value, key = position
+        # the inclusive range lets the (..., created, id) indexes seek to the
+        # cursor; the second filter only breaks ties on created
+        return queryset.filter(**{f"{created}__{lookup}e": value}).filter(
+            Q(**{f"{created}__{lookup}": value}) | Q(**{f"{pk}__{lookup}": key})
+        )
+
+    def merge(self, pages, reverse):
+        """
+        Merge pages from several querysets into one in ordering order
+
+        A row being moved between tables may be read from both, so rows at
+        the same position are kept once.
+        """
+        results = []
+        for row in sorted((row for page in pages for row in page), key=self.get_position, reverse=reverse):
+            if not results or self.get_position(results[-1]) != self.get_position(row):
+                results.append(row)
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_position(self, instance):
+        created, pk = self.ordering
+        return getattr(instance, created), getattr(instance, pk)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(False, self.next_position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(True, self.previous_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def decode_cursor(self, request):
+        """
+        Return (reverse, position) for the cursor in the request, if any
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens['r'][0]))
+            created, pk = tokens['p'][0].rsplit('|', 1)
+            position = (parse_datetime(created), int(pk))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, reverse, position):
+        created, pk = position
+        querystring = parse.urlencode({
+            'r': '1' if reverse else '0',
+            'p': f"{created.isoformat()}|{pk}",
+        }, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
@@ -0,0 +1,85 @@
+"""
+Renderers for the order endpoints
+
+FastJSONRenderer encodes with orjson when it is installed and gives the same
+bytes as rest_framework's JSONRenderer, which it falls back to otherwise.
+MessagePackRenderer is only offered when msgpack is installed, see the
+REST_FRAMEWORK setting.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# JSONRenderer escapes these so the output is also valid JavaScript
+LINE_SEPARATORS = [('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029')]
+
+# converts what orjson and msgpack would not encode as JSONRenderer does,
+# such as datetimes and Decimals
+default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed
+
+    Indented or ASCII-only output, and data orjson cannot encode such as
+    integers wider than 64 bits, are left to JSONRenderer. The only other
+    difference is the exponent notation of floats below 1e-4 or from 1e16,
+    e.g. 1e16 rather than 1e+16, which no order endpoint returns.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """
+    JSON with one array of values per field instead of one object per order
+
+    Selected with ?format=columnar or the media type in the Accept header.
+    The views that offer it build the columns themselves, see
+    OrderRowEncoder.encode_columns, so this renderer only names the format.
+    """
+    media_type = 'application/vnd.orders.columnar+json'
+    format = 'columnar'
+    columnar = True
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack, with the values JSONRenderer would give as strings, such as
+    datetimes, encoded as the same strings
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=default, use_bin_type=True)
@@ -0,0 +1,361 @@
+from decimal import Decimal
+from operator import add
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, Trunc
+from django.utils import timezone
+
+from .models import (ItemDailySales, ItemSales, Orders, OrdersArchive,
+                     QuantityStats, RestaurantRevenues, RevenueBuckets)
+
+# batches of orders adding to more keys than this update each rollup in bulk
+BULK_KEYS = 50
+# keys looked up per query, below SQLite's limit on query parameters
+KEY_CHUNK_SIZE = 250
+
+
+def increment(model, lookup, updates, defaults=None):
+    """
+    Apply updates to the row matching lookup, creating it from defaults if the
+    row is missing and defaults are given
+    """
+    if model.objects.filter(**lookup).update(**updates) or defaults is None:
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(model)):
+            model.objects.create(**lookup, **defaults)
+    except IntegrityError:
+        # another writer created the row first
+        model.objects.filter(**lookup).update(**updates)
+
+
+class Rollup:
+    """
+    A table of running totals over Orders and OrdersArchive, grouped by `keys`
+
+    Subclasses say what each order contributes in `deltas` and how to compute
+    the totals of one table of orders in `aggregate`; applying, rebuilding and
+    verifying are shared.
+    """
+    model = None
+    keys = ()
+    values = ()
+
+    def deltas(self, order):
+        """
+        Return the (key, values) tuples one order contributes
+        """
+        raise NotImplementedError
+
+    def aggregate(self, queryset):
+        """
+        Return queryset grouped by `keys` and annotated with `values`
+        """
+        raise NotImplementedError
+
+    def sources(self):
+        """
+        Return a queryset over each table holding orders
+        """
+        return [Orders.objects.all(), OrdersArchive.objects.all()]
+
+    def aggregates(self):
+        """
+        Return the querysets whose rows together make up the whole table
+        """
+        return [self.aggregate(source) for source in self.sources()]
+
+    def combine(self, current, values):
+        """
+        Merge the values of two orders, or groups of orders, sharing a key
+        """
+        return tuple(map(add, current, values))
+
+    def updates(self, key, values, sign):
+        """
+        Return the update() expressions that fold values into a row
+        """
+        return {field: F(field) + sign * value for field, value in zip(self.values, values)}
+
+    def apply(self, orders, sign=1):
+        totals = {}
+        for order in orders:
+            for key, values in self.deltas(order):
+                current = totals.get(key)
+                totals[key] = values if current is None else self.combine(current, values)
+
+        if sign > 0 and len(totals) > BULK_KEYS:
+            self.apply_bulk(totals)
+            return
+        for key, values in totals.items():
+            # removing an order never needs a new row, and creating one while
+            # its restaurant is being cascade deleted would break the FK
+            increment(
+                self.model,
+                dict(zip(self.keys, key)),
+                self.updates(key, values, sign),
+                dict(zip(self.values, values)) if sign > 0 else None,
+            )
+
+    def apply_bulk(self, totals):
+        """
+        Add totals to the table with one query per chunk of keys, one update
+        per batch of existing rows and one insert per batch of new rows
+
+        Existing rows are updated with the same expressions as increment, so
+        concurrent writers are not lost. A new row another writer inserts
+        first falls back to increment.
+        """
+        using = router.db_for_write(self.model)
+        pk = self.model._meta.pk.attname
+        keys = list(totals)
+        existing = {}
+        for start in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_CHUNK_SIZE]
+            # matches every combination of the chunk's key values, the keys are picked out below
+            lookups = {f'{field}__in': {key[index] for key in chunk} for index, field in enumerate(self.keys)}
+            for row in self.model.objects.filter(**lookups).values_list(pk, *self.keys):
+                if row[1:] in totals:
+                    existing[row[1:]] = row[0]
+
+        rows = []
+        for key, row_pk in existing.items():
+            row = self.model(**dict(zip(self.keys, key)), **self.updates(key, totals[key], 1))
+            row.pk = row_pk
+            rows.append(row)
+        self.model.objects.bulk_update(rows, self.values, batch_size=500)
+
+        missing = [key for key in keys if key not in existing]
+        try:
+            with transaction.atomic(using=using):
+                self.model.objects.bulk_create(
+                    (
+                        self.model(**dict(zip(self.keys, key)), **dict(zip(self.values, totals[key])))
+                        for key in missing
+                    ),
+                    batch_size=500,
+                )
+        except IntegrityError:
+            for key in missing:
+                increment(
+                    self.model,
+                    dict(zip(self.keys, key)),
+                    self.updates(key, totals[key], 1),
+                    dict(zip(self.values, totals[key])),
+                )
+
+    def totals(self):
+        """
+        Return the values of every key, computed from the orders
+        """
+        totals = {}
+        for queryset in self.aggregates():
+            for row in queryset.iterator():
+                key = tuple(row[field] for field in self.keys)
+                values = tuple(row[field] for field in self.values)
+                current = totals.get(key)
+                totals[key] = values if current is None else self.combine(current, values)
+        return totals
+
+    def rebuild(self):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            self.model.objects.all().delete()
+            self.model.objects.bulk_create(
+                (
+                    self.model(**dict(zip(self.keys, key)), **dict(zip(self.values, values)))
+                    for key, values in self.totals().items()
+                ),
+                batch_size=500,
+            )
+
+    def verify(self):
+        """
+        Return (key, expected, actual) for every row that disagrees with the orders
+        """
+        expected = self.rows(self.totals().items())
+        actual = self.rows(
+            (tuple(row[field] for field in self.keys), tuple(row[field] for field in self.values))
+            for row in self.model.objects.values(*self.keys, *self.values)
+        )
+        return [
+            (key, expected.get(key), actual.get(key))
+            for key in sorted(expected.keys() | actual.keys(), key=str)
+            if expected.get(key) != actual.get(key)
+        ]
+
+    def rows(self, items):
+        rows = {}
+        for key, values in items:
+            values = tuple(self.normalize(field, value) for field, value in zip(self.values, values))
+            # rows whose orders have all been removed count as missing
+            if any(values):
+                rows[key] = values
+        return rows
+
+    def normalize(self, field, value):
+        # some backends, such as SQLite, sum decimals as floats
+        if isinstance(value, Decimal):
+            places = self.model._meta.get_field(field).decimal_places
+            value = value.quantize(Decimal(1).scaleb(-places))
+        return value
+
+
+class RevenueRollup(Rollup):
+    """
+    Revenue and order count per restaurant
+    """
+    model = RestaurantRevenues
+    keys = ('restaurant_id',)
+    values = ('revenue', 'order_count')
+
+    def deltas(self, order):
+        return [((order.restaurant_id,), (order.total_price, 1))]
+
+    def aggregate(self, queryset):
+        return queryset.values('restaurant_id').annotate(
+            revenue=Sum('total_price'), order_count=Count('id')
+        ).order_by()
+
+
+class QuantityRollup(Rollup):
+    """
+    Quantity sum, count and extremes per (restaurant, customer)
+    """
+    model = QuantityStats
+    keys = ('restaurant_id', 'user_id')
+    values = ('quantity_sum', 'order_count', 'min_quantity', 'max_quantity')
+
+    def deltas(self, order):
+        return [((order.restaurant_id, order.user_id), (order.quantity, 1, order.quantity, order.quantity))]
+
+    def combine(self, current, values):
+        return (
+            current[0] + values[0],
+            current[1] + values[1],
+            min(current[2], values[2]),
+            max(current[3], values[3]),
+        )
+
+    def updates(self, key, values, sign):
+        quantity_sum, order_count, min_quantity, max_quantity = values
+        updates = {
+            'quantity_sum': F('quantity_sum') + sign * quantity_sum,
+            'order_count': F('order_count') + sign * order_count,
+        }
+        if sign > 0:
+            # a row emptied by deletes has NULL extremes, which Least/Greatest propagate
+            updates['min_quantity'] = Least(Coalesce('min_quantity', Value(min_quantity)), Value(min_quantity))
+            updates['max_quantity'] = Greatest(Coalesce('max_quantity', Value(max_quantity)), Value(max_quantity))
+        else:
+            # extremes cannot be unwound, so re-read them from the pair's orders
+            extremes = [
+                source.filter(restaurant_id=key[0], user_id=key[1]).aggregate(
+                    min_quantity=Min('quantity'), max_quantity=Max('quantity')
+                )
+                for source in self.sources()
+            ]
+            minimums = [row['min_quantity'] for row in extremes if row['min_quantity'] is not None]
+            maximums = [row['max_quantity'] for row in extremes if row['max_quantity'] is not None]
+            updates['min_quantity'] = min(minimums) if minimums else None
+            updates['max_quantity'] = max(maximums) if maximums else None
+        return updates
+
+    def aggregate(self, queryset):
+        return queryset.values('restaurant_id', 'user_id').annotate(
+            quantity_sum=Sum('quantity'),
+            order_count=Count('id'),
+            min_quantity=Min('quantity'),
+            max_quantity=Max('quantity'),
+        ).order_by()
+
+
+def bucket_start(created, granularity):
+    """
+    Return the start of the UTC hour, day or month that created falls in
+    """
+    start = created.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity != RevenueBuckets.HOUR:
+        start = start.replace(hour=0)
+    if granularity == RevenueBuckets.MONTH:
+        start = start.replace(day=1)
+    return start
+
+
+class RevenueBucketRollup(Rollup):
+    """
+    Revenue, quantity and order count per restaurant per hour, day and month
+    """
+    model = RevenueBuckets
+    keys = ('restaurant_id', 'granularity', 'bucket_start')
+    values = ('revenue', 'quantity', 'order_count')
+
+    def deltas(self, order):
+        values = (order.total_price, order.quantity, 1)
+        return [
+            ((order.restaurant_id, granularity, bucket_start(order.created, granularity)), values)
+            for granularity, _ in RevenueBuckets.GRANULARITIES
+        ]
+
+    def aggregate(self, queryset, granularity=RevenueBuckets.DAY):
+        return queryset.annotate(
+            granularity=Value(granularity, output_field=RevenueBuckets._meta.get_field('granularity')),
+            bucket_start=Trunc('created', granularity, tzinfo=timezone.utc),
+        ).values('restaurant_id', 'granularity', 'bucket_start').annotate(
+            revenue=Sum('total_price'), quantity=Sum('quantity'), order_count=Count('id')
+        ).order_by()
+
+    def aggregates(self):
+        return [
+            self.aggregate(source, granularity)
+            for source in self.sources() for granularity, _ in RevenueBuckets.GRANULARITIES
+        ]
+
+
+class ItemSalesRollup(Rollup):
+    """
+    Quantity, revenue and order count per menu item
+    """
+    model = ItemSales
+    keys = ('restaurant_id', 'item_id')
+    values = ('quantity', 'revenue', 'order_count')
+
+    def deltas(self, order):
+        return [((order.restaurant_id, order.item_id), (order.quantity, order.total_price, 1))]
+
+    def aggregate(self, queryset):
+        return queryset.values('restaurant_id', 'item_id').annotate(
+            quantity=Sum('quantity'), revenue=Sum('total_price'), order_count=Count('id')
+        ).order_by()
+
+
+class ItemDailySalesRollup(Rollup):
+    """
+    Quantity, revenue and order count per menu item per day
+    """
+    model = ItemDailySales
+    keys = ('restaurant_id', 'item_id', 'bucket_start')
+    values = ('quantity', 'revenue', 'order_count')
+
+    def deltas(self, order):
+        day = bucket_start(order.created, RevenueBuckets.DAY)
+        return [((order.restaurant_id, order.item_id, day), (order.quantity, order.total_price, 1))]
+
+    def aggregate(self, queryset):
+        return queryset.annotate(
+            bucket_start=Trunc('created', RevenueBuckets.DAY, tzinfo=timezone.utc),
+        ).values('restaurant_id', 'item_id', 'bucket_start').annotate(
+            quantity=Sum('quantity'), revenue=Sum('total_price'), order_count=Count('id')
+        ).order_by()
+
+
+ROLLUPS = [RevenueRollup(), QuantityRollup(), RevenueBucketRollup(), ItemSalesRollup(), ItemDailySalesRollup()]
+
+
+def apply_orders(orders, sign=1):
+    """
+    Fold orders into (sign=1) or out of (sign=-1) every rollup
+    """
+    orders = list(orders)
+    for rollup in ROLLUPS:
+        rollup.apply(orders, sign)
@@ -0,0 +1,130 @@
+"""
+Database routing: order shards, and read/write splitting between the default
+database and its read replicas
+
+ShardRouter sends the sharded order tables to their shard, see
+orders.sharding, and ReplicaRouter routes everything else.
+
+Other writes always go to the default database. Reads go to a random replica in
+DATABASE_REPLICAS only while a view has switched replica reads on for the
+current thread, see ReplicaReadsMixin, so everything else (admin, commands,
+signal handlers, the group commit thread) keeps reading the primary.
+
+Replicas lag behind the primary, so after a successful write a user's reads
+are pinned to the primary for READ_YOUR_WRITES_SECONDS. Pins are kept in the
+default cache, which must be shared between processes. Other users may read
+a replica that has not caught up yet, and an ETag or cached top items list
+computed from it stays stale until the next write to the same orders.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .sharding import (SHARDED_MODELS, current_shard, is_sharded, shard_for,
+                       shards)
+
+_local = threading.local()
+
+PREFIX = 'orders:primary'
+
+
+def read_from_replicas(enabled):
+    """
+    Switch replica reads on or off for the current thread
+    """
+    _local.replica_reads = enabled
+
+
+def pin_key(user):
+    return f"{PREFIX}:{user.pk}"
+
+
+def pin_to_primary(user):
+    """
+    Read from the primary for user's next requests, until replicas have their writes
+    """
+    if user.is_authenticated:
+        cache.set(pin_key(user), True, timeout=getattr(settings, 'READ_YOUR_WRITES_SECONDS', 10))
+
+
+def pinned_to_primary(user):
+    return user.is_authenticated and cache.get(pin_key(user), False)
+
+
+class ShardRouter:
+
+    def route(self, model, hints):
+        if not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)) and instance.restaurant_id is not None:
+            return shard_for(instance.restaurant_id)
+        alias = current_shard()
+        if alias is None and instance is not None:
+            # Django routes by a related instance, e.g. while assigning a
+            # restaurant to a new order, and falls back to its database
+            return None
+        if alias is None:
+            raise RuntimeError(
+                f"{model.__name__} is sharded by restaurant, pick its shard with using() or on_shard()"
+            )
+        return alias
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        alias = self.route(model, hints)
+        instance = hints.get('instance')
+        if (
+            alias is not None and instance is not None and is_sharded(type(instance))
+            and not instance._state.adding and instance._state.db != alias
+        ):
+            raise ValueError(f"{instance} cannot move from {instance._state.db} to {alias}")
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # sharded rows refer to users, restaurants and items in the default database
+        if is_sharded(type(obj1)) or is_sharded(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # shards only hold the sharded tables
+        if db in shards():
+            if app_label != 'orders':
+                return False
+            if model_name is not None:
+                return model_name in SHARDED_MODELS
+        return None
+
+
+class ReplicaRouter:
+
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def db_for_read(self, model, **hints):
+        replicas = self.replicas()
+        if replicas and getattr(_local, 'replica_reads', False):
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # also for instances that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *self.replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in self.replicas():
+            return False
+        return None
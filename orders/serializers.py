@@ -1,18 +1,249 @@
-from rest_framework import serializers
+import decimal
+from collections import OrderedDict
 
-from .models import MenuItems, Orders
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .menu import menu_cache
+from .models import MenuItems, Orders, Restaurants, RevenueBuckets
+
+
+class MenuSlugRelatedField(serializers.SlugRelatedField):
+    """
+    Slug field that resolves restaurant and menu item names through the menu cache
+
+    Orders store restaurant and item ids, which are turned back into names
+    through the menu cache too, so the related objects are never fetched.
+    """
+
+    def __init__(self, lookup=None, **kwargs):
+        self.lookup = lookup
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        instance = getattr(menu_cache, self.lookup)(data)
+        if instance is None:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=data)
+        return instance
+
+    def use_pk_only_optimization(self):
+        return True
+
+    def to_representation(self, value):
+        return self.name(value.pk)
+
+    def name(self, pk):
+        """
+        Return the name of the restaurant or item with this id
+        """
+        return getattr(menu_cache, f'{self.lookup}_name')(pk)
+
+    def prefetch(self, pks):
+        """
+        Cache the names of every restaurant or item in pks with one query
+        """
+        getattr(menu_cache, f'load_{self.lookup}s')(ids=pks)
+
+
+class OrderListSerializer(serializers.ListSerializer):
+    """
+    Validates and creates a batch of orders
+
+    Every restaurant and menu item named in the batch that is not already in
+    the menu cache is fetched up front with one query each, and the orders are
+    inserted with a single bulk_create.
+    """
+    max_batch_size = 500
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            if len(data) > self.max_batch_size:
+                raise serializers.ValidationError(
+                    f"Cannot create more than {self.max_batch_size} orders at once"
+                )
+            self.prefetch_menu(data)
+        return super().to_internal_value(data)
+
+    def prefetch_menu(self, data):
+        rows = [row for row in data if isinstance(row, dict)]
+        menu_cache.load_restaurants(row['restaurant'] for row in rows if isinstance(row.get('restaurant'), str))
+        menu_cache.load_items(row['item'] for row in rows if isinstance(row.get('item'), str))
+
+    def create(self, validated_data):
+        return Orders.objects.bulk_create_priced([Orders(**attrs) for attrs in validated_data])
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    restaurant = MenuSlugRelatedField(
+        slug_field='name', queryset=Restaurants.objects.all(), lookup='restaurant'
+    )
+    item = MenuSlugRelatedField(
+        slug_field='name', queryset=MenuItems.objects.all(), lookup='item'
+    )
 
     def validate(self, data):
         """
         Check that item is sold by restaurant
         """
-        if data['item'].restaurant != data['restaurant']:
+        if data['item'].restaurant_id != data['restaurant'].pk:
             raise serializers.ValidationError(f"{data['restaurant']} does not sell {data['item']}")
         return data
 
     class Meta:
         model = Orders
         fields = ['id', 'created', 'user', 'restaurant', 'quantity', 'item', 'comments', 'total_price']
+        list_serializer_class = OrderListSerializer
+
+
+class RevenueBucketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RevenueBuckets
+        fields = ['bucket_start', 'revenue', 'quantity', 'order_count']
+
+
+class TopItemSerializer(serializers.Serializer):
+    item = serializers.SerializerMethodField()
+    quantity = serializers.IntegerField(source='total_quantity')
+    revenue = serializers.DecimalField(max_digits=32, decimal_places=2, source='total_revenue')
+    order_count = serializers.IntegerField(source='total_orders')
+
+    def get_item(self, row):
+        return menu_cache.item_name(row['item_id'])
+
+
+class OrderRowEncoder:
+    """
+    Formats orders read with values_list() exactly as OrderSerializer formats
+    model instances
+
+    How each field is converted is worked out once from OrderSerializer's own
+    fields, so reads skip building model instances, resolving related objects
+    and calling every field's to_representation on every row. Fields whose
+    output cannot be reproduced directly fall back to their to_representation.
+
+    An encoder can be limited to some of the fields with only(), which also
+    limits the columns read. The columns in `required` are read either way,
+    after the fields' own, since pagination and merging order rows by them.
+    """
+    sources = {'user': 'user_id', 'restaurant': 'restaurant_id', 'item': 'item_id'}
+    required = ('created', 'id')
+
+    def __init__(self, serializer_class=OrderSerializer, fields=None):
+        self.serializer_class = serializer_class
+        serializer_fields = serializer_class().fields
+        if fields is not None:
+            serializer_fields = {name: serializer_fields[name] for name in serializer_fields if name in fields}
+        self.fields = list(serializer_fields)
+        self.columns = [self.sources.get(name, name) for name in self.fields]
+        self.columns += [name for name in self.required if name not in self.fields]
+        self.conversions = []
+        self.prefetches = []
+        for index, field in enumerate(serializer_fields.values()):
+            converter = self.converter(field)
+            if converter is not None:
+                self.conversions.append((index, converter))
+            if isinstance(field, MenuSlugRelatedField):
+                self.prefetches.append((index, field.prefetch))
+        self.subsets = {}
+
+    def only(self, fields):
+        """
+        Return an encoder for the given fields, in this encoder's field order
+
+        Raises ValueError naming any field this encoder does not have.
+        """
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise ValueError(f"{', '.join(unknown)} is not one of {', '.join(self.fields)}")
+        key = tuple(name for name in self.fields if name in fields)
+        if key == tuple(self.fields):
+            return self
+        encoder = self.subsets.get(key)
+        if encoder is None:
+            encoder = self.subsets[key] = type(self)(self.serializer_class, key)
+        return encoder
+
+    def converter(self, field):
+        """
+        Return a function formatting the column of field, or None if the
+        stored value is already its representation
+        """
+        if isinstance(field, MenuSlugRelatedField):
+            # restaurant and item columns hold ids, named through the menu cache
+            return field.name
+        if isinstance(field, serializers.DateTimeField):
+            output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+            if output_format is not None and output_format.lower() == ISO_8601:
+                return self.datetime_converter(field)
+        elif isinstance(field, serializers.DecimalField):
+            if not field.localize and field.decimal_places is not None:
+                return self.decimal_converter(field)
+        elif isinstance(field, (serializers.IntegerField, serializers.CharField, serializers.RelatedField)):
+            return None
+        return field.to_representation
+
+    def datetime_converter(self, field):
+        enforce_timezone = field.enforce_timezone
+
+        def convert(value):
+            value = enforce_timezone(value).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def decimal_converter(self, field):
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+
+        def convert(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            value = value.quantize(exponent, rounding=rounding, context=context)
+            return '{:f}'.format(value) if coerce_to_string else value
+        return convert
+
+    def values(self, row):
+        """
+        Return the formatted values of one row, in field order
+        """
+        values = list(row[:len(self.fields)])
+        for index, convert in self.conversions:
+            # like Serializer.to_representation, None is never converted
+            if values[index] is not None:
+                values[index] = convert(values[index])
+        return values
+
+    def encode(self, rows):
+        """
+        Return the representation of each row, as OrderSerializer(many=True).data would
+        """
+        fields = self.fields
+        for index, prefetch in self.prefetches:
+            prefetch(row[index] for row in rows)
+        return [dict(zip(fields, self.values(row))) for row in rows]
+
+    def encode_columns(self, rows):
+        """
+        Return the representation of the rows as one list of values per field
+        """
+        for index, prefetch in self.prefetches:
+            prefetch(row[index] for row in rows)
+        conversions = dict(self.conversions)
+        columns = OrderedDict()
+        for index, name in enumerate(self.fields):
+            values = [row[index] for row in rows]
+            convert = conversions.get(index)
+            if convert is not None:
+                values = [convert(value) if value is not None else None for value in values]
+            columns[name] = values
+        return columns
+
+
+order_rows = OrderRowEncoder()
@@ -0,0 +1,149 @@
+"""
+Sharding of order data by restaurant
+
+With ORDER_SHARDS set, Orders, OrdersArchive and the rollup tables are kept in
+the listed databases instead of the default one, with all of a restaurant's
+rows in the shard picked by its id. Users, restaurants and menu items stay
+in the default database, so shards do not enforce foreign keys to them, and
+deleting a restaurant or user does not cascade to its orders.
+
+Every shard allocates order ids from its own range, so ids stay unique across
+shards and the shard holding an order can be told from its id. Queries that
+cover many restaurants are sent to every shard in parallel and their results
+merged by (created, id).
+
+Code that reads or writes the sharded tables without a model instance to
+route by must pick the shard with using() or on_shard(). Shards are SQLite
+databases, whose 64 bit integer primary keys leave room for the id ranges.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# ids on the nth shard start at n << ID_BITS
+ID_BITS = 40
+SHARDED_MODELS = {
+    'orders', 'ordersarchive', 'restaurantrevenues', 'quantitystats',
+    'revenuebuckets', 'itemsales', 'itemdailysales',
+}
+
+_local = threading.local()
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def shards():
+    return getattr(settings, 'ORDER_SHARDS', [])
+
+
+def is_sharded(model):
+    return bool(shards()) and model._meta.app_label == 'orders' and model._meta.model_name in SHARDED_MODELS
+
+
+def order_databases():
+    """
+    Return the database of every shard, or [None] to let the routers pick
+    one when orders are not sharded
+    """
+    return shards() or [None]
+
+
+def shard_for(restaurant):
+    """
+    Return the shard holding the orders of the restaurant with this id, or
+    None when orders are not sharded
+    """
+    names = shards()
+    if not names:
+        return None
+    return names[int(restaurant) % len(names)]
+
+
+def shard_for_id(pk):
+    """
+    Return the shard holding the order with this id, or None when orders are
+    not sharded
+
+    Raises LookupError if no shard allocates the id.
+    """
+    names = shards()
+    if not names:
+        return None
+    index = (int(pk) >> ID_BITS) - 1
+    if not 0 <= index < len(names):
+        raise LookupError(f"No shard holds order {pk}")
+    return names[index]
+
+
+def reserve_ids(alias):
+    """
+    Make the shard's next order ids come from its own range
+    """
+    first = (shards().index(alias) + 1) << ID_BITS
+    from .models import Orders
+    table = Orders._meta.db_table
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+            [table, first, table],
+        )
+        cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s", [first, table, first])
+
+
+@contextmanager
+def on_shard(alias):
+    """
+    Route queries on the sharded tables without an instance to route by to alias
+    """
+    previous = getattr(_local, 'shard', None)
+    _local.shard = alias
+    try:
+        yield
+    finally:
+        _local.shard = previous
+
+
+def current_shard():
+    return getattr(_local, 'shard', None)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(len(shards()), 1), thread_name_prefix='order-shards'
+            )
+        return _executor
+
+
+def evaluate(querysets, function):
+    """
+    Return [function(queryset) for queryset in querysets]
+
+    Querysets on different databases are evaluated in parallel threads, and
+    those on the same database one after another in the order given.
+    """
+    groups = OrderedDict()
+    for index, queryset in enumerate(querysets):
+        groups.setdefault(queryset.db, []).append(index)
+    if len(groups) < 2:
+        return [function(queryset) for queryset in querysets]
+
+    results = [None] * len(querysets)
+
+    def run(indexes):
+        try:
+            for index in indexes:
+                results[index] = function(querysets[index])
+        finally:
+            # pool threads outlive the request, their connections must not
+            connections.close_all()
+
+    list(executor().map(run, groups.values()))
+    return results
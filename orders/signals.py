@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .authentication import users
+from .menu import menu_cache
+from .models import (MenuItems, Orders, OrdersArchive, Restaurants,
+                     orders_bulk_created)
+from .rollups import apply_orders
+from .sharding import on_shard, reserve_ids, shards
+from .versions import bump_menu_on_commit, bump_on_commit
+
+
+@receiver(pre_save, sender=Orders)
+def remember_previous_order(sender, instance, using, **kwargs):
+    """
+    Keep the stored version of an order that is about to be updated
+    """
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = sender.objects.using(using).select_for_update().filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Orders)
+def order_saved(sender, instance, using, **kwargs):
+    with on_shard(using):
+        if instance._previous is not None:
+            apply_orders([instance._previous], sign=-1)
+            bump_on_commit([instance._previous], using=using)
+        apply_orders([instance])
+    bump_on_commit([instance], using=using)
+
+
+@receiver(post_delete, sender=Orders)
+@receiver(post_delete, sender=OrdersArchive)
+def order_deleted(sender, instance, using, **kwargs):
+    with on_shard(using):
+        apply_orders([instance], sign=-1)
+    bump_on_commit([instance], using=using)
+
+
+@receiver(orders_bulk_created, sender=Orders)
+def orders_created(sender, instances, using, **kwargs):
+    with on_shard(using):
+        apply_orders(instances)
+    bump_on_commit(instances, using=using)
+
+
+@receiver([post_save, post_delete], sender=Restaurants)
+@receiver([post_save, post_delete], sender=MenuItems)
+def clear_menu_cache(sender, using, **kwargs):
+    # clear again on commit so nothing read before then outlives the write
+    menu_cache.clear()
+    transaction.on_commit(menu_cache.clear, using=using)
+    # lists show restaurant and item names
+    bump_menu_on_commit(using=using)
+
+
+@receiver([post_save, post_delete], sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    users.delete(instance.pk)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.vendor == 'sqlite' and pragmas:
+        # one call on the new connection rather than a statement per pragma
+        connection.connection.executescript(''.join(f"PRAGMA {name} = {value};" for name, value in pragmas.items()))
+
+
+@receiver(post_migrate)
+def set_journal_mode(sender, using, **kwargs):
+    # the journal mode persists in the database file, so new connections need not set it
+    journal_mode = getattr(settings, 'SQLITE_JOURNAL_MODE', None)
+    if sender.label == 'orders' and journal_mode and connections[using].vendor == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+
+
+@receiver(post_migrate)
+def start_shard_ids(sender, using, **kwargs):
+    if sender.label == 'orders' and using in shards():
+        reserve_ids(using)
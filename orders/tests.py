@@ -1,18 +1,65 @@
+import asyncio
+import csv
+import gzip
 import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from unittest import mock, skipUnless
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Avg, Sum
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.wsgi import get_wsgi_application
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections
+from django.utils import timezone
+from django.db.models import Avg, Q, Sum
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.exceptions import ErrorDetail
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (APIClient, APITestCase,
+                                 APITransactionTestCase)
 from rest_framework.views import status
+from rest_framework_jwt.utils import jwt_decode_handler
 
-from .models import MenuItems, Orders, Restaurants
-from .serializers import OrderSerializer
+from restaurant_api import settings as project_settings
+from restaurant_api.asgi import WSGIBridge
+
+from .admin import EstimatedCountPaginator
+from .archive import COLUMNS
+from .authentication import users, verified_tokens
+from .cache import MISSING, LRUCache
+from .compression import brotli, preferred_encoding
+from .ingestion import GroupCommitQueue
+from .menu import menu_cache
+from .models import (MenuItems, OrderImports, Orders, OrdersArchive,
+                     RestaurantRevenues, Restaurants)
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer, msgpack
+from .routers import ReplicaRouter
+from .serializers import OrderSerializer, order_rows
+from .sharding import shard_for, shard_for_id
+from .signals import set_journal_mode
+from . import throttling
+from .throttling import BucketStore
+from .views import OrdersListCreateView
 
 # tests for views
 
-class BaseViewTest(APITestCase):
+class OrdersFixtureMixin:
     client = APIClient()
 
     def create_order(self, restaurant, quantity, item, user=None):
@@ -22,6 +69,21 @@ class BaseViewTest(APITestCase):
             Orders.objects.create(restaurant=restaurant, quantity=quantity,item=item,user=self.user)
 
     def setUp(self):
+        # test transactions are rolled back without sending signals
+        menu_cache.clear()
+        users.clear()
+        verified_tokens.clear()
+        # a bucket file of its own, never the one of a server running on this host
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        isolated = override_settings(
+            THROTTLING={**settings.THROTTLING, "PATH": os.path.join(directory.name, "throttle.buckets")}
+        )
+        isolated.enable()
+        self.addCleanup(isolated.disable)
+        # list versions and primary pins
+        cache.clear()
+
         # mock test user
         self.user = User.objects.create_superuser(
             username="test_user",
@@ -65,6 +127,9 @@ class BaseViewTest(APITestCase):
         self.client.login(username=username, password=password)
         return self.token
 
+class BaseViewTest(OrdersFixtureMixin, APITestCase):
+    pass
+
 class GetAllOrdersTest(BaseViewTest):
 
     def test_get_all_orders(self):
@@ -76,10 +141,446 @@ class GetAllOrdersTest(BaseViewTest):
             reverse("orders-all")
         )
         # fetch the data from db
-        expected = Orders.objects.all()
+        expected = Orders.objects.order_by("created", "id")
         serialized = OrderSerializer(expected, many=True)
-        self.assertEqual(response.data, serialized.data)
+        self.assertEqual(response.data["results"], serialized.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class PaginationTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        item = MenuItems.objects.get(name="beef")
+        for quantity in range(1, 6):
+            self.create_order(restaurant, quantity, item)
+
+    def walk(self, url, key):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(order["id"] for order in response.data["results"])
+            url = response.data[key]
+        return ids
+
+    def test_walk_pages_forward_and_back(self):
+        """
+        Test that following next and previous cursors visits every order once in (created, id) order
+        """
+        expected = list(Orders.objects.order_by("created", "id").values_list("id", flat=True))
+        forward = self.walk(reverse("orders-all") + "?page_size=2", "next")
+        self.assertEqual(forward, expected)
+
+        response = self.client.get(reverse("orders-all") + "?page_size=2")
+        while response.data["next"]:
+            last = response
+            response = self.client.get(response.data["next"])
+        self.assertIsNone(response.data["next"])
+        backward = []
+        url = last.data["next"]
+        while url:
+            response = self.client.get(url)
+            backward[:0] = [order["id"] for order in response.data["results"]]
+            url = response.data["previous"]
+        self.assertEqual(backward, expected)
+
+    def test_pages_do_not_count(self):
+        """
+        Test that fetching a page does not issue a COUNT(*) query
+        """
+        response = self.client.get(reverse("orders-all") + "?page_size=2")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(response.data["next"])
+        self.assertFalse(any("COUNT(" in query["sql"].upper() for query in queries.captured_queries))
+
+    @skipUnless(connection.vendor == "sqlite", "query plan text is backend specific")
+    def test_pages_use_indexes(self):
+        """
+        Test that restaurant and customer pages are read in index order without a sort
+        """
+        after = Orders.objects.order_by("created", "id")[2]
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        for index, queryset in [
+            ("orders_rest_created_idx", Orders.objects.filter(restaurant=restaurant.pk)),
+            ("orders_user_created_idx", Orders.objects.filter(user=self.valid_id)),
+        ]:
+            page = queryset.filter(created__gte=after.created).filter(
+                Q(created__gt=after.created) | Q(id__gt=after.id)
+            ).order_by("created", "id")[:2]
+            plan = page.explain()
+            self.assertIn(index, plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_no_redundant_foreign_key_indexes(self):
+        """
+        Test that restaurant and user have no index of their own next to the composite ones leading with them
+        """
+        for model in (Orders, OrdersArchive):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            single = [constraint["columns"] for constraint in constraints.values() if constraint["index"]]
+            self.assertNotIn(["restaurant_id"], single)
+            self.assertNotIn(["user_id"], single)
+            self.assertIn(["item_id"], single)
+
+    def test_invalid_cursor(self):
+        """
+        Test that a malformed cursor returns 404
+        """
+        response = self.client.get(reverse("orders-all") + "?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class ConditionalGetTest(OrdersFixtureMixin, APITransactionTestCase):
+    # order writes bump list versions on commit, so these tests really commit
+
+    def get(self, url, etag=None):
+        if etag:
+            return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return self.client.get(url)
+
+    def test_unchanged_list_is_not_modified(self):
+        """
+        Test that a list answers its own ETag with 304 and no order queries
+        """
+        for url in [
+            reverse("orders-all"),
+            reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant}),
+            reverse("orders-customer", kwargs={"customer": self.user.pk}),
+        ]:
+            response = self.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response["ETag"]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.get(url, etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response["ETag"], etag)
+            self.assertFalse([query for query in queries.captured_queries if "orders_orders" in query["sql"]])
+
+    def test_writes_change_etag(self):
+        """
+        Test that writing an order changes the ETag of the lists it belongs to only
+        """
+        other = Restaurants.objects.create(name="Pizza")
+        item = MenuItems.objects.create(restaurant=other, name="margherita", price=8)
+        burger = reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant})
+        pizza = reverse("orders-restaurant", kwargs={"restaurant": "Pizza"})
+        customer = reverse("orders-customer", kwargs={"customer": self.user.pk})
+        etags = {url: self.get(url)["ETag"] for url in [burger, pizza, customer]}
+
+        self.client.post(reverse("orders-all"), {"restaurant": "Pizza", "quantity": 1, "item": "margherita"})
+        self.assertEqual(self.get(burger, etags[burger]).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.get(pizza, etags[pizza]).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get(customer, etags[customer]).status_code, status.HTTP_200_OK)
+
+        etags = {url: self.get(url)["ETag"] for url in [burger, pizza]}
+        Orders.objects.filter(item=item).delete()
+        self.assertEqual(self.get(burger, etags[burger]).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.get(pizza, etags[pizza]).status_code, status.HTTP_200_OK)
+
+    def test_renaming_restaurant_changes_etag(self):
+        """
+        Test that renaming a restaurant changes the ETag of the lists showing its name
+        """
+        url = reverse("orders-customer", kwargs={"customer": self.user.pk})
+        etag = self.get(url)["ETag"]
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        restaurant.name = "Burger Palace"
+        restaurant.save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Burger Palace", response.content.decode())
+
+    def test_versions_start_from_microsecond_clock(self):
+        """
+        Test that new list versions only need time.time, which Python 3.6 has
+        """
+        with mock.patch("orders.versions.time", mock.Mock(spec=["time"], time=lambda: 1500000000.25)):
+            response = self.get(reverse("orders-all"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get(reverse("orders-all"), response["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+class ASGIEntryPointTest(OrdersFixtureMixin, APITransactionTestCase):
+    # views run on a pool thread with its own connection, so data must be committed
+
+    def call(self, method, path, chunks=(b"",), headers=()):
+        messages = [
+            {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+            for index, chunk in enumerate(chunks)
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Bearer {self.token}".encode()),
+                (b"content-type", b"application/json"),
+                *headers,
+            ],
+        }
+        bridge = WSGIBridge(get_wsgi_application(), max_workers=1)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(bridge(scope, receive, send))
+        finally:
+            loop.close()
+            bridge.executor.shutdown()
+        return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+    def test_reads_match_wsgi(self):
+        """
+        Test that the ASGI entry point answers read endpoints with the same body as WSGI
+        """
+        for url in [
+            reverse("orders-single", kwargs={"pk": self.valid_id}),
+            reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant}),
+            reverse("cost-single", kwargs={"restaurant": self.valid_restaurant}),
+        ]:
+            status_code, body = self.call("GET", url)
+            self.assertEqual(status_code, status.HTTP_200_OK)
+            self.assertEqual(body, self.client.get(url).content)
+
+    def test_request_body_in_chunks(self):
+        """
+        Test that a request body sent in several messages reaches the view whole
+        """
+        body = json.dumps({"restaurant": self.valid_restaurant, "quantity": 2, "item": "beef"}).encode()
+        status_code, content = self.call("POST", reverse("orders-all"), [body[:10], body[10:]])
+        self.assertEqual(status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(content)["total_price"], "4.00")
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=20)
+    def test_request_body_over_limit(self):
+        """
+        Test that a body over DATA_UPLOAD_MAX_MEMORY_SIZE is refused before it is read whole
+        """
+        body = json.dumps({"restaurant": self.valid_restaurant, "quantity": 2, "item": "beef"}).encode()
+        count = Orders.objects.count()
+        for chunks, headers in [
+            ([body[:10], body[10:30], body[30:]], ()),
+            ([body], [(b"content-length", str(len(body)).encode())]),
+        ]:
+            status_code, content = self.call("POST", reverse("orders-all"), chunks, headers)
+            self.assertEqual(status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            self.assertEqual(json.loads(content), {"message": "Request body is too large"})
+        self.assertEqual(Orders.objects.count(), count)
+
+    def test_repeated_cookie_headers(self):
+        """
+        Test that repeated Cookie headers are joined the way cookies are, and other headers with commas
+        """
+        bridge = WSGIBridge(get_wsgi_application(), max_workers=1)
+        self.addCleanup(bridge.executor.shutdown)
+        environ = bridge.environ({
+            "method": "GET",
+            "path": "/",
+            "headers": [(b"cookie", b"a=1"), (b"cookie", b"b=2"), (b"accept", b"text/html"), (b"accept", b"*/*")],
+        }, b"")
+        self.assertEqual(environ["HTTP_COOKIE"], "a=1; b=2")
+        self.assertEqual(environ["HTTP_ACCEPT"], "text/html,*/*")
+
+class CachedAuthenticationTest(BaseViewTest):
+
+    def test_repeat_requests_skip_user_query_and_verification(self):
+        """
+        Test that a repeated token is neither verified again nor resolved with a query
+        """
+        self.client.get(reverse("orders-all"))
+        with mock.patch(
+            "rest_framework_jwt.authentication.jwt_decode_handler", wraps=jwt_decode_handler
+        ) as decode, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("orders-all"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(decode.called)
+        self.assertFalse([query for query in queries.captured_queries if "auth_user" in query["sql"]])
+
+    def test_deactivated_user_is_rejected(self):
+        """
+        Test that deactivating a user takes effect on the next request
+        """
+        self.client.get(reverse("orders-all"))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse("orders-all"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_is_verified_again(self):
+        """
+        Test that a cached token is verified again once it expires rather than served from cache
+        """
+        self.client.get(reverse("orders-all"))
+        expires = jwt_decode_handler(self.token)["exp"]
+        with mock.patch("orders.authentication.time.time", return_value=expires + 1), mock.patch(
+            "rest_framework_jwt.authentication.jwt_decode_handler", wraps=jwt_decode_handler
+        ) as decode:
+            self.client.get(reverse("orders-all"))
+        self.assertTrue(decode.called)
+
+class ThrottlingTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        handle, self.path = tempfile.mkstemp(suffix=".buckets")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def rates(self, **rates):
+        return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates})
+
+    def test_token_bucket(self):
+        """
+        Test that a bucket allows bursts up to its capacity and refills at its rate
+        """
+        store = BucketStore(self.path, slots=64)
+        self.assertEqual([store.take("a", 2, 1, now=0) for _ in range(3)], [0, 0, 1])
+        self.assertEqual(store.take("a", 2, 1, now=0.5), 0.5)
+        self.assertEqual(store.take("a", 2, 1, now=1), 0)
+        self.assertEqual(store.take("b", 2, 1, now=1), 0)
+        # idle buckets refill up to their capacity only
+        self.assertEqual([store.take("a", 2, 1, now=100) for _ in range(3)], [0, 0, 1])
+
+        # a full set evicts the bucket updated longest ago, which comes back full
+        store = BucketStore(self.path, slots=4)
+        store.clear()
+        store.take("a", 1, 1, now=0)
+        for key in "bcde":
+            store.take(key, 1, 1, now=1)
+        self.assertEqual(store.take("a", 1, 1, now=1), 0)
+        self.assertEqual(store.take("e", 1, 1, now=1), 1)
+
+    def test_tests_use_their_own_buckets(self):
+        """
+        Test that throttled requests in tests never touch the configured bucket file
+        """
+        live = project_settings.THROTTLING["PATH"]
+        self.client.get(reverse("orders-all"))
+        self.assertNotEqual(throttling.buckets.path, live)
+        self.assertTrue(os.path.exists(throttling.buckets.path))
+        with override_settings(THROTTLING={**settings.THROTTLING, "PATH": self.path}):
+            self.assertEqual(throttling.buckets.path, self.path)
+
+    @skipUnless(hasattr(os, "geteuid"), "needs POSIX file ownership")
+    def test_bucket_file_belongs_to_server(self):
+        """
+        Test that buckets are never kept in a file reached through a link or owned by another user
+        """
+        link = f"{self.path}.link"
+        os.symlink(self.path, link)
+        self.addCleanup(os.remove, link)
+        with self.assertRaises(OSError):
+            BucketStore(link, slots=64).take("a", 1, 1)
+        with mock.patch("orders.throttling.os.geteuid", return_value=os.geteuid() + 1):
+            with self.assertRaisesMessage(ImproperlyConfigured, "belongs to another user"):
+                BucketStore(self.path, slots=64).take("a", 1, 1)
+
+    @skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_buckets_are_shared_between_processes(self):
+        """
+        Test that tokens taken in one process are gone in another
+        """
+        store = BucketStore(self.path, slots=64)
+        store.take("a", 3, 0.001)
+
+        def take():
+            BucketStore(self.path, slots=64).take("a", 3, 0.001)
+
+        process = multiprocessing.get_context("fork").Process(target=take)
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(store.take("a", 3, 0.001), 0)
+        self.assertGreater(store.take("a", 3, 0.001), 0)
+
+    def test_aggregates_are_throttled_per_endpoint(self):
+        """
+        Test that aggregate endpoints have their own budget per user and endpoint, answered with 429
+        """
+        cost = reverse("cost-single", kwargs={"restaurant": self.valid_restaurant})
+        average = reverse("average-quantity", kwargs={"restaurant": self.valid_restaurant, "customer": self.user.pk})
+        with self.rates(reads="100/min", writes="100/min", aggregates="2/min"):
+            self.assertEqual([self.client.get(cost).status_code for _ in range(2)], [200, 200])
+            response = self.client.get(cost)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(int(response["Retry-After"]), 30)
+            self.assertEqual(self.client.get(average).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(reverse("orders-all")).status_code, status.HTTP_200_OK)
+
+            User.objects.create_user(username="other", password="other_pass")
+            self.login_client(username="other", password="other_pass")
+            self.assertEqual(self.client.get(cost).status_code, status.HTTP_200_OK)
+
+    def test_reads_and_writes_have_separate_budgets(self):
+        """
+        Test that writes are limited by the writes rate without using up reads, and None lifts a limit
+        """
+        order = {"restaurant": self.valid_restaurant, "quantity": 1, "item": "beef"}
+        with self.rates(reads="3/min", writes="1/min", aggregates=None):
+            self.assertEqual(self.client.post(reverse("orders-all"), order).status_code, status.HTTP_201_CREATED)
+            self.assertEqual(
+                self.client.post(reverse("orders-all"), order).status_code, status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            self.assertEqual(self.client.get(reverse("orders-all")).status_code, status.HTTP_200_OK)
+            cost = reverse("cost-single", kwargs={"restaurant": self.valid_restaurant})
+            self.assertTrue(all(self.client.get(cost).status_code == 200 for _ in range(5)))
+
+class RequestTimingTest(BaseViewTest):
+
+    def timed_client(self):
+        # middleware settings are read when a client first loads the middleware
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + self.token)
+        return client
+
+    @override_settings(REQUEST_TIMING={"SAMPLE_RATE": 1, "SLOW_REQUEST_MS": 60000})
+    def test_sampled_request_is_timed(self):
+        """
+        Test that a sampled request gets a Server-Timing header and one log line
+        """
+        client = self.timed_client()
+        with self.assertLogs("orders.timing", "INFO"):
+            client.get(reverse("orders-all"))
+        with CaptureQueriesContext(connection) as queries, self.assertLogs("orders.timing", "INFO") as logs:
+            response = client.get(reverse("orders-all"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertIn("serializer;dur=", timing)
+        self.assertIn("total;dur=", timing)
+        self.assertEqual(len(logs.records), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["path"], reverse("orders-all"))
+        self.assertEqual(entry["queries"], len(queries))
+        self.assertGreaterEqual(entry["total_ms"], entry["serializer_ms"])
+
+    @override_settings(REQUEST_TIMING={"SAMPLE_RATE": 1, "SLOW_REQUEST_MS": 0})
+    def test_slow_request_logs_sql(self):
+        """
+        Test that a request over the threshold is logged as a warning with its SQL
+        """
+        with self.assertLogs("orders.timing", "WARNING") as logs:
+            self.timed_client().get(reverse("orders-single", kwargs={"pk": self.valid_id}))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertTrue(any("orders_orders" in query["sql"] for query in entry["sql"]))
+
+    @override_settings(REQUEST_TIMING={"SAMPLE_RATE": 0})
+    def test_unsampled_request_is_not_timed(self):
+        """
+        Test that no timing is added when sampling is off
+        """
+        response = self.timed_client().get(reverse("orders-all"))
+        self.assertNotIn("Server-Timing", response)
 
 class CreateOrderTest(BaseViewTest):
 
@@ -102,6 +603,522 @@ class CreateOrderTest(BaseViewTest):
         self.assertEqual(response.data, serialized.data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+class BulkCreateOrderTest(BaseViewTest):
+
+    def post_orders(self, orders):
+        return self.client.post(
+            reverse("orders-all"),
+            data=json.dumps(orders),
+            content_type="application/json"
+        )
+
+    def test_create_many_orders(self):
+        """
+        Test POST orders/ with a list creates every order and prices it
+        """
+        response = self.post_orders([
+            {"restaurant": "Burger", "quantity": 2, "item": "beef"},
+            {"restaurant": "Burger", "quantity": 4, "item": "chicken", "comments": "no sauce"},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        expected = Orders.objects.filter(pk__in=[order["id"] for order in response.data]).order_by("id")
+        serialized = OrderSerializer(expected, many=True)
+        self.assertEqual(response.data, serialized.data)
+        self.assertEqual([order["total_price"] for order in response.data], ["4.00", "6.00"])
+        self.assertEqual(Orders.objects.count(), 4)
+
+    def test_queries_do_not_grow_with_batch(self):
+        """
+        Test that a bulk POST costs the same number of queries for 2 or 50 orders
+        """
+        order = {"restaurant": "Burger", "quantity": 1, "item": "beef"}
+        self.post_orders([order])
+        menu_cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self.post_orders([order] * 2)
+        menu_cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self.post_orders([order] * 50)
+        self.assertEqual(len(small), len(large))
+
+    def test_invalid_order_rejects_batch(self):
+        """
+        Test that one invalid order rejects the whole batch
+        """
+        Restaurants.objects.create(name="Pizza")
+        response = self.post_orders([
+            {"restaurant": "Burger", "quantity": 2, "item": "beef"},
+            {"restaurant": "Pizza", "quantity": 1, "item": "beef"},
+            {"restaurant": "Burger", "quantity": 1, "item": "does_not_exist"},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(response.data[1]["non_field_errors"][0], "Pizza does not sell Burger: beef - 2.00")
+        self.assertEqual(response.data[2]["item"][0], "Object with name=does_not_exist does not exist.")
+        self.assertEqual(Orders.objects.count(), 2)
+
+class GroupCommitTest(OrdersFixtureMixin, APITransactionTestCase):
+    # orders are written by the queue's own thread, so data must be committed
+
+    def setUp(self):
+        super().setUp()
+        self.queue = GroupCommitQueue(max_batch=50, max_delay=0.2)
+        patcher = mock.patch.object(OrdersListCreateView, "order_queue", self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.queue.stop)
+
+    def unsaved_orders(self, quantities, item="beef"):
+        item = MenuItems.objects.get(name=item)
+        return [
+            Orders(restaurant=item.restaurant, item=item, quantity=quantity, user=self.user)
+            for quantity in quantities
+        ]
+
+    def test_create_orders(self):
+        """
+        Test that POST orders/ returns each request's own orders when they are group committed
+        """
+        response = self.client.post(reverse("orders-all"), {"restaurant": "Burger", "quantity": 9, "item": "beef"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, OrderSerializer(Orders.objects.get(pk=response.data["id"])).data)
+
+        response = self.client.post(
+            reverse("orders-all"),
+            data=json.dumps([{"restaurant": "Burger", "quantity": 2, "item": "chicken"}] * 2),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        saved = Orders.objects.filter(pk__in=[order["id"] for order in response.data]).order_by("id")
+        self.assertEqual(response.data, OrderSerializer(saved, many=True).data)
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_concurrent_requests_share_a_transaction(self):
+        """
+        Test that orders submitted together are inserted in one transaction and every caller gets its own ids
+        """
+        futures = []
+        with mock.patch.object(self.queue, "write", wraps=self.queue.write) as write:
+            threads = [
+                threading.Thread(target=lambda quantity=quantity: futures.append(
+                    self.queue.submit(self.unsaved_orders([quantity, quantity]))
+                ))
+                for quantity in range(1, 6)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results = [future.result(timeout=5) for future in futures]
+        self.assertEqual(write.call_count, 1)
+        for orders in results:
+            saved = Orders.objects.filter(pk__in=[order.pk for order in orders])
+            self.assertEqual(sorted(order.quantity for order in saved), [orders[0].quantity] * 2)
+        self.assertEqual(Orders.objects.count(), 12)
+
+    def test_stalled_writer(self):
+        """
+        Test that a request whose orders the writer does not take gets a 503 and its orders are never written
+        """
+        self.queue.timeout = 0.05
+        with mock.patch.object(self.queue, "start"):
+            response = self.client.post(reverse("orders-all"), {"restaurant": "Burger", "quantity": 9, "item": "beef"})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        # the writer comes back and reaches the withdrawn orders first
+        order, = self.queue.submit(self.unsaved_orders([4])).result(timeout=5)
+        self.assertEqual(sorted(Orders.objects.values_list("quantity", flat=True)), [3, 4, 6])
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_failed_request_does_not_fail_others(self):
+        """
+        Test that an order that cannot be inserted only fails its own request
+        """
+        missing = MenuItems(name="missing", price=1, restaurant=Restaurants.objects.get(name="Burger"))
+        failing = self.queue.submit([Orders(restaurant=missing.restaurant, item=missing, quantity=1, user=self.user)])
+        succeeding = self.queue.submit(self.unsaved_orders([4]))
+        with self.assertRaises(IntegrityError):
+            failing.result(timeout=5)
+        order, = succeeding.result(timeout=5)
+        self.assertEqual(Orders.objects.get(pk=order.pk).quantity, 4)
+        self.assertEqual(Orders.objects.count(), 3)
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    @skipUnless(connection.vendor == "sqlite", "pragmas are SQLite specific")
+    def test_sqlite_pragmas(self):
+        """
+        Test that new SQLite connections get the configured pragmas without a query each
+        """
+        connection.close()
+        with CaptureQueriesContext(connection) as queries:
+            connection.ensure_connection()
+        self.assertEqual(len(queries), 0)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    @skipUnless(connection.vendor == "sqlite", "pragmas are SQLite specific")
+    def test_migrate_sets_journal_mode(self):
+        """
+        Test that migrate switches a SQLite database file to WAL once
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "db.sqlite3")
+            database = connections["default"].__class__({**connection.settings_dict, "NAME": path}, "scratch")
+            with mock.patch("orders.signals.connections", {"scratch": database}):
+                set_journal_mode(apps.get_app_config("orders"), "scratch")
+            database.close()
+            with closing(sqlite3.connect(path)) as scratch:
+                self.assertEqual(scratch.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+class ReplicaRoutingTest(BaseViewTest):
+
+    def routed_reads(self, request):
+        """
+        Return the databases the router picked for order reads while making request
+        """
+        reads = []
+        route = ReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            # authentication happens before the view picks a database
+            if model._meta.app_label == "orders":
+                reads.append(route(router, model, **hints))
+            # the replica alias does not exist in tests
+            return "default"
+
+        with override_settings(DATABASE_REPLICAS=["replica1"]):
+            with mock.patch.object(ReplicaRouter, "db_for_read", db_for_read):
+                response = request()
+        self.assertLess(response.status_code, 400)
+        return set(reads)
+
+    def test_reads_use_replicas(self):
+        """
+        Test that list, retrieve and stats views read from a replica and other reads use the primary
+        """
+        for url in [
+            reverse("orders-all"),
+            reverse("orders-single", kwargs={"pk": 1}),
+            reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant}),
+            reverse("cost-single", kwargs={"restaurant": self.valid_restaurant}),
+            reverse("top-items", kwargs={"restaurant": self.valid_restaurant}),
+        ]:
+            self.assertEqual(self.routed_reads(lambda: self.client.get(url)), {"replica1"}, url)
+        with override_settings(DATABASE_REPLICAS=["replica1"]):
+            self.assertEqual(ReplicaRouter().db_for_read(Orders), "default")
+
+    def test_read_your_writes(self):
+        """
+        Test that after a POST the user reads from the primary while other users still use replicas
+        """
+        reads = self.routed_reads(lambda: self.client.post(
+            reverse("orders-all"), {"restaurant": "Burger", "quantity": 1, "item": "beef"}
+        ))
+        self.assertEqual(reads, {"default"})
+        reads = self.routed_reads(lambda: self.client.get(reverse("orders-all")))
+        self.assertEqual(reads, {"default"})
+
+        User.objects.create_user(username="other_user", password="other_pass")
+        self.login_client(username="other_user", password="other_pass")
+        reads = self.routed_reads(lambda: self.client.get(reverse("orders-all")))
+        self.assertEqual(reads, {"replica1"})
+
+    def test_writes_and_migrations_use_primary(self):
+        """
+        Test that writes always go to the primary and replicas are never migrated
+        """
+        router = ReplicaRouter()
+        with override_settings(DATABASE_REPLICAS=["replica1"]):
+            order = Orders.objects.get(pk=1)
+            order._state.db = "replica1"
+            self.assertEqual(router.db_for_write(Orders, instance=order), "default")
+            self.assertFalse(router.allow_migrate("replica1", "orders"))
+            self.assertIsNone(router.allow_migrate("default", "orders"))
+
+class MenuCacheTest(BaseViewTest):
+
+    def test_create_order_query_budget(self):
+        """
+        Test that creating an order with a warm menu cache reads no menu rows, and only inserts the
+        order and updates its rollup rows
+        """
+        order = {"restaurant": "Burger", "quantity": 1, "item": "beef"}
+        self.client.post(reverse("orders-all"), order)
+        # the savepoint and its release, the insert, and one update per rollup row: the restaurant's
+        # revenue, the customer's quantities, three revenue buckets, the item's sales and its daily sales
+        with self.assertNumQueries(10), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("orders-all"), order)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if query.startswith("SELECT")])
+        self.assertEqual(len([query for query in sql if query.startswith("INSERT")]), 1)
+
+    def test_menu_writes_invalidate(self):
+        """
+        Test that new prices, renames and deletes are seen straight away
+        """
+        self.client.post(reverse("orders-all"), {"restaurant": "Burger", "quantity": 1, "item": "beef"})
+        item = MenuItems.objects.get(name="beef")
+        item.price = 5
+        item.save()
+        response = self.client.post(reverse("orders-all"), {"restaurant": "Burger", "quantity": 1, "item": "beef"})
+        self.assertEqual(response.data["total_price"], "5.00")
+
+        fries = MenuItems.objects.create(restaurant=item.restaurant, name="fries", price=1)
+        self.assertIsNotNone(menu_cache.item("fries"))
+        fries.name = "chips"
+        fries.save()
+        response = self.client.post(reverse("orders-all"), {"restaurant": "Burger", "quantity": 1, "item": "fries"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Restaurants.objects.create(name="Pizza").delete()
+        self.assertIsNone(menu_cache.restaurant("Pizza"))
+
+    def test_orders_store_ids(self):
+        """
+        Test that orders keep restaurant and item ids, named in responses and following renames
+        """
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        self.assertEqual(set(Orders.objects.values_list("restaurant", flat=True)), {restaurant.pk})
+        restaurant.name = "Grill"
+        restaurant.save()
+        response = self.client.get(reverse("orders-restaurant", kwargs={"restaurant": "Grill"}))
+        self.assertEqual(len(response.data["results"]), Orders.objects.count())
+        self.assertEqual({order["restaurant"] for order in response.data["results"]}, {"Grill"})
+        self.assertEqual(
+            {order["item"] for order in response.data["results"]},
+            set(MenuItems.objects.filter(restaurant=restaurant).values_list("name", flat=True)),
+        )
+        response = self.client.get(reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_lru_cache_evicts_and_expires(self):
+        """
+        Test that the cache drops the least recently used entry and expired entries
+        """
+        now = [0]
+        cache = LRUCache(max_size=2, ttl=10, clock=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(len(cache), 2)
+        now[0] = 10
+        self.assertIs(cache.get("c"), MISSING)
+
+class OrderRowEncoderTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        item = MenuItems.objects.create(restaurant=restaurant, name="shake", price=Decimal("3.333"))
+        Orders.objects.create(restaurant=restaurant, quantity=7, item=item, user=self.user, comments="no ice \u00e9")
+
+    def test_rows_render_like_serializer(self):
+        """
+        Test that encoded rows render to the same bytes as OrderSerializer
+        """
+        expected = Orders.objects.order_by("created", "id")
+        rows = expected.values_list(*order_rows.columns)
+        self.assertEqual(
+            JSONRenderer().render(order_rows.encode(rows)),
+            JSONRenderer().render(OrderSerializer(expected, many=True).data),
+        )
+
+        response = self.client.get(reverse("orders-all"))
+        self.assertEqual(response.data["results"], OrderSerializer(expected, many=True).data)
+        for order in expected:
+            response = self.client.get(reverse("orders-single", kwargs={"pk": order.pk}))
+            self.assertEqual(response.content, JSONRenderer().render(OrderSerializer(order).data))
+
+    def test_list_is_one_query(self):
+        """
+        Test that a page of orders is read without per-order related queries
+        """
+        self.client.get(reverse("orders-all"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("orders-all"))
+        self.assertEqual(len(response.data["results"]), 3)
+        # the page, and the newest archived time
+        self.assertEqual(len(queries), 2)
+
+    def test_sparse_fields(self):
+        """
+        Test that ?fields= limits the columns read and the fields returned, and keeps pagination working
+        """
+        expected = OrderSerializer(Orders.objects.order_by("created", "id"), many=True).data
+        fields = ["id", "created", "restaurant", "total_price"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("orders-all"), {"fields": "total_price,restaurant,id,created"})
+        self.assertEqual(response.data["results"], [{name: order[name] for name in fields} for order in expected])
+        self.assertNotIn("comments", queries.captured_queries[-1]["sql"])
+
+        ids, url = [], reverse("orders-all") + "?fields=item&page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertTrue(all(list(order) == ["item"] for order in response.data["results"]))
+            ids.extend(order["item"] for order in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(ids, [order["item"] for order in expected])
+
+        order = expected[0]
+        response = self.client.get(reverse("orders-single", kwargs={"pk": order["id"]}), {"fields": "quantity"})
+        self.assertEqual(response.data, {"quantity": order["quantity"]})
+        response = self.client.get(reverse("orders-export", kwargs={"export_format": "csv"}), {"fields": "id,item"})
+        lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines, [["id", "item"]] + [[str(order["id"]), order["item"]] for order in expected])
+
+        response = self.client.get(reverse("orders-all"), {"fields": "id,price"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price", response.data["fields"])
+
+    def test_columnar_format(self):
+        """
+        Test that lists rendered as columnar JSON hold one array per field
+        """
+        expected = OrderSerializer(Orders.objects.order_by("created", "id"), many=True).data
+        response = self.client.get(reverse("orders-all"), {"format": "columnar", "fields": "id,total_price"})
+        self.assertEqual(response["Content-Type"], "application/vnd.orders.columnar+json")
+        self.assertEqual(json.loads(response.content)["results"], {
+            "id": [order["id"] for order in expected],
+            "total_price": [order["total_price"] for order in expected],
+        })
+        response = self.client.get(
+            reverse("orders-customer", kwargs={"customer": self.user.pk}),
+            HTTP_ACCEPT="application/vnd.orders.columnar+json",
+        )
+        columns = json.loads(response.content)["results"]
+        self.assertEqual(list(columns), list(expected[0]))
+        self.assertEqual(columns["restaurant"], [order["restaurant"] for order in expected])
+
+class RendererTest(BaseViewTest):
+
+    def test_fast_json_renders_like_json_renderer(self):
+        """
+        Test that FastJSONRenderer gives the same bytes as JSONRenderer
+        """
+        now = timezone.now()
+        samples = [
+            OrderSerializer(Orders.objects.order_by("created", "id"), many=True).data,
+            {"created": now, "naive": now.replace(tzinfo=None), "day": now.date(), "time": now.time()},
+            {"price": Decimal("3.330"), "average": 4 / 3, "big": 2 ** 70, 1: None, "flag": True},
+            ["caf\u00e9", "line\u2028separator\u2029", ErrorDetail("invalid", code="invalid")],
+            None,
+        ]
+        for data in samples:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+            self.assertEqual(
+                FastJSONRenderer().render(data, "application/json; indent=2"),
+                JSONRenderer().render(data, "application/json; indent=2"),
+            )
+        response = self.client.get(reverse("orders-all"))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_fast_json_parses_like_json_parser(self):
+        """
+        Test that FastJSONParser gives the same data and errors as JSONParser
+        """
+        for body in [b'{"quantity": 2, "price": 1.5, "big": 1180591620717411303424}', "[\"caf\u00e9\"]".encode()]:
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for body in [b'{"quantity": ', b"[NaN]", b""]:
+            with self.assertRaises(ParseError) as expected:
+                JSONParser().parse(BytesIO(body))
+            with self.assertRaises(ParseError) as raised:
+                FastJSONParser().parse(BytesIO(body))
+            self.assertEqual(raised.exception.detail, expected.exception.detail)
+
+        response = self.client.post(reverse("orders-all"), "{", content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_messagepack(self):
+        """
+        Test that MessagePack is negotiated with Accept and read by Content-Type
+        """
+        response = self.client.get(reverse("orders-all"))
+        packed = self.client.get(reverse("orders-all"), HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(packed["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(packed.content, raw=False), json.loads(response.content))
+
+        body = msgpack.packb({"restaurant": self.valid_restaurant, "quantity": 2, "item": "beef"})
+        response = self.client.post(reverse("orders-all"), body, content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["quantity"], 2)
+        response = self.client.post(reverse("orders-all"), b"\xc1", content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CompressionTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        item = MenuItems.objects.get(name="beef")
+        for quantity in range(1, 11):
+            self.create_order(restaurant, quantity, item)
+
+    def test_preferred_encoding(self):
+        """
+        Test that the encoding with the highest q value wins, ties going to the first available
+        """
+        for header, expected in [
+            ("gzip, deflate, br", "br"),
+            ("gzip;q=1.0, br;q=0.5", "gzip"),
+            ("br;q=0, *", "gzip"),
+            ("*;q=0.1, gzip;Q=0", "br"),
+            ("identity", None),
+            ("gzip;q=0", None),
+            ("", None),
+        ]:
+            self.assertEqual(preferred_encoding(header, ["br", "gzip"]), expected, header)
+        self.assertEqual(preferred_encoding("br, gzip", ["gzip"]), "gzip")
+
+    def test_gzip_list(self):
+        """
+        Test that large responses are gzipped when accepted, keeping conditional GETs working
+        """
+        plain = self.client.get(reverse("orders-all"))
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        response = self.client.get(reverse("orders-all"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+        response = self.client.get(
+            reverse("orders-all"), HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        order = Orders.objects.first()
+        response = self.client.get(reverse("orders-single", kwargs={"pk": order.pk}), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_list(self):
+        """
+        Test that brotli is used when the client prefers it
+        """
+        plain = self.client.get(reverse("orders-all"))
+        response = self.client.get(reverse("orders-all"), HTTP_ACCEPT_ENCODING="gzip;q=0.8, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_streaming_export(self):
+        """
+        Test that exports are compressed as they stream
+        """
+        url = reverse("orders-export", kwargs={"export_format": "ndjson"})
+        plain = b"".join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response)
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
 class GetASingleOrdersTest(BaseViewTest):
 
     def test_get_order_by_order_id(self):
@@ -152,9 +1169,9 @@ class GetListOfOrdersTest(BaseViewTest):
             )
         )
         # fetch the data from db
-        expected = Orders.objects.filter(user=self.valid_id)
+        expected = Orders.objects.filter(user=self.valid_id).order_by("created", "id")
         serialized = OrderSerializer(expected, many=True)
-        self.assertEqual(response.data, serialized.data)
+        self.assertEqual(response.data["results"], serialized.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # test with a customer that does not exist
         response = self.client.get(
@@ -185,9 +1202,9 @@ class GetListOfOrdersTest(BaseViewTest):
             )
         )
         # fetch the data from db
-        expected = Orders.objects.filter(restaurant=self.valid_restaurant)
+        expected = Orders.objects.filter(restaurant__name=self.valid_restaurant).order_by("created", "id")
         serialized = OrderSerializer(expected, many=True)
-        self.assertEqual(response.data, serialized.data)
+        self.assertEqual(response.data["results"], serialized.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # test with a restaurant that does not exist
         response = self.client.get(
@@ -204,6 +1221,541 @@ class GetListOfOrdersTest(BaseViewTest):
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+class ExportOrdersTest(BaseViewTest):
+
+    def export(self, export_format, **params):
+        response = self.client.get(
+            reverse("orders-export", kwargs={"export_format": export_format}), params
+        )
+        if response.status_code == status.HTTP_200_OK:
+            response.body = b"".join(response.streaming_content).decode()
+        return response
+
+    def test_export_ndjson(self):
+        """
+        Test that GET orders/export/ndjson/ streams one serialized order per line
+        """
+        response = self.export("ndjson")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in response.body.splitlines()]
+        expected = OrderSerializer(Orders.objects.order_by("created", "id"), many=True)
+        self.assertEqual(rows, json.loads(json.dumps(expected.data)))
+
+    def test_export_csv(self):
+        """
+        Test that GET orders/export/csv/ streams a header and one row per order
+        """
+        response = self.export("csv", restaurant=self.valid_restaurant, customer=self.valid_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(StringIO(response.body)))
+        expected = OrderSerializer(Orders.objects.order_by("created", "id"), many=True)
+        self.assertEqual(
+            rows,
+            [{key: str(value) for key, value in order.items()} for order in expected.data]
+        )
+
+    def test_export_filters(self):
+        """
+        Test that export filters by created range and rejects unknown formats and filters
+        """
+        first, second = Orders.objects.order_by("created", "id")
+        response = self.export("ndjson", created_after=second.created.isoformat())
+        self.assertEqual([json.loads(line)["id"] for line in response.body.splitlines()], [second.id])
+        response = self.export("ndjson", created_before=second.created.isoformat())
+        self.assertEqual([json.loads(line)["id"] for line in response.body.splitlines()], [first.id])
+
+        self.assertEqual(self.export("xml").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.export("csv", restaurant=self.invalid_restaurant).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.export("csv", customer=self.invalid_id).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.export("csv", created_after="yesterday").status_code, status.HTTP_400_BAD_REQUEST)
+
+class ImportOrdersTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, body):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+        return path
+
+    def rows(self):
+        return list(
+            Orders.objects.order_by("created", "id").values_list(
+                "created", "user", "restaurant", "item", "quantity", "comments", "total_price"
+            )
+        )
+
+    def test_import_exports(self):
+        """
+        Test that exported orders import back with their created times, prices and rollups
+        """
+        Orders.objects.filter(quantity=3).update(comments="extra caf\u00e9, \"hot\"")
+        Orders.objects.filter(quantity=6).update(created=timezone.now() - timedelta(days=400))
+        call_command("rebuild_rollups", stdout=StringIO())
+        expected = self.rows()
+        for export_format in ["csv", "ndjson"]:
+            response = self.client.get(reverse("orders-export", kwargs={"export_format": export_format}))
+            path = self.write(f"orders.{export_format}", b"".join(response.streaming_content).decode())
+            Orders.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                call_command("import_orders", path, "--local-cache", "--batch-size", "1", stdout=StringIO())
+            self.assertEqual(self.rows(), expected)
+            self.assertEqual(len([query for query in queries if "orders_menuitems" in query["sql"]]), 1)
+            self.assertTrue(OrderImports.objects.get(source=path).completed)
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_requires_shared_cache(self):
+        """
+        Test that an import refuses to bump list versions in a cache running servers do not see
+        """
+        path = self.write("orders.csv", "created,user,restaurant,quantity,item\n")
+        with self.assertRaisesMessage(CommandError, "The default cache is local to this process"):
+            call_command("import_orders", path, stdout=StringIO())
+        shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                              "LOCATION": os.path.join(self.directory.name, "cache")}}
+        with override_settings(CACHES=shared):
+            call_command("import_orders", path, stdout=StringIO())
+
+    def test_resume_after_invalid_row(self):
+        """
+        Test that an import stops at the first invalid row, keeping earlier batches, and resumes after them once
+        """
+        Orders.objects.all().delete()
+        lines = [
+            json.dumps({"created": f"2019-10-0{day}T12:00:00Z", "user": self.user.pk, "restaurant": "Burger",
+                        "quantity": day, "item": "beef"})
+            for day in range(1, 6)
+        ]
+        path = self.write("orders.jsonl", "\n".join(lines[:3] + ["{\"restaurant\": \"Burger\""] + lines[4:]))
+        with self.assertRaisesMessage(CommandError, "Row 4:"):
+            call_command("import_orders", path, "--local-cache", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(list(Orders.objects.order_by("quantity").values_list("quantity", flat=True)), [1, 2])
+        self.assertEqual(OrderImports.objects.get(source=path).rows, 2)
+
+        for bad, message in [
+            ({"item": "sushi"}, "item sushi does not exist"),
+            ({"user": 10 ** 6}, f"user {10 ** 6} does not exist"),
+            ({"user": 3.7}, "user 3.7 is not a whole number"),
+            ({"user": "alice"}, "user alice is not a whole number"),
+            ({"created": "yesterday"}, "yesterday is not a valid ISO 8601 date or datetime"),
+            ({"quantity": None}, "quantity missing"),
+            ({"quantity": 3.5}, "quantity 3.5 is not a whole number"),
+            ({"quantity": "3.5"}, "quantity 3.5 is not a whole number"),
+            ({"quantity": True}, "quantity True is not a whole number"),
+        ]:
+            row = dict(json.loads(lines[3]), **bad)
+            self.write("orders.jsonl", "\n".join(lines[:3] + [json.dumps(row)] + lines[4:]))
+            with self.assertRaisesMessage(CommandError, f"Row 4: {message}"):
+                call_command("import_orders", path, "--local-cache", "--batch-size", "2", stdout=StringIO())
+
+        self.write("orders.jsonl", "\n".join(lines))
+        out = StringIO()
+        call_command("import_orders", path, "--local-cache", "--batch-size", "2", stdout=out)
+        self.assertIn("Resuming after 2 rows", out.getvalue())
+        self.assertIn("Imported 3 orders", out.getvalue())
+        orders = Orders.objects.order_by("quantity")
+        self.assertEqual([order.quantity for order in orders], [1, 2, 3, 4, 5])
+        self.assertEqual([order.created.day for order in orders], [1, 2, 3, 4, 5])
+        self.assertEqual([order.total_price for order in orders], [Decimal(2 * n) for n in range(1, 6)])
+        self.assertEqual(OrderImports.objects.get(source=path).rows, 5)
+
+        with self.assertRaisesMessage(CommandError, f"{path} was imported completely on"):
+            call_command("import_orders", path, "--local-cache", stdout=StringIO())
+        self.assertEqual(Orders.objects.count(), 5)
+
+    def test_progress_commits_with_batch(self):
+        """
+        Test that a batch and the progress recorded for it commit together, so a resumed import has no duplicates
+        """
+        Orders.objects.all().delete()
+        lines = [
+            json.dumps({"created": f"2019-10-0{day}T12:00:00Z", "user": self.user.pk, "restaurant": "Burger",
+                        "quantity": day, "item": "beef"})
+            for day in range(1, 6)
+        ]
+        path = self.write("orders.ndjson", "\n".join(lines))
+        record = OrderImports.objects.update_or_create
+        calls = []
+
+        def crash_on_second_batch(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise OSError("crashed")
+            return record(**kwargs)
+
+        with mock.patch.object(OrderImports.objects, "update_or_create", side_effect=crash_on_second_batch):
+            with self.assertRaises(OSError):
+                call_command("import_orders", path, "--local-cache", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(Orders.objects.count(), 2)
+        self.assertEqual(OrderImports.objects.get(source=path).rows, 2)
+
+        call_command("import_orders", path, "--local-cache", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(sorted(Orders.objects.values_list("quantity", flat=True)), [1, 2, 3, 4, 5])
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+        self.write("orders.ndjson", "\n".join(lines[:1]))
+        call_command("import_orders", path, "--local-cache", "--restart", stdout=StringIO())
+        self.assertEqual(Orders.objects.filter(quantity=1).count(), 2)
+
+class ArchiveOrdersTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        item = MenuItems.objects.get(name="beef")
+        for quantity in range(1, 5):
+            self.create_order(restaurant, quantity, item)
+        # the first four orders are a year old, in creation order
+        old = timezone.now() - timedelta(days=400)
+        for minutes, pk in enumerate(Orders.objects.order_by("created", "id").values_list("id", flat=True)[:4]):
+            Orders.objects.filter(pk=pk).update(created=old + timedelta(minutes=minutes))
+        call_command("rebuild_rollups", stdout=StringIO())
+
+    def archive(self):
+        call_command("archive_orders", "--batch-size", "3", stdout=StringIO())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(order["id"] for order in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_archive_moves_old_orders(self):
+        """
+        Test that archive_orders moves orders older than the cutoff and the rollups still count them
+        """
+        cost = self.client.get(reverse("cost-single", kwargs={"restaurant": self.valid_restaurant})).data
+        self.archive()
+        self.assertEqual(Orders.objects.count(), 2)
+        self.assertEqual(OrdersArchive.objects.count(), 4)
+        self.assertLess(OrdersArchive.objects.latest("created").created, Orders.objects.earliest("created").created)
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+        response = self.client.get(reverse("cost-single", kwargs={"restaurant": self.valid_restaurant}))
+        self.assertEqual(response.data, cost)
+
+        with self.assertRaises(CommandError):
+            call_command("archive_orders", "--before", "last year", stdout=StringIO())
+
+    def test_reads_include_archived_orders(self):
+        """
+        Test that lists, pages, exports and retrieve return archived orders as before they were moved
+        """
+        urls = [
+            reverse("orders-all"),
+            reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant}),
+            reverse("orders-customer", kwargs={"customer": self.valid_id}),
+            reverse("orders-single", kwargs={"pk": 1}),
+        ]
+        export_url = reverse("orders-export", kwargs={"export_format": "ndjson"})
+        before = [self.client.get(url).data for url in urls]
+        before_export = b"".join(self.client.get(export_url).streaming_content)
+        expected = list(Orders.objects.order_by("created", "id").values_list("id", flat=True))
+
+        self.archive()
+        self.assertEqual([self.client.get(url).data for url in urls], before)
+        self.assertEqual(b"".join(self.client.get(export_url).streaming_content), before_export)
+        self.assertEqual(self.walk(reverse("orders-all") + "?page_size=3"), expected)
+        self.assertEqual(self.client.get(reverse("orders-single", kwargs={"pk": 1000})).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recent_range_skips_archive(self):
+        """
+        Test that a created range after the newest archived order does not query the archive
+        """
+        self.archive()
+        after = (timezone.now() - timedelta(days=1)).isoformat()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("orders-all"), {"created_after": after})
+        self.assertEqual(len(response.data["results"]), 2)
+        # only the newest archived time is read
+        table = OrdersArchive._meta.db_table
+        self.assertEqual(len([query for query in queries.captured_queries if table in query["sql"]]), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("orders-all"))
+        self.assertEqual(len(response.data["results"]), 6)
+        self.assertTrue(any(table in query["sql"] for query in queries.captured_queries))
+
+    def test_archive_from_another_process(self):
+        """
+        Test that orders archived after a server read the archive boundary are still returned
+        """
+        self.assertEqual(len(self.client.get(reverse("orders-all")).data["results"]), 6)
+        order = Orders.objects.order_by("created", "id").first()
+        # as archive_orders does from its own process
+        OrdersArchive.objects.create(**{column: getattr(order, column) for column in COLUMNS})
+        Orders.objects.filter(pk=order.pk)._raw_delete(connection.alias)
+        self.assertEqual(len(self.client.get(reverse("orders-all")).data["results"]), 6)
+        response = self.client.get(reverse("orders-single", kwargs={"pk": order.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_range_filters(self):
+        """
+        Test that restaurant and customer lists filter by created_after and created_before
+        """
+        self.archive()
+        boundary = (timezone.now() - timedelta(days=1)).isoformat()
+        for url in [
+            reverse("orders-restaurant", kwargs={"restaurant": self.valid_restaurant}),
+            reverse("orders-customer", kwargs={"customer": self.valid_id}),
+        ]:
+            recent = self.client.get(url, {"created_after": boundary}).data["results"]
+            old = self.client.get(url, {"created_before": boundary}).data["results"]
+            self.assertEqual(len(recent), 2)
+            self.assertEqual(len(old), 4)
+            self.assertEqual(self.client.get(url, {"created_before": "soon"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_archived_order(self):
+        """
+        Test that deleting archived orders updates the rollups
+        """
+        self.archive()
+        Restaurants.objects.get(name=self.valid_restaurant).delete()
+        self.assertFalse(OrdersArchive.objects.exists())
+        self.assertFalse(RestaurantRevenues.objects.exists())
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+class AdminTest(BaseViewTest):
+
+    def test_changelist_queries_do_not_grow_with_page(self):
+        """
+        Test that the order changelist loads related rows with the page and counts no more than a bound
+        """
+        url = reverse("admin:orders_orders_changelist")
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        item = MenuItems.objects.get(name="beef")
+        for quantity in range(20):
+            self.create_order(restaurant, quantity + 1, item)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(many), len(few))
+        self.assertContains(response, "Burger: beef - 2.00")
+        counts = [query["sql"] for query in many.captured_queries if "COUNT(" in query["sql"]]
+        self.assertTrue(counts and all("LIMIT" in sql for sql in counts))
+        # no list of the distinct dates in the table
+        self.assertFalse([query for query in many.captured_queries if "DISTINCT" in query["sql"]])
+
+        today = timezone.localdate()
+        response = self.client.get(url, {
+            "restaurant__id__exact": restaurant.pk,
+            "created__gte": today.isoformat(),
+            "created__lt": (today + timedelta(days=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context["cl"].result_count, 22)
+
+    def test_estimated_count(self):
+        """
+        Test that counts above max_count are estimated from the id range, or capped when filtered
+        """
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        item = MenuItems.objects.get(name="beef")
+        for quantity in range(8):
+            self.create_order(restaurant, quantity + 1, item)
+        Orders.objects.filter(pk=Orders.objects.order_by("pk")[3].pk).delete()
+        orders = Orders.objects.order_by("-created")
+        paginator = EstimatedCountPaginator(orders, 2)
+        paginator.max_count = 5
+        self.assertEqual(paginator.count, 10)
+        paginator = EstimatedCountPaginator(orders.filter(quantity__gt=1), 2)
+        paginator.max_count = 5
+        self.assertEqual(paginator.count, 5)
+        paginator = EstimatedCountPaginator(orders.filter(quantity__gt=7), 2)
+        paginator.max_count = 5
+        self.assertEqual(paginator.count, 1)
+
+    def test_change_form_widgets(self):
+        """
+        Test that order forms do not list every user or menu item, and archived orders are read only
+        """
+        MenuItems.objects.create(restaurant=Restaurants.objects.get(name=self.valid_restaurant), name="fries", price=1)
+        order = Orders.objects.first()
+        response = self.client.get(reverse("admin:orders_orders_change", args=[order.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "admin-autocomplete")
+        self.assertContains(response, "vForeignKeyRawIdAdminField")
+        self.assertNotContains(response, "fries")
+
+        call_command("archive_orders", "--before", (timezone.now() + timedelta(days=1)).isoformat(), stdout=StringIO())
+        response = self.client.get(reverse("admin:orders_ordersarchive_changelist"))
+        self.assertContains(response, f">{order.pk}<")
+        response = self.client.get(reverse("admin:orders_ordersarchive_change", args=[order.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotContains(response, 'name="_save"')
+        self.assertEqual(
+            self.client.get(reverse("admin:orders_ordersarchive_add")).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+class ShardingTest(OrdersFixtureMixin, APITransactionTestCase):
+    # shards are queried from pool threads, so data must be committed
+    shards = ["shard1", "shard2"]
+    databases = {"default", *shards}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sharded = override_settings(ORDER_SHARDS=cls.shards)
+        cls.sharded.enable()
+        for alias in cls.shards:
+            connections.databases[alias] = {
+                "ENGINE": "orders.backends.shard", "NAME": f"file:{alias}?mode=memory&cache=shared"
+            }
+            call_command("migrate", database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.shards:
+            connections[alias].close()
+            delattr(connections._connections, alias)
+            del connections.databases[alias]
+        cls.sharded.disable()
+
+    def setUp(self):
+        super().setUp()
+        # consecutive restaurant ids are on different shards
+        self.burger = Restaurants.objects.get(name="Burger")
+        self.sushi = restaurant = Restaurants.objects.create(name="Sushi")
+        item = MenuItems.objects.create(restaurant=restaurant, name="nigiri", price=3)
+        self.create_order(restaurant, 2, item)
+        self.create_order(restaurant, 4, item)
+        self.client.post(
+            reverse("orders-all"),
+            data=json.dumps([
+                {"restaurant": "Burger", "quantity": 1, "item": "beef"},
+                {"restaurant": "Sushi", "quantity": 5, "item": "nigiri"},
+            ]),
+            content_type="application/json"
+        )
+
+    def all_orders(self):
+        orders = [order for alias in self.shards for order in Orders.objects.using(alias)]
+        return sorted(orders, key=lambda order: (order.created, order.id))
+
+    def test_orders_are_stored_on_their_restaurants_shard(self):
+        """
+        Test that each restaurant's orders and rollups are on one shard, with ids from that shard's range
+        """
+        burger, sushi = shard_for(self.burger.pk), shard_for(self.sushi.pk)
+        self.assertEqual({burger, sushi}, set(self.shards))
+        self.assertFalse(Orders.objects.using("default").exists())
+        for alias, restaurant in [(sushi, self.sushi), (burger, self.burger)]:
+            orders = Orders.objects.using(alias)
+            self.assertEqual(set(orders.values_list("restaurant", flat=True)), {restaurant.pk})
+            self.assertTrue(all(shard_for_id(order.pk) == alias for order in orders))
+            self.assertEqual(
+                RestaurantRevenues.objects.using(alias).get(restaurant=restaurant).order_count, orders.count()
+            )
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+        order = Orders.objects.using(sushi).first()
+        order.restaurant = Restaurants.objects.get(name="Burger")
+        order.item = MenuItems.objects.get(name="beef")
+        with self.assertRaises(ValueError):
+            order.save()
+
+    def test_global_lists_merge_shards(self):
+        """
+        Test that the all orders and customer lists merge every shard's orders in created order
+        """
+        expected = [order.id for order in self.all_orders()]
+        self.assertEqual(len(expected), 6)
+        for url in [reverse("orders-all"), reverse("orders-customer", kwargs={"customer": self.user.pk})]:
+            ids = []
+            url += "?page_size=4"
+            while url:
+                response = self.client.get(url)
+                ids.extend(order["id"] for order in response.data["results"])
+                url = response.data["next"]
+            self.assertEqual(ids, expected)
+
+        response = self.client.get(reverse("orders-export", kwargs={"export_format": "ndjson"}))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], expected)
+
+        for order in self.all_orders():
+            response = self.client.get(reverse("orders-single", kwargs={"pk": order.id}))
+            self.assertEqual(response.data["restaurant"], order.restaurant.name)
+        self.assertEqual(self.client.get(reverse("orders-single", kwargs={"pk": 1})).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_restaurant_views_read_one_shard(self):
+        """
+        Test that restaurant scoped views only query the restaurant's shard
+        """
+        urls = [
+            reverse("orders-restaurant", kwargs={"restaurant": "Sushi"}),
+            reverse("cost-single", kwargs={"restaurant": "Sushi"}),
+            reverse("average-quantity", kwargs={"restaurant": "Sushi", "customer": self.user.pk}),
+            reverse("top-items", kwargs={"restaurant": "Sushi"}),
+        ]
+        sushi, = [alias for alias in self.shards if alias == shard_for(self.sushi.pk)]
+        burger, = [alias for alias in self.shards if alias != sushi]
+        with CaptureQueriesContext(connections[sushi]) as used, \
+                CaptureQueriesContext(connections[burger]) as unused:
+            responses = [self.client.get(url) for url in urls]
+        self.assertTrue(used.captured_queries)
+        self.assertFalse(unused.captured_queries)
+
+        self.assertEqual([order["quantity"] for order in responses[0].data["results"]], [2, 4, 5])
+        self.assertEqual(responses[1].data["cost"], Decimal("33.00"))
+        self.assertAlmostEqual(responses[2].data["average"], 11 / 3)
+        self.assertEqual(responses[3].data["results"][0]["quantity"], 11)
+        response = self.client.get(reverse("cost-single", kwargs={"restaurant": self.invalid_restaurant}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_admin_shows_one_shard(self):
+        """
+        Test that the order admin lists the shard picked by its filter and opens orders on any shard
+        """
+        url = reverse("admin:orders_orders_changelist")
+        for alias in self.shards:
+            response = self.client.get(url, {"shard": alias})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids = {order.pk for order in response.context["cl"].result_list}
+            self.assertEqual(ids, set(Orders.objects.using(alias).values_list("pk", flat=True)))
+        response = self.client.get(url)
+        self.assertEqual(response.context["cl"].result_list[0]._state.db, self.shards[0])
+
+        for alias in self.shards:
+            order = Orders.objects.using(alias).first()
+            response = self.client.get(reverse("admin:orders_orders_change", args=[order.pk]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.context["original"].restaurant, order.restaurant)
+
+        response = self.client.post(reverse("admin:orders_orders_add"), {
+            "restaurant": self.sushi.pk,
+            "item": MenuItems.objects.get(name="nigiri").pk,
+            "quantity": 3,
+            "user": self.user.pk,
+            "comments": "",
+        })
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        order = Orders.objects.using(shard_for(self.sushi.pk)).get(quantity=3)
+
+        response = self.client.post(reverse("admin:orders_orders_change", args=[order.pk]), {
+            "restaurant": self.sushi.pk,
+            "item": order.item_id,
+            "quantity": 7,
+            "user": self.user.pk,
+            "comments": "",
+        })
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        order.refresh_from_db()
+        self.assertEqual(order.quantity, 7)
+
 class GetCostTest(BaseViewTest):
     def test_get_cost_by_restaurant_id(self):
         """
@@ -219,7 +1771,7 @@ class GetCostTest(BaseViewTest):
             )
         )
         # fetch the data from db
-        expected = Orders.objects.filter(restaurant=self.valid_restaurant).aggregate(Sum('total_price')).get("total_price__sum")
+        expected = Orders.objects.filter(restaurant__name=self.valid_restaurant).aggregate(Sum('total_price')).get("total_price__sum")
         self.assertEqual(response.data.get('cost',''), expected)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # test with a restaurant that does not exist
@@ -237,6 +1789,82 @@ class GetCostTest(BaseViewTest):
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+class RevenueRollupTest(BaseViewTest):
+
+    def get_cost(self):
+        response = self.client.get(
+            reverse("cost-single", kwargs={"restaurant": self.valid_restaurant})
+        )
+        return response.data["cost"]
+
+    def expected_cost(self):
+        return Orders.objects.filter(restaurant__name=self.valid_restaurant).aggregate(Sum('total_price')).get("total_price__sum")
+
+    def test_rollup_follows_order_writes(self):
+        """
+        Test that the cost endpoint tracks order inserts, updates and deletes
+        """
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        other = Restaurants.objects.create(name="Pizza")
+        MenuItems.objects.create(restaurant=other, name="margherita", price=8)
+
+        order = Orders.objects.get(pk=1)
+        order.quantity = 10
+        order.save()
+        self.assertEqual(self.get_cost(), self.expected_cost())
+
+        order.restaurant = other
+        order.item = MenuItems.objects.get(name="margherita")
+        order.save()
+        self.assertEqual(self.get_cost(), self.expected_cost())
+        self.assertEqual(RestaurantRevenues.objects.get(restaurant=other).revenue, Decimal("80.00"))
+
+        Orders.objects.filter(restaurant=restaurant).delete()
+        self.assertIsNone(self.get_cost())
+
+        self.client.post(
+            reverse("orders-all"),
+            data=json.dumps([{"restaurant": "Burger", "quantity": 3, "item": "beef"}] * 3),
+            content_type="application/json"
+        )
+        self.assertEqual(self.get_cost(), Decimal("18.00"))
+        self.assertEqual(RestaurantRevenues.objects.get(restaurant=restaurant).order_count, 3)
+
+    def test_bulk_rollup_updates(self):
+        """
+        Test that a batch adding to many rollup rows, new and existing, updates them in bulk
+        """
+        item = MenuItems.objects.get(name="beef")
+        now = timezone.now()
+        orders = [
+            Orders(created=now - timedelta(hours=hours), user=self.user, restaurant=item.restaurant, item=item,
+                   quantity=hours % 7)
+            for hours in range(0, 240, 3)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            Orders.objects.bulk_create_priced(orders, keep_created=True)
+        self.assertLess(len([query for query in queries if "orders_revenuebuckets" in query["sql"]]), 10)
+        self.assertEqual(self.get_cost(), self.expected_cost())
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_delete_restaurant(self):
+        """
+        Test that deleting a restaurant removes its orders and rollup cleanly
+        """
+        Restaurants.objects.get(name=self.valid_restaurant).delete()
+        self.assertFalse(RestaurantRevenues.objects.exists())
+
+    def test_rebuild_rollups(self):
+        """
+        Test that rebuild_rollups restores a drifted rollup and check reports drift
+        """
+        RestaurantRevenues.objects.update(revenue=0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rollups", "--check", stdout=StringIO(), stderr=StringIO())
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(self.get_cost(), self.expected_cost())
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
 class GetAveQuantityTest(BaseViewTest):
     def test_get_average_quantity_by_restaurant_id(self):
         """
@@ -253,7 +1881,7 @@ class GetAveQuantityTest(BaseViewTest):
             )
         )
         # fetch the data from db
-        expected = Orders.objects.filter(restaurant=self.valid_restaurant).aggregate(Avg('quantity')).get("quantity__avg")
+        expected = Orders.objects.filter(restaurant__name=self.valid_restaurant).aggregate(Avg('quantity')).get("quantity__avg")
         self.assertEqual(response.data.get('average',''), expected)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # test with a restaurant that does not exist
@@ -286,3 +1914,216 @@ class GetAveQuantityTest(BaseViewTest):
             f"Customer with id: {self.invalid_id} does not exist"
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class QuantityStatsTest(BaseViewTest):
+
+    def get_stats(self, restaurant=None, customer=None):
+        return self.client.get(
+            reverse(
+                "quantity-stats",
+                kwargs={
+                    "restaurant": restaurant or self.valid_restaurant,
+                    "customer": customer or self.valid_id
+                }
+            )
+        )
+
+    def test_get_quantity_stats(self):
+        """
+        Test that GET orders/stats/quantity/<str:restaurant>/<int:customer> returns the pair's statistics
+        """
+        response = self.get_stats()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {"order_count": 2, "total": 9, "average": 4.5, "min": 3, "max": 6}
+        )
+        response = self.get_stats(restaurant=self.invalid_restaurant)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.get_stats(customer=self.invalid_id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_follow_order_writes(self):
+        """
+        Test that min, max and average are kept in step when orders change or go away
+        """
+        largest = Orders.objects.get(quantity=6)
+        largest.quantity = 1
+        largest.save()
+        self.assertEqual(self.get_stats().data["min"], 1)
+        self.assertEqual(self.get_stats().data["max"], 3)
+
+        Orders.objects.all().delete()
+        self.assertEqual(
+            self.get_stats().data,
+            {"order_count": 0, "total": 0, "average": None, "min": None, "max": None}
+        )
+
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        self.create_order(restaurant, 7, MenuItems.objects.get(name="beef"))
+        self.assertEqual(
+            self.get_stats().data,
+            {"order_count": 1, "total": 7, "average": 7.0, "min": 7, "max": 7}
+        )
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_average_is_one_query(self):
+        """
+        Test that the average endpoint reads a single stats row
+        """
+        url = reverse(
+            "average-quantity",
+            kwargs={"restaurant": self.valid_restaurant, "customer": self.valid_id}
+        )
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        order_queries = [query["sql"] for query in queries.captured_queries if "orders_" in query["sql"]]
+        self.assertEqual(len(order_queries), 1)
+        self.assertIn("orders_quantitystats", order_queries[0])
+
+class RevenueBucketsTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        # move the fixture orders to fixed times and rebuild the rollups from them
+        times = [
+            datetime(2019, 10, 1, 9, 15, tzinfo=timezone.utc),
+            datetime(2019, 10, 1, 9, 45, tzinfo=timezone.utc),
+            datetime(2019, 10, 2, 12, 0, tzinfo=timezone.utc),
+            datetime(2019, 11, 5, 8, 30, tzinfo=timezone.utc),
+        ]
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        self.create_order(restaurant, 1, MenuItems.objects.get(name="beef"))
+        self.create_order(restaurant, 2, MenuItems.objects.get(name="chicken"))
+        for order, created in zip(Orders.objects.order_by("id"), times):
+            Orders.objects.filter(pk=order.pk).update(created=created)
+        call_command("rebuild_rollups", stdout=StringIO())
+
+    def get_revenue(self, restaurant=None, **params):
+        return self.client.get(
+            reverse("revenue-buckets", kwargs={"restaurant": restaurant or self.valid_restaurant}),
+            params
+        )
+
+    def test_get_revenue_buckets(self):
+        """
+        Test that GET orders/revenue/<str:restaurant>/ returns revenue per bucket in order
+        """
+        response = self.get_revenue()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["bucket"], "day")
+        self.assertEqual(
+            [(bucket["bucket_start"], bucket["revenue"], bucket["quantity"], bucket["order_count"])
+             for bucket in response.data["results"]],
+            [
+                ("2019-10-01T00:00:00Z", "15.00", 9, 2),
+                ("2019-10-02T00:00:00Z", "2.00", 1, 1),
+                ("2019-11-05T00:00:00Z", "3.00", 2, 1),
+            ]
+        )
+        months = self.get_revenue(bucket="month").data["results"]
+        self.assertEqual([bucket["revenue"] for bucket in months], ["17.00", "3.00"])
+        hours = self.get_revenue(bucket="hour", created_after="2019-10-01T09:30:00", created_before="2019-10-03").data["results"]
+        self.assertEqual(
+            [bucket["bucket_start"] for bucket in hours],
+            ["2019-10-01T09:00:00Z", "2019-10-02T12:00:00Z"]
+        )
+
+    def test_invalid_parameters(self):
+        """
+        Test that an unknown bucket or restaurant is rejected
+        """
+        self.assertEqual(self.get_revenue(bucket="week").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_revenue(created_after="soon").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get_revenue(restaurant=self.invalid_restaurant)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_buckets_follow_order_writes(self):
+        """
+        Test that the current buckets are kept in step when orders are created and deleted
+        """
+        today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.client.post(reverse("orders-all"), {"restaurant": self.valid_restaurant, "quantity": 4, "item": "beef"})
+        hours = self.get_revenue(bucket="hour", created_after=today.isoformat()).data["results"]
+        self.assertEqual([(bucket["revenue"], bucket["quantity"]) for bucket in hours], [("8.00", 4)])
+
+        Orders.objects.filter(created__gte=today).delete()
+        self.assertEqual(self.get_revenue(created_after=today.isoformat()).data["results"], [])
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+    def test_read_does_not_scan_orders(self):
+        """
+        Test that revenue is read from the rollup without querying orders
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.get_revenue(bucket="month")
+        self.assertFalse([query for query in queries.captured_queries if "orders_orders" in query["sql"]])
+
+class TopItemsTest(BaseViewTest):
+
+    def setUp(self):
+        super().setUp()
+        restaurant = Restaurants.objects.get(name=self.valid_restaurant)
+        fries = MenuItems.objects.create(restaurant=restaurant, name="fries", price=1)
+        self.create_order(restaurant, 2, MenuItems.objects.get(name="beef"))
+        self.create_order(restaurant, 10, fries)
+
+    def get_top_items(self, restaurant=None, **params):
+        return self.client.get(
+            reverse("top-items", kwargs={"restaurant": restaurant or self.valid_restaurant}),
+            params
+        )
+
+    def test_get_top_items(self):
+        """
+        Test that GET orders/top-items/<str:restaurant>/ ranks items by quantity or revenue
+        """
+        response = self.get_top_items()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["item"], item["quantity"], item["revenue"], item["order_count"]) for item in response.data["results"]],
+            [("fries", 10, "10.00", 1), ("chicken", 6, "9.00", 1), ("beef", 5, "10.00", 2)]
+        )
+        response = self.get_top_items(rank_by="revenue", limit=2)
+        self.assertEqual([item["item"] for item in response.data["results"]], ["beef", "fries"])
+
+    def test_top_items_in_window(self):
+        """
+        Test that a created range ranks items by the days it covers only
+        """
+        yesterday = timezone.now() - timedelta(days=1)
+        Orders.objects.filter(item__name="fries").update(created=yesterday)
+        call_command("rebuild_rollups", stdout=StringIO())
+        today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        response = self.get_top_items(created_after=today.isoformat())
+        self.assertEqual([item["item"] for item in response.data["results"]], ["chicken", "beef"])
+        response = self.get_top_items(created_before=today.isoformat())
+        self.assertEqual([item["item"] for item in response.data["results"]], ["fries"])
+
+    def test_invalid_parameters(self):
+        """
+        Test that an unknown ranking, a bad limit or an unknown restaurant is rejected
+        """
+        self.assertEqual(self.get_top_items(rank_by="price").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_top_items(limit=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_top_items(limit="ten").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get_top_items(restaurant=self.invalid_restaurant)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class TopItemsCacheTest(OrdersFixtureMixin, APITransactionTestCase):
+    # the cache is invalidated by version bumps, which run on commit
+
+    def test_cached_until_orders_change(self):
+        """
+        Test that top items are served from the cache until an order of the restaurant is written
+        """
+        url = reverse("top-items", kwargs={"restaurant": self.valid_restaurant})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([query for query in queries.captured_queries if "orders_itemsales" in query["sql"]])
+
+        self.client.post(reverse("orders-all"), {"restaurant": self.valid_restaurant, "quantity": 9, "item": "beef"})
+        response = self.client.get(url)
+        self.assertEqual(response.data["results"][0], {"item": "beef", "quantity": 12, "revenue": "24.00", "order_count": 2})
@@ -0,0 +1,189 @@
+"""
+Token bucket throttles for the order endpoints
+
+Every user, or client address for anonymous requests, has one bucket per
+endpoint and scope. A bucket holds up to the scope's number of requests and
+refills at its rate, so clients can burst up to the limit after being idle.
+The rates are the 'reads', 'writes' and 'aggregates' entries of the
+DEFAULT_THROTTLE_RATES setting; a rate of None lifts the limit.
+
+Buckets live in a memory mapped file shared by the worker processes on a
+host (THROTTLING['PATH']), so a check takes a few microseconds and never
+touches the database or the cache. Workers on other hosts keep their own
+buckets, which multiplies the limits by the number of hosts.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import permissions
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where only one process should use the file at a time
+    fcntl = None
+
+# key hash, tokens left, time of the last update
+SLOT = struct.Struct('<Qdd')
+# slots a key may be stored in
+WAYS = 4
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class BucketStore:
+    """
+    Token buckets in a memory mapped file
+
+    The file holds `slots` buckets in sets of WAYS. A key's bucket lives in
+    the set its hash picks, and a new bucket takes the set's slot that was
+    updated longest ago. An evicted bucket starts full when its key returns,
+    so collisions can only loosen a limit. A set is locked with fcntl while it
+    is updated, which only excludes other processes, so a thread lock is held
+    as well.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.sets = max(slots // WAYS, 1)
+        self.size = self.sets * WAYS * SLOT.size
+        self.lock = threading.Lock()
+        self.fd = None
+        self.map = None
+
+    def open(self):
+        # never through a link, and never a file another user could rewrite
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+        if hasattr(os, 'geteuid') and os.fstat(fd).st_uid != os.geteuid():
+            os.close(fd)
+            raise ImproperlyConfigured(f"The throttle bucket file {self.path} belongs to another user")
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self.fd, self.map = fd, mmap.mmap(fd, self.size)
+
+    @contextmanager
+    def locked(self, start=0, length=0):
+        with self.lock:
+            if self.map is None:
+                self.open()
+            if fcntl is not None:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, length, start)
+
+    def take(self, key, capacity, rate, now=None):
+        """
+        Take a token from the bucket for key, which holds up to capacity
+        tokens and gains rate tokens a second
+
+        Return 0 if a token was taken, or else the seconds until one is due.
+        """
+        now = time.time() if now is None else now
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        start = digest % self.sets * WAYS * SLOT.size
+        with self.locked(start, WAYS * SLOT.size):
+            slots = [SLOT.unpack_from(self.map, start + way * SLOT.size) for way in range(WAYS)]
+            way = next((way for way, slot in enumerate(slots) if slot[0] == digest), None)
+            if way is None:
+                way = min(range(WAYS), key=lambda way: slots[way][2])
+                tokens = capacity
+            else:
+                _, tokens, updated = slots[way]
+                tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            SLOT.pack_into(self.map, start + way * SLOT.size, digest, tokens, now)
+        return wait
+
+    def clear(self):
+        with self.locked():
+            self.map[:] = bytes(self.size)
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                os.close(self.fd)
+            self.fd = self.map = None
+
+
+def bucket_store():
+    throttling = getattr(settings, 'THROTTLING', {})
+    if not throttling.get('PATH'):
+        raise ImproperlyConfigured("THROTTLING['PATH'] must name the file token buckets are kept in")
+    return BucketStore(throttling['PATH'], throttling.get('SLOTS', 65536))
+
+
+buckets = bucket_store()
+
+
+@receiver(setting_changed)
+def reload_buckets(setting, **kwargs):
+    global buckets
+    if setting == 'THROTTLING':
+        buckets.close()
+        buckets = bucket_store()
+
+
+def parse_rate(rate):
+    """
+    Return the (requests, seconds) of a rate such as '100/min', or None for None
+    """
+    if rate is None:
+        return None
+    requests, period = rate.split('/')
+    return int(requests), DURATIONS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles each client's requests to an endpoint with a token bucket
+    """
+    scope = None
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = self.get_scope(request, view)
+        rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope))
+        if rate is None:
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"address:{self.get_ident(request)}"
+        requests, seconds = rate
+        self.wait_seconds = buckets.take(f"{scope}:{type(view).__name__}:{ident}", requests, requests / seconds)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ReadWriteThrottle(TokenBucketThrottle):
+    """
+    Counts safe requests against the 'reads' rate and others against 'writes'
+    """
+
+    def get_scope(self, request, view):
+        return 'reads' if request.method in permissions.SAFE_METHODS else 'writes'
+
+
+class AggregateThrottle(TokenBucketThrottle):
+    scope = 'aggregates'
@@ -2,15 +2,21 @@ from django.urls import path
 from rest_framework_jwt.views import obtain_jwt_token
 
 from .views import (AveQuantityRetrieveView, CostRetrieveView,
-                    OrdersCustomerListView, OrdersListCreateView,
-                    OrdersRestaurantListView, OrdersRetrieveView)
+                    OrdersCustomerListView, OrdersExportView,
+                    OrdersListCreateView, OrdersRestaurantListView,
+                    OrdersRetrieveView, QuantityStatsRetrieveView,
+                    RevenueBucketsListView, TopItemsListView)
 
 urlpatterns = [
     path('orders/', OrdersListCreateView.as_view(), name="orders-all"),
     path('orders/<int:pk>/', OrdersRetrieveView.as_view(), name="orders-single"),
     path('orders/restaurant/<str:restaurant>/', OrdersRestaurantListView.as_view(), name="orders-restaurant"),
     path('orders/customer/<int:customer>/', OrdersCustomerListView.as_view(), name="orders-customer"),
+    path('orders/export/<str:export_format>/', OrdersExportView.as_view(), name="orders-export"),
     path('orders/cost/<str:restaurant>', CostRetrieveView.as_view(), name="cost-single"),
+    path('orders/revenue/<str:restaurant>/', RevenueBucketsListView.as_view(), name="revenue-buckets"),
+    path('orders/top-items/<str:restaurant>/', TopItemsListView.as_view(), name="top-items"),
     path('orders/stats/average-quantity/<str:restaurant>/<int:customer>', AveQuantityRetrieveView.as_view(), name="average-quantity"),
+    path('orders/stats/quantity/<str:restaurant>/<int:customer>', QuantityStatsRetrieveView.as_view(), name="quantity-stats"),
     path('auth/token/', obtain_jwt_token, name="generate-token"),
 ]
@@ -0,0 +1,85 @@
+"""
+Version counters for the order lists, used to answer conditional GETs
+
+Every order write bumps the counter of the whole order list and of the
+restaurant and customer the order belongs to, once the write commits. Lists
+also show restaurant and item names, so every restaurant or menu item write
+bumps a menu counter that all list versions include. The counters live in the default cache, which must be shared between processes
+(memcached, redis, ...) when running more than one worker, or when orders are
+written by management commands such as import_orders while servers run.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+PREFIX = 'orders:version'
+MENU_KEY = f"{PREFIX}:menu"
+
+
+def scope_key(kind=None, value=None):
+    if kind is None:
+        return PREFIX
+    digest = hashlib.md5(str(value).encode()).hexdigest()
+    return f"{PREFIX}:{kind}:{digest}"
+
+
+def order_keys(order):
+    return {
+        scope_key(),
+        scope_key('restaurant', order.restaurant_id),
+        scope_key('customer', order.user_id),
+    }
+
+
+def shared_cache():
+    """
+    Return whether the default cache, and so the counters, are seen by other processes
+    """
+    return not isinstance(caches['default'], (DummyCache, LocMemCache))
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # start from the clock, so a counter that was evicted never repeats
+        # a version a client may still hold
+        cache.add(key, int(time.time() * 1e6), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def list_version(key):
+    """
+    Return the version of the list at key, which changes with its orders and with the menu
+    """
+    return f"{get_version(MENU_KEY)}.{get_version(key)}"
+
+
+def bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            get_version(key)
+            cache.incr(key)
+
+
+def bump_on_commit(orders, using=None):
+    """
+    Bump the versions of every list the orders appear in once the transaction commits
+    """
+    keys = set()
+    for order in orders:
+        keys |= order_keys(order)
+    transaction.on_commit(lambda: bump(keys), using=using)
+
+
+def bump_menu_on_commit(using=None):
+    """
+    Bump the version of every list once a restaurant or menu item write commits
+    """
+    transaction.on_commit(lambda: bump([MENU_KEY]), using=using)
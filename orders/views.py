@@ -1,28 +1,234 @@
+import hashlib
+from itertools import chain
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Avg, Sum
+from django.db.models import F, Sum
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import generics, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import status
 
-from .models import MenuItems, Orders, Restaurants
-from .serializers import OrderSerializer
+from .archive import archive_boundary, reaches_archive
+from .exports import FORMATS
+from .filters import created_range, filter_created, requested_fields
+from .ingestion import WriterUnavailable, order_queue
+from .menu import menu_cache
+from .middleware import record
+from .models import (ItemDailySales, ItemSales, MenuItems, Orders,
+                     OrdersArchive, QuantityStats, RestaurantRevenues,
+                     Restaurants, RevenueBuckets)
+from .renderers import ColumnarJSONRenderer
+from .rollups import bucket_start
+from .routers import pin_to_primary, pinned_to_primary, read_from_replicas
+from .sharding import evaluate, order_databases, shard_for, shard_for_id
+from .serializers import (OrderSerializer, RevenueBucketSerializer,
+                          TopItemSerializer, order_rows)
+from .throttling import AggregateThrottle
+from .versions import list_version, scope_key
+
+# order lists can also be rendered with one array per field
+LIST_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+
+
+def order_encoder(params):
+    """
+    Return the order row encoder for the fields query parameter, see OrderRowEncoder.only
+    """
+    fields = requested_fields(params)
+    if fields is None:
+        return order_rows
+    try:
+        return order_rows.only(fields)
+    except ValueError as error:
+        raise ValidationError({"fields": str(error)})
+
+
+class ReplicaReadsMixin:
+    """
+    Serves GET requests from a read replica, unless the user wrote recently
+
+    A successful write pins the user's reads to the primary for a while, so
+    they always see their own writes. See orders.routers.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_from_replicas(False)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        read_from_replicas(request.method in permissions.SAFE_METHODS and not pinned_to_primary(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS and status.is_success(response.status_code):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ConditionalListMixin:
+    """
+    Tags list responses with an ETag derived from the list's version counter,
+    and answers a matching If-None-Match with 304 without running the list
+    query or the serializer
+    """
 
+    def get_version_key(self):
+        return scope_key()
+
+    def get_etag(self, request):
+        version = list_version(self.get_version_key())
+        tag = f"{version}|{request.build_absolute_uri()}|{request.accepted_media_type}"
+        return quote_etag(hashlib.sha1(tag.encode()).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        # read the version before the list, so a concurrent write can only
+        # make the tag older than the data
+        etag = self.get_etag(request)
+        # compression weakens the tag, and If-None-Match compares weakly
+        tags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if etag in tags or f"W/{etag}" in tags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        return response
+
+class OrderRowsMixin:
+    """
+    Answers list and retrieve requests from values_list() rows formatted by
+    the order row encoder instead of serializing Orders instances
+
+    Lists can be narrowed with created_after and created_before, and archived
+    orders are read as well whenever that range reaches into the archive.
+    When orders are sharded, lists read every shard the view's orders may be
+    on in parallel, and retrieve reads the shard the order id belongs to.
+
+    ?fields= limits both the columns read and the fields returned, and lists
+    rendered as columnar JSON return one array per field.
+    """
+
+    def filter_orders(self, queryset):
+        """
+        Narrow a queryset of live or archived orders to the ones this view lists
+        """
+        return queryset
+
+    def get_databases(self):
+        """
+        Return the databases holding this view's orders, see orders.sharding
+        """
+        return order_databases()
+
+    def get_queryset(self):
+        return self.filter_orders(super().get_queryset())
+
+    def get_encoder(self):
+        return order_encoder(self.request.query_params)
+
+    def encode(self, rows):
+        encoder = self.get_encoder()
+        if getattr(self.request.accepted_renderer, "columnar", False):
+            return encoder.encode_columns(rows)
+        return encoder.encode(rows)
+
+    def get_querysets(self):
+        params = self.request.query_params
+        after, _ = created_range(params)
+        querysets = []
+        for database in self.get_databases():
+            querysets.append(self.filter_queryset(self.get_queryset()).using(database))
+            if reaches_archive(after, database):
+                # live orders are read first, see orders.archive
+                querysets.append(self.filter_orders(OrdersArchive.objects.using(database)))
+        return [
+            filter_created(queryset, params).values_list(*self.get_encoder().columns, named=True)
+            for queryset in querysets
+        ]
+
+    def list(self, request, *args, **kwargs):
+        querysets = self.get_querysets()
+        page = self.paginate_queryset(querysets if len(querysets) > 1 else querysets[0])
+        if page is None:
+            rows = sorted(chain.from_iterable(evaluate(querysets, list)), key=lambda row: (row.created, row.id))
+            with record("serializer"):
+                return Response(self.encode(rows))
+        with record("serializer"):
+            data = self.encode(page)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            database = shard_for_id(self.kwargs[lookup_url_kwarg])
+        except LookupError:
+            raise Http404
+        encoder = self.get_encoder()
+        row = self.filter_queryset(self.get_queryset()).using(database).filter(**lookup).values_list(
+            *encoder.columns
+        ).first()
+        if row is None and archive_boundary(database) is not None:
+            row = self.filter_orders(OrdersArchive.objects.using(database)).filter(**lookup).values_list(
+                *encoder.columns
+            ).first()
+        if row is None:
+            raise Http404
+        with record("serializer"):
+            data = encoder.encode([row])[0]
+        return Response(data)
 
-class OrdersListCreateView(generics.ListCreateAPIView):
+class OrdersListCreateView(ReplicaReadsMixin, ConditionalListMixin, OrderRowsMixin, generics.ListCreateAPIView):
     """
     GET orders/
     POST orders/
+
+    POST accepts either a single order or a list of orders
     """
     queryset = Orders.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = LIST_RENDERERS
+    # when set, new orders are written by its group commit thread
+    order_queue = order_queue
+
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get("data"), list):
+            kwargs["many"] = True
+        return super().get_serializer(*args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        with record("serializer"):
+            serializer.is_valid(raise_exception=True)
+        try:
+            self.perform_create(serializer)
+        except WriterUnavailable:
+            return Response(
+                data={"message": "Orders cannot be saved right now, please try again"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        with record("serializer"):
+            data = serializer.data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        if self.order_queue is None:
+            serializer.save(user=self.request.user)
+            return
+        many = isinstance(serializer.validated_data, list)
+        rows = serializer.validated_data if many else [serializer.validated_data]
+        orders = self.order_queue.save([Orders(**attrs, user=self.request.user) for attrs in rows])
+        serializer.instance = orders if many else orders[0]
 
-class OrdersRetrieveView(generics.RetrieveAPIView):
+class OrdersRetrieveView(ReplicaReadsMixin, OrderRowsMixin, generics.RetrieveAPIView):
     """
     GET orders/:pk/
     """    
@@ -30,22 +236,27 @@ class OrdersRetrieveView(generics.RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
-class OrdersRestaurantListView(generics.ListAPIView):
+class OrdersRestaurantListView(ReplicaReadsMixin, ConditionalListMixin, OrderRowsMixin, generics.ListAPIView):
     """
     GET orders/restaurant/:restaurant
     """
     queryset = Orders.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = LIST_RENDERERS
 
-    def get_queryset(self): 
-        queryset = self.queryset.filter(restaurant=self.kwargs["restaurant"]).order_by("created")
-        return queryset
+    def get_version_key(self):
+        return scope_key("restaurant", self.restaurant.pk)
+
+    def get_databases(self):
+        return [shard_for(self.restaurant.pk)]
+
+    def filter_orders(self, queryset):
+        return queryset.filter(restaurant=self.restaurant.pk)
 
     def get(self, request, *args, **kwargs):
-        try:
-            Restaurants.objects.get(name=self.kwargs["restaurant"])
-        except Restaurants.DoesNotExist:
+        self.restaurant = menu_cache.restaurant(self.kwargs["restaurant"])
+        if self.restaurant is None:
             return Response(
                 data={
                     "message": f"Restaurant with name: {kwargs['restaurant']} does not exist"
@@ -54,16 +265,20 @@ class OrdersRestaurantListView(generics.ListAPIView):
             )
         return self.list(request, *args, **kwargs)
 
-class OrdersCustomerListView(generics.ListAPIView):
+class OrdersCustomerListView(ReplicaReadsMixin, ConditionalListMixin, OrderRowsMixin, generics.ListAPIView):
     """
     GET orders/customer/:customer
     """
+    queryset = Orders.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = LIST_RENDERERS
 
-    def get_queryset(self): 
-        queryset = Orders.objects.filter(user=self.kwargs["customer"])
-        return queryset
+    def get_version_key(self):
+        return scope_key("customer", self.kwargs["customer"])
+
+    def filter_orders(self, queryset):
+        return queryset.filter(user=self.kwargs["customer"])
 
     def get(self, request, *args, **kwargs):
         try:
@@ -77,47 +292,248 @@ class OrdersCustomerListView(generics.ListAPIView):
             )
         return self.list(request, *args, **kwargs)
 
-class CostRetrieveView(generics.RetrieveAPIView):
+class OrdersExportView(generics.GenericAPIView):
+    """
+    GET orders/export/<str:export_format>/
+
+    Streams every matching order as NDJSON or CSV without building the list in memory
+    """
+    queryset = Orders.objects.all()
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_querysets(self):
+        params = self.request.query_params
+        after, _ = created_range(params)
+        databases = [shard_for(self.restaurant.pk)] if self.restaurant else order_databases()
+        querysets = []
+        for database in databases:
+            querysets.append(self.queryset.using(database))
+            if reaches_archive(after, database):
+                querysets.append(OrdersArchive.objects.using(database))
+        for index, queryset in enumerate(querysets):
+            queryset = filter_created(queryset, params)
+            if self.restaurant:
+                queryset = queryset.filter(restaurant=self.restaurant.pk)
+            if params.get("customer"):
+                queryset = queryset.filter(user=params["customer"])
+            querysets[index] = queryset
+        return querysets
+
+    def get(self, request, *args, **kwargs):
+        if kwargs["export_format"] not in FORMATS:
+            return Response(
+                data={
+                    "message": f"Export format: {kwargs['export_format']} is not supported"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        restaurant = request.query_params.get("restaurant")
+        self.restaurant = menu_cache.restaurant(restaurant) if restaurant else None
+        if restaurant and self.restaurant is None:
+            return Response(
+                data={
+                    "message": f"Restaurant with name: {restaurant} does not exist"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        customer = request.query_params.get("customer")
+        if customer and not (customer.isdigit() and User.objects.filter(pk=customer).exists()):
+            return Response(
+                data={
+                    "message": f"Customer with id: {customer} does not exist"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        export, content_type = FORMATS[kwargs["export_format"]]
+        encoder = order_encoder(request.query_params)
+        response = StreamingHttpResponse(export(self.get_querysets(), encoder), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="orders.{kwargs["export_format"]}"'
+        return response
+
+class CostRetrieveView(ReplicaReadsMixin, generics.RetrieveAPIView):
     """
     GET orders/cost/<str:restaurant>
     """    
     queryset = Orders.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (AggregateThrottle,)
 
     def get(self, request, *args, **kwargs):
-        try:
-            Restaurants.objects.get(name=self.kwargs["restaurant"])
-            queryset = self.get_queryset().filter(restaurant=self.kwargs["restaurant"])
-            cost = queryset.aggregate(Sum("total_price")).get("total_price__sum")
+        restaurant = menu_cache.restaurant(self.kwargs["restaurant"])
+        if restaurant is None:
             return Response(
                 data={
-                    "cost": cost
+                    "message": f"Restaurant with name: {kwargs['restaurant']} does not exist"
                 },
-                status=status.HTTP_200_OK
+                status=status.HTTP_404_NOT_FOUND
             )
-        except Restaurants.DoesNotExist:
+        rollup = RestaurantRevenues.objects.using(shard_for(restaurant.pk)).filter(
+            restaurant=restaurant.pk
+        ).values_list("revenue", "order_count").first()
+        revenue, order_count = rollup or (None, 0)
+        cost = revenue if order_count else None
+        return Response(
+            data={
+                "cost": cost
+            },
+            status=status.HTTP_200_OK
+        )
+
+class RevenueBucketsListView(ReplicaReadsMixin, generics.ListAPIView):
+    """
+    GET orders/revenue/<str:restaurant>/
+
+    Revenue per hour, day or month, read from the revenue bucket rollup
+    """
+    serializer_class = RevenueBucketSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (AggregateThrottle,)
+    pagination_class = None
+
+    def get_granularity(self):
+        granularity = self.request.query_params.get("bucket", RevenueBuckets.DAY)
+        choices = [choice for choice, _ in RevenueBuckets.GRANULARITIES]
+        if granularity not in choices:
+            raise ValidationError({"bucket": f"{granularity} is not one of {', '.join(choices)}"})
+        return granularity
+
+    def get_queryset(self):
+        granularity = self.get_granularity()
+        after, before = created_range(self.request.query_params)
+        queryset = RevenueBuckets.objects.using(shard_for(self.restaurant.pk)).filter(
+            restaurant=self.restaurant.pk, granularity=granularity, order_count__gt=0
+        )
+        if after is not None:
+            # include the bucket the range starts in
+            queryset = queryset.filter(bucket_start__gte=bucket_start(after, granularity))
+        if before is not None:
+            queryset = queryset.filter(bucket_start__lt=before)
+        return queryset.order_by("bucket_start")
+
+    def get(self, request, *args, **kwargs):
+        self.restaurant = menu_cache.restaurant(kwargs["restaurant"])
+        if self.restaurant is None:
+            return Response(
+                data={
+                    "message": f"Restaurant with name: {kwargs['restaurant']} does not exist"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        buckets = list(self.get_queryset())
+        return Response(
+            data={
+                "restaurant": kwargs["restaurant"],
+                "bucket": self.get_granularity(),
+                "results": self.get_serializer(buckets, many=True).data,
+            },
+            status=status.HTTP_200_OK
+        )
+
+class TopItemsListView(ReplicaReadsMixin, generics.ListAPIView):
+    """
+    GET orders/top-items/<str:restaurant>/
+
+    A restaurant's best selling menu items, read from the item sales rollups
+    and cached until the restaurant's orders change
+    """
+    serializer_class = TopItemSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (AggregateThrottle,)
+    pagination_class = None
+    rankings = ("quantity", "revenue")
+    default_limit = 10
+    max_limit = 100
+    cache_timeout = 300
+
+    def get_ranking(self):
+        ranking = self.request.query_params.get("rank_by", self.rankings[0])
+        if ranking not in self.rankings:
+            raise ValidationError({"rank_by": f"{ranking} is not one of {', '.join(self.rankings)}"})
+        return ranking
+
+    def get_limit(self):
+        limit = self.request.query_params.get("limit", str(self.default_limit))
+        if not limit.isdigit() or not 1 <= int(limit) <= self.max_limit:
+            raise ValidationError({"limit": f"{limit} is not a number from 1 to {self.max_limit}"})
+        return int(limit)
+
+    def get_queryset(self):
+        restaurant, ranking = self.restaurant.pk, self.get_ranking()
+        after, before = created_range(self.request.query_params)
+        database = shard_for(restaurant)
+        if after is None and before is None:
+            queryset = ItemSales.objects.using(database).filter(restaurant=restaurant, order_count__gt=0).order_by(
+                f"-{ranking}", "item"
+            ).annotate(
+                total_quantity=F("quantity"), total_revenue=F("revenue"), total_orders=F("order_count")
+            )
+        else:
+            # sum the window's daily counters, which grow with items and days rather than orders
+            queryset = ItemDailySales.objects.using(database).filter(restaurant=restaurant)
+            if after is not None:
+                queryset = queryset.filter(bucket_start__gte=bucket_start(after, RevenueBuckets.DAY))
+            if before is not None:
+                queryset = queryset.filter(bucket_start__lt=before)
+            queryset = queryset.values("item_id").annotate(
+                total_quantity=Sum("quantity"), total_revenue=Sum("revenue"), total_orders=Sum("order_count")
+            ).filter(total_orders__gt=0).order_by(f"-total_{ranking}", "item_id")
+        return queryset.values("item_id", "total_quantity", "total_revenue", "total_orders")[:self.get_limit()]
+
+    def get(self, request, *args, **kwargs):
+        self.restaurant = menu_cache.restaurant(kwargs["restaurant"])
+        if self.restaurant is None:
             return Response(
                 data={
                     "message": f"Restaurant with name: {kwargs['restaurant']} does not exist"
                 },
                 status=status.HTTP_404_NOT_FOUND
             )
+        version = list_version(scope_key("restaurant", self.restaurant.pk))
+        key = f"orders:top-items:{version}:{hashlib.md5(request.get_full_path().encode()).hexdigest()}"
+        data = cache.get(key)
+        if data is None:
+            items = list(self.get_queryset())
+            menu_cache.load_items(ids=[item["item_id"] for item in items])
+            data = {
+                "restaurant": kwargs["restaurant"],
+                "rank_by": self.get_ranking(),
+                "results": self.get_serializer(items, many=True).data,
+            }
+            cache.set(key, data, self.cache_timeout)
+        return Response(data=data, status=status.HTTP_200_OK)
 
-class AveQuantityRetrieveView(generics.RetrieveAPIView):
+class QuantityStatsMixin:
+    """
+    Reads the precomputed quantity statistics for a restaurant and customer
+    """
+
+    def get_stats(self):
+        restaurant, customer = menu_cache.restaurant(self.kwargs["restaurant"]), self.kwargs["customer"]
+        if restaurant is None:
+            raise Restaurants.DoesNotExist
+        stats = QuantityStats.objects.using(shard_for(restaurant.pk)).filter(
+            restaurant=restaurant.pk, user=customer
+        ).first()
+        if stats is None:
+            # no orders yet, so tell a missing customer apart from an empty result
+            User.objects.get(pk=customer)
+            stats = QuantityStats(restaurant_id=restaurant.pk, user_id=customer)
+        return stats
+
+class AveQuantityRetrieveView(ReplicaReadsMixin, QuantityStatsMixin, generics.RetrieveAPIView):
     """
     GET orders/stats/average-quantity/<str:restaurant>/<int:customer>/
     """   
     queryset = Orders.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (AggregateThrottle,)
 
     def get(self, request, *args, **kwargs):
         try:
-            Restaurants.objects.get(name=self.kwargs["restaurant"])
-            User.objects.get(pk=self.kwargs["customer"])
-            queryset = self.get_queryset().filter(restaurant=self.kwargs["restaurant"], user=self.kwargs["customer"])
-            average = queryset.aggregate(Avg("quantity")).get("quantity__avg")
+            average = self.get_stats().average
             return Response(
                 data={
                     "average": average
@@ -137,4 +553,41 @@ class AveQuantityRetrieveView(generics.RetrieveAPIView):
                     "message": f"Customer with id: {kwargs['customer']} does not exist"
                 },
                 status=status.HTTP_404_NOT_FOUND
-            )
\ No newline at end of file
+            )
+
+class QuantityStatsRetrieveView(ReplicaReadsMixin, QuantityStatsMixin, generics.RetrieveAPIView):
+    """
+    GET orders/stats/quantity/<str:restaurant>/<int:customer>/
+    """
+    queryset = Orders.objects.all()
+    serializer_class = OrderSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (AggregateThrottle,)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            stats = self.get_stats()
+            return Response(
+                data={
+                    "order_count": stats.order_count,
+                    "total": stats.quantity_sum,
+                    "average": stats.average,
+                    "min": stats.min_quantity,
+                    "max": stats.max_quantity,
+                },
+                status=status.HTTP_200_OK
+            )
+        except Restaurants.DoesNotExist:
+            return Response(
+                data={
+                    "message": f"Restaurant with name: {kwargs['restaurant']} does not exist"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except User.DoesNotExist:
+            return Response(
+                data={
+                    "message": f"Customer with id: {kwargs['customer']} does not exist"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
@@ -0,0 +1,171 @@
+"""
+ASGI config for restaurant_api project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 has neither an ASGI handler nor async views, so requests are
+bridged onto the WSGI application. Reading request bodies and writing
+responses to clients happens on the event loop, and only the view itself runs
+in a bounded pool of threads, so slow clients do not hold a thread or a
+database connection while they upload or download. Each pool thread keeps its
+own database connection, which Django closes at the end of every request as
+it does under WSGI.
+"""
+
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_api.settings')
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class WSGIBridge:
+    """
+    ASGI 3 application that serves HTTP requests with a WSGI application
+    """
+
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        try:
+            body = await self.read_body(scope, receive)
+        except BodyTooLarge:
+            content = json.dumps({"message": "Request body is too large"}).encode()
+            await send({'type': 'http.response.start', 'status': 413, 'headers': [
+                (b'content-type', b'application/json'), (b'content-length', str(len(content)).encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            self.executor, self.run, self.environ(scope, body), loop, send
+        )
+        if response is not None:
+            status, headers, content = response
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, scope, receive):
+        """
+        Return the whole request body, or None if the client disconnected first
+
+        Raises BodyTooLarge as soon as the body is known to exceed
+        DATA_UPLOAD_MAX_MEMORY_SIZE, rather than buffering a body of any size
+        for Django to reject.
+        """
+        limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        length = dict(scope.get('headers', [])).get(b'content-length', b'')
+        if limit is not None and length.isdigit() and int(length) > limit:
+            raise BodyTooLarge
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise BodyTooLarge
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    def environ(self, scope, body):
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+            'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1').upper().replace('-', '_')
+            value = value.decode('latin1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f"HTTP_{name}"
+            if name in environ:
+                # repeated headers are comma separated, except cookies
+                value = f"{environ[name]}{'; ' if name == 'HTTP_COOKIE' else ','}{value}"
+            environ[name] = value
+        # the body is already buffered, which also covers chunked uploads
+        environ['CONTENT_LENGTH'] = str(len(body))
+        return environ
+
+    def run(self, environ, loop, send):
+        """
+        Call the WSGI application in a pool thread
+
+        Ordinary responses are returned as (status, headers, body) for the
+        event loop to send. Streaming responses are sent from this thread as
+        they are produced, so they hold the thread until the client has them.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers
+            ]
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            if not getattr(result, 'streaming', False):
+                return started['status'], started['headers'], b''.join(result)
+
+            def send_now(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            send_now({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            for chunk in result:
+                if chunk:
+                    send_now({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            send_now({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Django closes the request's database connection here, so it
+            # must run on the thread that used it
+            if hasattr(result, 'close'):
+                result.close()
+
+
+application = WSGIBridge(get_wsgi_application(), max_workers=getattr(settings, 'ASGI_THREADS', None))
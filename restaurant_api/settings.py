@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import datetime
 import os
+from importlib.util import find_spec
 
 from dotenv import load_dotenv
 
@@ -44,10 +45,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'orders',
+    'orders.apps.OrdersConfig',
 ]
 
 MIDDLEWARE = [
+    'orders.middleware.RequestTimingMiddleware',
+    'orders.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +80,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'restaurant_api.wsgi.application'
 
+# Views served through restaurant_api.asgi run in a pool of this many threads,
+# each holding at most one database connection.
+ASGI_THREADS = 20
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -88,6 +95,62 @@ DATABASES = {
     }
 }
 
+# Read replicas
+# The DATABASE_REPLICAS environment variable is a comma separated list of
+# SQLite files kept in sync with the default database, which become the
+# replica1, replica2, ... aliases. List, retrieve and statistics requests read
+# from them, except for users who wrote within READ_YOUR_WRITES_SECONDS, whose
+# reads stay on the primary. See orders.routers.
+DATABASE_REPLICAS = []
+for index, path in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(','))):
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = dict(DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+# Order shards
+# The ORDER_SHARDS environment variable is a comma separated list of SQLite
+# files that hold orders and their rollups instead of the default database,
+# each restaurant's in one of them. They become the shard1, shard2, ...
+# aliases, and each needs `python manage.py migrate --database=shardN`. See
+# orders.sharding.
+ORDER_SHARDS = []
+for index, path in enumerate(filter(None, os.getenv('ORDER_SHARDS', '').split(','))):
+    alias = f'shard{index + 1}'
+    DATABASES[alias] = {'ENGINE': 'orders.backends.shard', 'NAME': path}
+    ORDER_SHARDS.append(alias)
+
+DATABASE_ROUTERS = ['orders.routers.ShardRouter', 'orders.routers.ReplicaRouter']
+
+READ_YOUR_WRITES_SECONDS = 10
+
+# Set on each SQLite database after it is migrated, see orders.signals. The
+# journal mode is kept in the database file, and WAL lets reads proceed during
+# a write.
+SQLITE_JOURNAL_MODE = 'wal'
+
+# Applied to every new SQLite connection in one call, see orders.signals. With
+# WAL, synchronous=NORMAL only syncs at checkpoints. Writers wait up to
+# busy_timeout ms for the lock.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Order list ETags are driven by version counters kept in this cache. When
+# running more than one worker process, or importing orders while servers run,
+# it must be shared between them, e.g. memcached or redis, or workers will
+# answer 304 with stale lists.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -115,11 +178,42 @@ REST_FRAMEWORK = {
     ],
     # Authentication settings
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'orders.authentication.CachedJSONWebTokenAuthentication',
         # 'rest_framework.authentication.BasicAuthentication',
     ],
+    # Pagination settings
+    'DEFAULT_PAGINATION_CLASS': 'orders.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+    # Renderer and parser settings
+    'DEFAULT_RENDERER_CLASSES': [
+        'orders.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'orders.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Throttle settings
+    # Each user gets a token bucket per endpoint, refilled at the rate of its
+    # scope. The aggregate endpoints use the 'aggregates' scope instead of
+    # 'reads'. See orders.throttling.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'orders.throttling.ReadWriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'reads': '1200/min',
+        'writes': '300/min',
+        'aggregates': '60/min',
+    },
 }
 
+# MessagePack is offered through the Accept and Content-Type headers when the
+# msgpack package is installed. See orders.renderers.
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'orders.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'orders.parsers.MessagePackParser')
+
 # JWT settings
 JWT_AUTH = {
     'JWT_ENCODE_HANDLER':
@@ -157,6 +251,83 @@ JWT_AUTH = {
 }
 
 
+# Menu cache settings
+# Restaurants and menu items are cached per process. Writes clear the cache
+# of the process making them, other processes see them once entries expire.
+MENU_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 60,
+}
+
+
+# Authentication cache settings
+# Verified tokens and their users are cached per process for TTL seconds.
+# Saving or deleting a user evicts it in the process making the change.
+AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 30,
+}
+
+# Order ingestion settings
+# With GROUP_COMMIT on, each process inserts new orders from one writer thread,
+# batching every order queued within MAX_DELAY_MS (up to MAX_BATCH orders) into
+# one transaction. Requests whose orders the writer has not taken within
+# TIMEOUT_MS get a 503 instead. See orders.ingestion.
+ORDER_INGESTION = {
+    'GROUP_COMMIT': os.getenv('ORDER_GROUP_COMMIT', '') == '1',
+    'MAX_BATCH': 200,
+    'MAX_DELAY_MS': 2,
+    'TIMEOUT_MS': 10000,
+}
+
+# Request timing settings
+# Set SAMPLE_RATE to the fraction of requests to time, between 0 and 1. Timed
+# requests get a Server-Timing header and a log line on the orders.timing
+# logger, and those slower than SLOW_REQUEST_MS are also logged with their SQL.
+REQUEST_TIMING = {
+    'SAMPLE_RATE': float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', 0)),
+    'SLOW_REQUEST_MS': 500,
+    'SERVER_TIMING_HEADER': True,
+}
+
+# Throttling settings
+# Token buckets are kept in the memory mapped file at PATH, shared by every
+# worker process on the host, with room for SLOTS buckets. The file must
+# belong to the user the server runs as, so by default it sits next to the
+# database rather than in the shared temporary directory.
+THROTTLING = {
+    'PATH': os.getenv('THROTTLE_PATH', os.path.join(BASE_DIR, 'throttle.buckets')),
+    'SLOTS': 65536,
+}
+
+# Response compression settings
+# Responses of at least MIN_SIZE bytes are compressed with brotli (when the
+# brotli package is installed) or gzip, as the client's Accept-Encoding
+# prefers. Streaming responses are always compressed. See orders.compression.
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'orders.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 